@@ -1,4 +1,6 @@
-from flask import Flask, jsonify, make_response
+import time
+from contextlib import ExitStack
+from flask import Flask, Response, g, jsonify, make_response, request
 from flask_restful import Api, Resource
 from config import Config
 from app.app_logging import logger
@@ -14,10 +16,72 @@ app.json.sort_keys = False  # Ensure jsonify in api won't sort keys
 from app import routes, errors
 
 # Add import of new versions of the API as they are created
-from app.api import Api_0, require_api_key
+from app.api import (
+    Api_0,
+    require_api_key,
+    catalog_validators,
+    is_not_modified,
+    is_valid_query,
+    parse_batch_queries,
+)
 from app.api_0_1 import API_0_1
+from app.response_cache import response_cache, normalize_query
+from app.compression import compress_response, negotiate_encoding
+from core.db_logic.catalog import get_catalog
+from core.models import close_query_results, count_queries, query_origin
+from app.preload import setup_preload
+from app.metrics import (
+    init_metrics,
+    request_seconds,
+    request_db_queries,
+    request_db_rows,
+    time_stage,
+)
 api = Api(app)
 
+
+# Count the SQL statements each request runs, available as g.query_counter
+@app.before_request
+def start_query_counter():
+    g.request_started = time.perf_counter()
+    g.query_counter_stack = ExitStack()
+    g.query_counter = g.query_counter_stack.enter_context(count_queries())
+    # Closes the results the request checked but didn't read, which hold a connection
+    g.query_counter_stack.enter_context(close_query_results())
+    # Slow queries are logged with the endpoint they ran for, API keys left out
+    view_args = {
+        name: value
+        for name, value in (request.view_args or {}).items()
+        if name != "api_key"
+    }
+    g.query_counter_stack.enter_context(query_origin(f"{request.endpoint} {view_args}"))
+
+
+@app.teardown_request
+def stop_query_counter(exception=None):
+    stack = g.pop("query_counter_stack", None)
+    if stack is not None:
+        stack.close()
+        endpoint = request.endpoint or ""
+        request_db_queries.observe(g.query_counter.count, endpoint)
+        request_db_rows.observe(g.query_counter.rows, endpoint)
+        logger.debug(
+            f"{request.path} ran {g.query_counter.count} queries, "
+            f"fetched {g.query_counter.rows} rows"
+        )
+
+
+# Request latency metrics, observed once a (streamed) response was sent
+@app.after_request
+def observe_request_time(response):
+    started = g.get("request_started")
+    if started is not None:
+        labels = (request.endpoint or "", str(response.status_code))
+        response.call_on_close(
+            lambda: request_seconds.observe(time.perf_counter() - started, *labels)
+        )
+    return response
+
 # Map API version to the appropriate class
 api_versions = {
     "api=API_0": Api_0,
@@ -28,6 +92,41 @@ api_versions = {
 }
 
 
+def answer_query(
+    api_class, catalog, query, api_key, encoding=None, **api_args
+) -> Response:
+    """Answers one API query from the worker's response cache, or runs it with
+    the API class and caches the response.
+
+    Args:
+        api_class (type): API class of the requested version, i.e. API_0_1
+        catalog (CatalogSnapshot): Snapshot the query is answered from
+        query (str): User's api query
+        api_key (str): User's api key, already validated
+        encoding (str | None): Content coding of the body, see negotiate_encoding
+        **api_args: Extra arguments of the API class, i.e. API_0_1's search_ids
+
+    Returns:
+        Response: The API response
+    """
+    normalized_query = normalize_query(query) if response_cache.enabled else None
+    cache_key = (api_class.__name__, normalized_query)
+    if normalized_query is not None:
+        cached = response_cache.get(cache_key, catalog.version)
+        if cached is not None:
+            return response_cache.respond(cache_key, cached, encoding)
+
+    # Instantiate the class of the version and call its method
+    api_instance = api_class(catalog, **api_args)
+    with query_origin(f"{api_class.__name__} {query}"):
+        response = api_instance.get(query, api_key)
+    if isinstance(response, Response) and response.status_code == 200:
+        if normalized_query is not None:
+            response = response_cache.store(cache_key, catalog.version, response)
+        response = compress_response(response, encoding)
+    return response
+
+
 # Dynamically select the API version based on the URL
 class VersionedAPI(Resource):
     @require_api_key
@@ -40,13 +139,100 @@ class VersionedAPI(Resource):
                 jsonify({"message": f"API version '{api_version}' not found."}), 404
             )
 
-        # If the version exists, instantiate the class and call its method
-        api_instance = api_class()
-        return api_instance.get(query, api_key)
+        with time_stage("load_catalog"):
+            catalog = get_catalog()
+        return versioned_response(api_class, catalog, query, api_key)
+
+
+def versioned_response(api_class, catalog, query, api_key, **api_args) -> Response:
+    """Answers a GET API query of the current request. Shared by VersionedAPI
+    and the ASGI server (`app.asgi`).
+
+    Args:
+        api_class (type): API class of the requested version, i.e. API_0_1
+        catalog (CatalogSnapshot): Snapshot the query is answered from
+        query (str): User's api query
+        api_key (str): User's api key, already validated
+        **api_args: Extra arguments of the API class
+
+    Returns:
+        Response: The API response, 304 if the client's copy is current
+    """
+    # Clients that already have the current catalog version get a 304
+    #   before any query or serialization work. Invalid queries get their
+    #   error instead, whatever the client has.
+    validators = catalog_validators(catalog)
+    validators["Vary"] = "Accept-Encoding"
+    if is_not_modified(catalog) and is_valid_query(api_class, query):
+        return Response(status=304, headers=validators)
+
+    # Bodies are sent compressed when the client accepts gzip or zstd
+    encoding = negotiate_encoding(request.accept_encodings)
+
+    # Repeated queries are served from the worker's response cache
+    response = answer_query(api_class, catalog, query, api_key, encoding, **api_args)
+    if isinstance(response, Response) and response.status_code == 200:
+        response.headers.update(validators)
+    return response
+
+
+# Run many queries in one request
+class BatchAPI(Resource):
+    @require_api_key
+    def post(self, api_version, api_key):
+        """Answers a list of queries with one JSON object keyed by query.
+
+        The API key is checked once and every query is answered from the same
+        catalog snapshot. See parse_batch_queries for the request body. Each
+        result has the query's status code, its JSON body, and the cursor of
+        the next page for paginated queries:
+
+        {"software=7z": {"status": 200, "body": [...]},
+         "rp=nope": {"status": 404, "body": {"message": "No data found"}}}
+        """
+        api_class = api_versions.get(api_version)
+        if api_class is None:
+            return make_response(
+                jsonify({"message": f"API version '{api_version}' not found."}), 404
+            )
+
+        try:
+            batch = parse_batch_queries(request.get_json(silent=True))
+        except ValueError as e:
+            return make_response(jsonify({"message": str(e)}), 400)
+
+        with time_stage("load_catalog"):
+            catalog = get_catalog()
+        dumps = app.json.dumps
+        pieces = ["{"]
+        for key, query in batch.items():
+            response = answer_query(api_class, catalog, query, api_key)
+            result = f'"status":{response.status_code},"body":'
+            result += response.get_data(as_text=True).rstrip("\n")
+            next_cursor = response.headers.get("X-Next-Cursor")
+            if next_cursor is not None:
+                result += f',"next_cursor":{dumps(next_cursor)}'
+            pieces.append(f'{"," if len(pieces) > 1 else ""}{dumps(key)}:{{{result}}}')
+        pieces.append("}\n")
+
+        response = Response(pieces, mimetype="application/json")
+        response = compress_response(
+            response, negotiate_encoding(request.accept_encodings)
+        )
+        response.headers.update(catalog_validators(catalog))
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+
+# Add the versioned API routes to Flask
+api.add_resource(VersionedAPI, "/<api_version>/<api_key>/<query>")
+api.add_resource(BatchAPI, "/<api_version>/<api_key>")
 
+# Drop the metrics of a previous server, before uwsgi forks the workers
+init_metrics()
+# Under uwsgi, load the catalog once in the master and share it with the workers
+setup_preload(api_versions.values())
 
-# Add the versioned API route to Flask
-api.add_resource(VersionedAPI, "/<api_version>/<api_key>/<query>") 
 
 #Link for API_0: url/api_ver/api_key/query -> url/API_0/api_key/software=7z
 
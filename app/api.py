@@ -1,26 +1,40 @@
+import os
+from datetime import timezone
 from functools import wraps
-from flask import jsonify, request, Response, make_response
+from flask import g, request, make_response
+from werkzeug.http import http_date, quote_etag
 from flask_restful import Resource
-import pandas as pd
-from core.models import view_db, db_operation, db_proxy as db
-from core.models.rpSoftware import RPSoftware
-from core.models.software import Software
-from core.models.rps import RPS
-from core.models.aiSoftwareInfo import AISoftwareInfo
-from core.models.api import API
+from core.models import view_db
 from core.db_logic.get_software_details import (
     get_software_details,
     get_rp_details,
-    search_software
+)
+from core.db_logic.api_keys import validate_api_key
+from core.db_logic.catalog import (
+    CatalogSnapshot,
+    get_catalog,
+    project_documents,
+    encode_cursor,
+    decode_cursor,
+    DOCUMENT_COLUMNS,
 )
 from app.app_logging import logger
+from app.serializers import stream_response
+from app.metrics import time_stage
+
+# Number of software per page when a cursor is given without a limit
+DEFAULT_PAGE_LIMIT = int(os.getenv("API_PAGE_LIMIT", 1000))
+# Maximum number of queries in one batch request
+BATCH_MAX_QUERIES = int(os.getenv("API_BATCH_MAX_QUERIES", 100))
 
 
 # API key validation
-@db_operation("view")
 def require_api_key(func):
     """Decorator that validates API key exists in database.
 
+    Results are cached per worker (see `core.db_logic.api_keys`), and a key
+    that was already accepted during the current request is not checked again.
+
     Args:
         func (callable): Function to protect with API key validation
 
@@ -39,30 +53,128 @@ def require_api_key(func):
             any: 401 response if invalid key,
             else function result
         """
-        logger.info('Check API key')
         api_key = kwargs.get('api_key') or request.view_args.get('api_key')
 
-        with db.atomic():
-            api_match = API.get_or_none(API.api_key == api_key)    # Query the database to check if the provided API key exists
-            logger.debug(f"User Organization: {api_match.organization if api_match else api_match}")
-
-        if not api_match:
-            logger.error(f'Invalid or missing API key: {api_key}')
-            return make_response(({'message': 'Invalid or missing API key'}), 401)  # If the API key does not exist, return an error response
+        # Nested protected calls (VersionedAPI -> Api_0) only validate once
+        if g.get("validated_api_key") != api_key:
+            logger.info('Check API key')
+            with time_stage("validate_api_key"):
+                valid = validate_api_key(api_key)
+            if not valid:
+                logger.error(f'Invalid or missing API key: {api_key}')
+                # If the API key does not exist, return an error response
+                return make_response(({'message': 'Invalid or missing API key'}), 401)
+            g.validated_api_key = api_key
         return func(*args, **kwargs)
 
     return decorated_function
 
 
+def catalog_validators(catalog: CatalogSnapshot) -> dict:
+    """Returns the ETag and Last-Modified headers of responses built from a
+    catalog snapshot. Both come from the catalog version stamped by
+    reset_database.py, so they only change when the data does.
+    """
+    if catalog.content_hash is None:
+        return {}
+    # Weak, since the same ETag is sent for every content coding of a body
+    headers = {"ETag": quote_etag(catalog.content_hash, weak=True)}
+    if catalog.modified_at is not None:
+        headers["Last-Modified"] = http_date(
+            catalog.modified_at.replace(tzinfo=timezone.utc)
+        )
+    return headers
+
+
+def is_not_modified(catalog: CatalogSnapshot) -> bool:
+    """Checks if the client already has the responses of this catalog version.
+
+    `If-None-Match` is compared with the catalog version. `If-Modified-Since`
+    is only used when the request has no `If-None-Match`.
+
+    Returns:
+        bool: True if the request can be answered with 304 Not Modified
+    """
+    if catalog.content_hash is None:
+        return False
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(catalog.content_hash)
+    if request.if_modified_since and catalog.modified_at is not None:
+        modified_at = catalog.modified_at.replace(tzinfo=timezone.utc)
+        return modified_at <= request.if_modified_since
+    return False
+
+
+def parse_page_params(params: dict) -> tuple[int | None, str | None]:
+    """Reads the `limit=` and `cursor=` pagination parameters of a query.
+
+    Args:
+        params (dict): Parsed query parameters
+
+    Returns:
+        int | None: Maximum number of software per page, None when the query
+            isn't paginated
+        str | None: Name of the software the page starts after, None for the
+            first page
+
+    Raises:
+        ValueError: If limit isn't a positive integer or cursor is invalid
+    """
+    limit = params.get("limit")
+    cursor = params.get("cursor")
+    if limit is None and cursor is None:
+        return None, None
+
+    limit = int(limit) if limit is not None else DEFAULT_PAGE_LIMIT
+    if limit < 1:
+        raise ValueError(f"Invalid limit: {limit}")
+    after = decode_cursor(cursor) if cursor else None
+    return limit, after
+
+
+def is_valid_query(api_class, query: str) -> bool:
+    """Checks the syntax of a query without answering it: every parameter
+    is `name=value`, the pagination parameters are valid and one of the
+    parameters the API version selects rows by is given.
+
+    Args:
+        api_class (type): API class of the requested version, its
+            QUERY_PARAMS are the parameters selecting rows
+        query (str): User's api query
+
+    Returns:
+        bool: False if answering the query would fail with a 400 or 404
+            whatever the catalog holds
+    """
+    try:
+        params = dict(item.split("=") for item in query.split(","))
+        parse_page_params(params)
+    except ValueError:
+        return False
+    return any(params.get(name) for name in api_class.QUERY_PARAMS)
+
+
+def page_headers(next_after: str | None) -> dict:
+    """Returns the headers telling the client where the next page starts.
+
+    `X-Next-Cursor` is only sent when there is a next page; its value is
+    passed back as `cursor=` to fetch it.
+    """
+    if next_after is None:
+        return {}
+    return {"X-Next-Cursor": encode_cursor(next_after)}
+
+
 class Api_0(Resource):
     """Implements functionality for API version 0.
 
     It processes requests to search for software and RP (Resource Providers),
     filter included/excluded columns, and return the data in various formats
-    (JSON, CSV, or HTML). The entire dataset is queried each time a request is
-    made, and filtering is applied based on the query parameters.
+    (JSON, CSV, or HTML). Every request reads from the worker's shared catalog
+    snapshot, and filtering is applied based on the query parameters.
 
     Attributes:
+        catalog (CatalogSnapshot): The catalog snapshot used for this request
         merged_df (pd.DataFrame): A DataFrame of all software information
 
     ## Methods
@@ -70,8 +182,16 @@ class Api_0(Resource):
         Process API request based on a given query and api_key.
     """
 
-    def __init__(self):
-        self.merged_df = self.load_tables()
+    # Text placed between an RP name and its documentation or versions
+    RP_INFO_SEPARATOR = ": "
+    # Value returned for software without AI information
+    MISSING_VALUE = ""
+    # Parameters selecting the rows of a query, one of them is required
+    QUERY_PARAMS = ("software", "rp")
+
+    def __init__(self, catalog: CatalogSnapshot = None):
+        self.catalog = catalog if catalog is not None else get_catalog()
+        self.merged_df = self.catalog.merged_df
 
     @require_api_key
     def get(self, query, api_key=None):
@@ -84,15 +204,17 @@ class Api_0(Resource):
 
         Args:
             query (str): User's api query. It must contain either `software=`
-                or `rp_name=`.
+                or `rp_name=`. `limit=` and `cursor=` return one page of
+                software, ordered by software_name.
             api_key (str): User's api_key
 
         Returns:
-            One of the following types:
-            * str: A formatted string when response_type is 'HTML' or 'CSV'
+            Response: A streaming response whose body is serialized record by
+                record (see `app.serializers`)
                 - HTML: "<table><tr>...</tr></table>"
                 - CSV: "header1,header2\\nvalue1,value2"
-            * dict: A dictionary when response_type is 'JSON' or not specified
+                - JSON: '[{"software_name": ...}, ...]' when response_type is
+                  'JSON' or not specified
 
         Notes:
             Currently it returns a generic error message when somethign goes
@@ -111,99 +233,75 @@ class Api_0(Resource):
             exclude_columns = set(filter(None, params.get("exclude", "").split("+")))
             include_columns = set(filter(None, params.get("include", "").split("+")))
             response_type = params.get("type", "json").lower()
+            limit, after = parse_page_params(params)
+            next_after = None
 
-            # Handle software search
-            if software_names:
-                df = get_software_details(software_names, self.merged_df)
-            # Handle RP search
-            elif rp_names:
-                df = get_rp_details(rp_names, self.merged_df)
+            # Pages of the whole catalog or of RPs are read from the snapshot's
+            #   sorted indexes instead of filtering every row
+            indexed_page = limit is not None and (
+                software_names == "*" or (rp_names and not software_names)
+            )
+            if indexed_page:
+                rp_keys = None
+                if software_names != "*":
+                    rp_keys = [name.lower() for name in rp_names.split("+")]
+                with time_stage("filter", "page"):
+                    positions, next_after = self.catalog.page(
+                        after, limit, rp_keys=rp_keys
+                    )
+                if not positions:
+                    return make_response(({"message": "Invalid request parameters"}), 404)
             else:
-                return make_response(({"message": "Invalid request parameters"}), 400)
-
-            # Check if return value is response (error report)
-            if isinstance(df, tuple):
-                return make_response(df)  # Return the error response
-
-            # Handle formatting of response
-            df = (
-                df.groupby("software_name")
-                .agg(
-                    {
-                        "software_name": "first",
-                        # Aggregating rp_name into a list
-                        "rp_name": lambda x: sorted(list(set(x))),
-                        "rp_group_id": lambda x: sorted(list(set(x))),
-                        "software_description": "first",
-                        "ai_description": "first",
-                        "ai_core_features": "first",
-                        "software_documentation": "first",
-                        "ai_software_type": "first",
-                        "ai_research_area": "first",
-                        "ai_research_discipline": "first",
-                        "ai_general_tags": "first",
-                        "software_web_page": "first",
-                        "ai_research_field": "first",
-                        "software_use_link": "first",
-                        "rp_software_documentation": lambda software_documentation: self.format_software_info(
-                            df, software_documentation
-                        ),
-                        "software_versions": lambda software_versions: self.format_software_info(
-                            df, software_versions
-                        ),
-                        "ai_software_class": "first",
-                        "ai_example_use": "first",
-                    }
+                # Handle software search
+                if software_names:
+                    with time_stage("filter", "get_software_details"):
+                        df = get_software_details(software_names, self.merged_df)
+                # Handle RP search
+                elif rp_names:
+                    with time_stage("filter", "get_rp_details"):
+                        df = get_rp_details(rp_names, self.merged_df)
+                else:
+                    return make_response(({"message": "Invalid request parameters"}), 400)
+
+                # Check if return value is response (error report)
+                if isinstance(df, tuple):
+                    return make_response(df)  # Return the error response
+                if df is None:
+                    return make_response(({"message": "Invalid request parameters"}), 404)
+
+                positions = None if len(df) == len(self.merged_df) else df.index
+                if limit is not None:
+                    with time_stage("filter", "page"):
+                        positions, next_after = self.catalog.page(
+                            after, limit, positions=df.index.tolist()
+                        )
+
+            # Handle formatting of response, the per-software documents are
+            #   aggregated once per catalog snapshot
+            with time_stage("aggregate"):
+                documents = self.catalog.select_documents(
+                    positions, self.RP_INFO_SEPARATOR, self.MISSING_VALUE
                 )
-                .reset_index(drop=True)
-            )
 
             # Handle include/exclude columns
+            columns = DOCUMENT_COLUMNS
             if include_columns:
                 essential_columns = (
                     {"software_name"} if software_names else {"rp_name", "rp_group_id"}
                 )
                 include_columns = include_columns.union(essential_columns)
-                df = df[list(include_columns.intersection(df.columns))]
+                columns = [col for col in columns if col in include_columns]
 
             if exclude_columns:
-                df = df.drop(
-                    columns=[col for col in exclude_columns if col in df.columns],
-                    errors="ignore",
-                )
-            # Ensure specific column order after inclusion/exclusion
-            desired_column_order = [
-                "software_name",
-                "rp_name",
-                "rp_group_id",
-                "software_description",
-                "ai_description",
-                "ai_core_features",
-                "software_documentation",
-                "ai_software_type",
-                "ai_research_area",
-                "ai_research_discipline",
-                "ai_general_tags",
-                "software_web_page",
-                "ai_research_field",
-                "software_use_link",
-                "rp_software_documentation",
-                "software_versions",
-                "ai_software_class",
-                "ai_example_use",
-            ]
-
-            # Reorder columns if possible, after handling include/exclude
-            df = df[[col for col in desired_column_order if col in df.columns]]
-
-            # Return as CSV or JSON
-            match response_type:
-                case "csv":
-                    return Response(df.to_csv(index=False), mimetype="text/csv")
-                case "json":
-                    return jsonify(df.to_dict(orient="records"))
-                case "html":
-                    return Response(df.to_html(index=False), mimetype="text/html")
+                columns = [col for col in columns if col not in exclude_columns]
+
+            # Columns keep the DOCUMENT_COLUMNS order after inclusion/exclusion
+            records = project_documents(documents, columns)
+
+            # Return as CSV, JSON or HTML, serialized while the response is sent
+            return stream_response(
+                records, columns, response_type, headers=page_headers(next_after)
+            )
 
         except Exception as e:
             print(e)
@@ -215,78 +313,68 @@ class Api_0(Resource):
             if not view_db.is_closed():
                 view_db.close()
 
-    def format_software_info(self, df: pd.DataFrame, x: pd.Series) -> list[str]:
-        """Formats and groups software documentation or version information
-        with with its respective rp name.
 
-        Formats and groups together rp_software_documentation or
-        software_versions entries for JSON output by combining the RP name with
-        the respective documentation or version info. Uses the original
-        DataFrame to retrieve RP names based on the index of the current Series
-        being aggregated.
+def filters_to_query(filters: dict) -> str:
+    """Converts structured filters to an API query string.
 
-        Args:
-            df (pd.DataFrame): Original DataFrame containing all software
-                and RP data.
-            x (pd.Series): Current Series being processed during aggregation,
-                contains either 'rp_software_documentation' or
-                'software_versions'.
+    Args:
+        filters (dict): Query parameters, list values are joined with '+',
+            i.e. {"software": ["7z", "gromacs"], "exclude": "ai_description"}
 
-        Returns:
-            list[str]: List of strings where each entry is in the format
-                'rp_name: info', combining RP names with their respective
-                software documentation or versions.
-
-        Example:
-        >>> df = pd.DataFrame({'rp_name': ['A', 'B'], 'other_col': [1, 2]})
-        >>> x = pd.Series(['documentation1', 'documentation2'], index=[0, 1])
-        >>> format_software_info(df, x)
-        ['A: documentation1', 'B: documentation2']
-        """
-        return sorted(list(set(
-            f"{rp_name}: {info}"
-            # df.loc[x.index, 'rp_name'] Retrieves the rp_name values
-            #  corresponding to the indices in x from df
-            for rp_name, info in zip(df.loc[x.index, "rp_name"], x)
-        )))
+    Returns:
+        str: i.e. 'software=7z+gromacs,exclude=ai_description'
+    """
+    return ",".join(
+        f"{key}={'+'.join(map(str, value)) if isinstance(value, list) else value}"
+        for key, value in filters.items()
+    )
 
-    @db_operation("view")
-    def load_tables(self) -> pd.DataFrame:
-        """Gets all available data for all software
 
-        Performs a join on RPSoftware, Software, RPS, and AISoftwareInfo
-        tables to obtain all avaialble data. An inner join is used for all
-        tables except AISoftwareInfo which is joined using a left outer join
+def parse_batch_queries(payload) -> dict[str, str]:
+    """Reads the queries of a batch request body.
 
-        Returns:
-            pd.DataFrame: A pandas DataFrame with merged data from teh tables.
-            Empty values are filled with an empty string ("")
-
-        ## Notes
-            Here are the index for the returned table:
-            Index(['id', 'rp_id', 'software_id', 'software_versions',
-            'rp_software_documentation',
-            'rp_has_individual_software_documentation',
-            'rp_software_module_type', 'software_name', 'software_description',
-            'software_web_page', 'software_documentation', 'software_use_link',
-            'rp_name', 'ai_description', 'ai_software_type',
-            'ai_software_class', 'ai_research_field', 'ai_research_area',
-            'ai_research_discipline','ai_core_features', 'ai_general_tags',
-            'ai_example_use'], dtype='object')
-        """
-        logger.info('Loading table from DB.')
-        with db.atomic():
-            # Peewee join table query
-            query = (
-                RPSoftware.select(RPSoftware, Software, RPS, AISoftwareInfo)
-                .join(Software, on=(RPSoftware.software_id == Software.id))
-                .join(RPS, on=(RPSoftware.rp_id == RPS.id))
-                .left_outer_join(
-                    AISoftwareInfo, on=(AISoftwareInfo.software_id == Software.id)
-                )
-            )
+    The body is a JSON list of queries, or an object whose `queries` member is
+    a list of queries or an object of labelled queries. Each query is an API
+    query string or a filters object (see filters_to_query). Results of
+    labelled queries are keyed by label, the others by their query string.
+    Batch results are always JSON, so `type=` is dropped from the queries.
+    Queries with the same key would overwrite each other's result, so a
+    query string given twice (i.e. once with `type=`) is rejected.
+
+    >>> parse_batch_queries({"queries": {"md": {"software": ["gromacs", "lammps"]}}})
+    {'md': 'software=gromacs+lammps'}
+
+    Args:
+        payload (list | dict): Parsed JSON body of the request
 
-            merged_df = pd.DataFrame(list(query.dicts()))
+    Returns:
+        dict[str, str]: Result key to API query
 
-        merged_df.fillna("", inplace=True)
-        return merged_df
+    Raises:
+        ValueError: If the body isn't in one of the formats above, has more
+            than BATCH_MAX_QUERIES queries, or two queries with the same key
+    """
+    queries = payload.get("queries") if isinstance(payload, dict) else payload
+    if isinstance(queries, list):
+        items = [(None, query) for query in queries]
+    elif isinstance(queries, dict):
+        items = list(queries.items())
+    else:
+        raise ValueError("Expected a list or an object of queries")
+    if not items or len(items) > BATCH_MAX_QUERIES:
+        raise ValueError(f"A batch has 1 to {BATCH_MAX_QUERIES} queries")
+
+    batch = {}
+    for label, query in items:
+        if isinstance(query, dict):
+            query = filters_to_query(query)
+        elif not isinstance(query, str):
+            raise ValueError(f"Invalid query: {query!r}")
+        query = ",".join(
+            item for item in query.split(",") if not item.lower().startswith("type=")
+        )
+        key = query if label is None else label
+        if key in batch:
+            raise ValueError(f"Duplicate query in the batch: {key!r}")
+        batch[key] = query
+    return batch
@@ -1,33 +1,20 @@
-from flask import Flask, jsonify, request, Response, make_response
+from flask import make_response
 from flask_restful import Resource
-from functools import wraps
-import pandas as pd
-import re
-from core.models import view_db, db_operation, db_proxy as db
-from core.models.rpSoftware import RPSoftware
-from core.models.software import Software
-from core.models.rps import RPS
-from core.models.aiSoftwareInfo import AISoftwareInfo
-from core.models.api import API
-from core.db_logic.get_software_details import get_software_details, get_rp_details, search_software
-
-
-# API key validation
-@db_operation('view')
-def require_api_key(func):
-    @wraps(func)
-    def decorated_function(*args, **kwargs):
-        api_key = kwargs.get('api_key') or request.view_args.get('api_key')
-
-        with db.atomic():
-            # Query the database to check if the provided API key exists
-            api_key_exists = API.select().where(API.api_key == api_key).exists()
-
-        if not api_key_exists:
-            # If the API key does not exist, return an error response
-            return make_response(({'message': 'Invalid or missing API key'}), 401)
-        return func(*args, **kwargs)
-    return decorated_function
+from core.models import view_db
+from core.models.catalogView import CatalogView
+from core.db_logic.get_software_details import (
+    get_software_details,
+    get_rp_details,
+    search_software,
+    is_ranked_search,
+    find_search_groups,
+    split_search_string,
+)
+from core.db_logic.catalog import get_catalog, project_documents, DOCUMENT_COLUMNS
+from app.api import require_api_key, parse_page_params, page_headers
+from app.serializers import stream_response
+from app.metrics import time_stage
+
 
 class API_0_1(Resource):
     """
@@ -48,13 +35,29 @@ class API_0_1(Resource):
              organizes the fields according to a specified structure.
            - Returns data in multiple formats: JSON, CSV, or HTML, depending
              on the user’s request.
+           - Returns large results in pages with `limit=` and `cursor=`. The
+             cursor of the next page is sent in the `X-Next-Cursor` header.
     """
-    def __init__(self):
+    # Text placed between an RP name and its documentation or versions
+    RP_INFO_SEPARATOR = ':    '
+    # Value returned for software without AI information
+    MISSING_VALUE = None
+    # Parameters selecting the rows of a query, one of them is required
+    QUERY_PARAMS = ('software', 'rp', 'search')
+
+    def __init__(self, catalog=None, search_ids=None):
         """
-        Initializes the API_0_1 class by loading all software and
-        RP data from the database into a Peewee ModelSelect object.
+        Initializes the API_0_1 class with the worker's shared catalog
+        snapshot of all software and RP data.
+        Args:
+            catalog (CatalogSnapshot): snapshot to read from, defaults to the
+                worker's current one
+            search_ids (list): ids of the rows matching the query's full-text
+                search, in rank order, when the caller already ran it (the
+                ASGI server does, on its async pool). None runs the search.
         """
-        self.query = self.load_tables()
+        self.catalog = catalog if catalog is not None else get_catalog()
+        self.search_ids = search_ids
 
     @require_api_key
     def get(self, query, api_key=None):
@@ -63,123 +66,87 @@ class API_0_1(Resource):
             software_names = params.get('software')
             rp_names = params.get('rp')
             searchString = params.get('search', '')
-            search = re.findall(r'(\w+\s*\(.*?\)(?:&\w+\s*\(.*?\))*)(?=\s*\+|$)', searchString)
+            search = split_search_string(searchString)
             exclude_columns = set(filter(None, params.get('exclude', '').split('+')))
             include_columns = set(filter(None, params.get('include', '').split('+')))
             response_type = params.get('type', 'json').lower()
-
-            # Handle software search
-            if software_names:
-                query = get_software_details(software_names, self.query)
-            # Handle RP search
-            elif rp_names:
-                query = get_rp_details(rp_names, self.query)
-            elif search:
-                query = search_software(search)
+            limit, after = parse_page_params(params)
+            next_after = None
+
+            # Only full-text searches return their results in rank order
+            ranked = False
+
+            # Pages of the whole catalog or of RPs are read from the snapshot's
+            #   sorted indexes instead of filtering every row
+            if limit is not None and software_names == '*':
+                with time_stage('filter', 'page'):
+                    positions, next_after = self.catalog.page(after, limit)
+            elif limit is not None and rp_names and not software_names:
+                rp_keys = [name.lower() for name in rp_names.split('+')]
+                with time_stage('filter', 'page'):
+                    positions, next_after = self.catalog.page(
+                        after, limit, rp_keys=rp_keys
+                    )
             else:
-                return make_response(({'message': 'Invalid request parameters'}), 400)
+                # Handle software search
+                if software_names:
+                    with time_stage('filter', 'get_software_details'):
+                        df = get_software_details(software_names, self.catalog.merged_df)
+                    positions = None if df is None else df.index.tolist()
+                # Handle RP search
+                elif rp_names:
+                    with time_stage('filter', 'get_rp_details'):
+                        df = get_rp_details(rp_names, self.catalog.merged_df)
+                    positions = None if df is None else df.index.tolist()
+                elif search:
+                    positions, ranked = self.search(search)
+                else:
+                    return make_response(({'message': 'Invalid request parameters'}), 400)
+
+                # Paginated results are always ordered by software_name
+                if limit is not None and positions:
+                    with time_stage('filter', 'page'):
+                        positions, next_after = self.catalog.page(
+                            after, limit, positions=positions
+                        )
+                    ranked = False
 
 
             # If no data found, handle the error
-            if query is None:
+            if not positions:
                 return make_response({'message': 'No data found'}, 404)
 
-            # Convert query result to a list of dictionaries
-            query = list(query.dicts())
-
-            # Define column inclusion/exclusion
-            grouped_data = {}
-
-            for row in query:
-                software_name = row['software_name']
-                if software_name not in grouped_data:
-                    grouped_data[software_name] = {
-                        'software_name': software_name,
-                        'software_description': row['software_description'],
-                        'ai_description': row['ai_description'],
-                        'ai_core_features': row['ai_core_features'],
-                        'software_documentation': row['software_documentation'],
-                        'ai_software_type': row['ai_software_type'],
-                        'ai_research_area': row['ai_research_area'],
-                        'ai_research_discipline': row['ai_research_discipline'],
-                        'ai_general_tags': row['ai_general_tags'],
-                        'software_web_page': row['software_web_page'],
-                        'ai_research_field': row['ai_research_field'],
-                        'software_use_link': row['software_use_link'],
-                        'ai_software_class': row['ai_software_class'],
-                        'ai_example_use': row['ai_example_use'],
-                        'rp_name': [],
-                        'rp_group_id': [],
-                        'rp_software_documentation': [],
-                        'software_versions': []
-                    }
-
-                # Append RP-specific information to lists
-                grouped_data[software_name]['rp_name'].append(row['rp_name'])
-                grouped_data[software_name]['rp_group_id'].append(row['rp_group_id'])
-                grouped_data[software_name]['rp_software_documentation'].extend(
-                    self.format_software_info([row], [row['rp_software_documentation']])
-                )
-                grouped_data[software_name]['software_versions'].extend(
-                    self.format_software_info([row], [row['software_versions']])
+            # Per-software documents are aggregated once per catalog snapshot.
+            #   Full-text searches keep their rank order.
+            with time_stage('aggregate'):
+                documents = self.catalog.select_documents(
+                    positions,
+                    self.RP_INFO_SEPARATOR,
+                    self.MISSING_VALUE,
+                    ranked=ranked,
                 )
 
-            # Apply include/exclude columns to filtered data
+            # Apply include/exclude columns, key fields are always included
             essential_columns = {'software_name', 'rp_name', 'rp_group_id'}
+            columns = DOCUMENT_COLUMNS
             if include_columns:
                 include_columns = include_columns.union(essential_columns)
-                filtered_data = [
-                    {col: row[col] for col in row if col in include_columns}
-                    for row in grouped_data.values()
-            ]
+                columns = [col for col in columns if col in include_columns]
             elif exclude_columns:
-                filtered_data = [
-                    {col: row[col] for col in row if col not in exclude_columns}
-                    for row in grouped_data.values()
-            ]
-            else:
-                filtered_data = list(grouped_data.values())
-
-            # rp name and rp_groups are duplicated becuase multiple rp_resource_ids have
-            #   the same software so the following will de-duplicate them
-            print(filtered_data[0])
-            for item in filtered_data:
-                if "rp_name" in item:
-                    item["rp_name"] = sorted(list(set(item["rp_name"])))
-                if "rp_group_id" in item:
-                    item["rp_group_id"] = sorted(list(set(item["rp_group_id"])))
-                if "rp_software_documentation" in item:
-                    item["rp_software_documentation"] = sorted(list(set(item["rp_software_documentation"])))
-                if "software_versions" in item:
-                    item["software_versions"] = sorted(list(set(item["software_versions"])))
-
-            # Sort `filtered_data` alphabetically by `software_name`
-            filtered_data = sorted(filtered_data, key=lambda x: x.get('software_name', ''))
-
-            # Enforce desired column order on the filtered data
-            desired_column_order = [
-                'software_name', 'rp_name', 'rp_group_id', 'software_description', 'ai_description',
-                'ai_core_features', 'software_documentation', 'ai_software_type', 'ai_research_area',
-                'ai_research_discipline', 'ai_general_tags', 'software_web_page', 'ai_research_field',
-                'software_use_link', 'rp_software_documentation', 'software_versions',
-                'ai_software_class', 'ai_example_use'
-            ]
-
-            ordered_result_data = [
-                {col: item.get(col) for col in desired_column_order if col in item}
-                for item in filtered_data
-            ]
-
-
-            # Return as CSV or JSON
-            if response_type == 'csv':
-                csv_output = pd.DataFrame(ordered_result_data)
-                return Response(csv_output.to_csv(index=False), mimetype='text/csv')
-            if response_type == 'json':
-                return jsonify(ordered_result_data)
-            elif response_type == 'html':
-                html_output = pd.DataFrame(ordered_result_data)
-                return Response(html_output.to_html(index=False), mimetype='text/html')
+                columns = [col for col in columns if col not in exclude_columns]
+
+            # Documents are sorted by `software_name` (or search rank) and keep
+            #   the DOCUMENT_COLUMNS order
+            ordered_result_data = project_documents(documents, columns)
+
+
+            # Return as CSV, JSON or HTML, serialized while the response is sent
+            return stream_response(
+                ordered_result_data,
+                columns,
+                response_type,
+                headers=page_headers(next_after),
+            )
 
         except Exception as e:
             print(e)
@@ -190,49 +157,40 @@ class API_0_1(Resource):
             if not view_db.is_closed():
                 view_db.close()
 
-    def format_software_info(self, query, x):
+    def search(self, search):
         """
-        Formats and combines `rp_software_documentation` or `software_versions`
-        entries for JSON output by pairing each RP name with the respective
-        documentation or version info.
+        Runs a column-specific search. Substring searches are answered from
+        the catalog snapshot's in-memory search index. Full-text searches need
+        Postgres, so they are sent to the database.
         Args:
-            query (list): a list of dictionaries, each containing data for a specific
-                        RP, including the 'rp_name' field
-            x (list): a list of strings representing the 'rp_software_documentation'
-                        or 'software_versions' for each RP
+            search (list): search groups, i.e. ['rp_name(anvil)&software_name(7z)']
 
         Returns:
-            formatted_list (list): a list of strings where each entry is in the format
-            'rp_name: info', combining RP names with their respective software
-            documentation or version information
+            positions (list | None): positions in `self.catalog.rows` of the
+                matching rows, None or empty if nothing matched
+            ranked (bool): True if positions are ordered by search rank
         """
-        # Takes two iterables (the list of dictionaries `query` and the list `x` containing rp_software_documentation or software_versions).
-        # Pairs each dictionary in `query` with the corresponding item in `x`, combining `rp_name` with the documentation or version info.
-        # Returns a formatted list of strings in the format "rp_name: info".
-        return [f"{row['rp_name']}:    {info}" for row, info in zip(query, x)]
-
-
-    @db_operation('view')
-    def load_tables(self):
-        """Gets all available data for all software
+        if is_ranked_search(search):
+            if self.search_ids is not None:
+                return self.search_positions(self.search_ids), True
+            # Only the ids are needed, the rows themselves come from the snapshot
+            with time_stage('filter', 'search_software'):
+                result = search_software(search, fields=[CatalogView.id])
+                positions = (
+                    self.search_positions(row.id for row in result) if result else None
+                )
+            return positions, True
+        with time_stage('filter', 'search_index'):
+            return self.catalog.search_index.search(find_search_groups(search)), False
 
-        Queries the database using Peewee joins to retrieve comprehensive
-        information on software hosted across different Resource Providers (RPs).
-        The function performs multiple joins to gather data from related tables
-        (e.g., software, RP details, AI software information) and returns it as
-        a Peewee query object.
+    def search_positions(self, ids):
+        """
+        Maps the rows found by a database search to their positions in the
+        catalog snapshot. Rows that are not in the snapshot yet are skipped.
+        Args:
+            ids (Iterable[int]): catalog view ids of the found rows
 
         Returns:
-            peewee.ModelSelect: A Peewee Query object containing the joined data
-                for all relevant fields across multiple tables, enabling efficient
-                access to detailed software and RP information without conversion
-                to a DataFrame.
-
+            positions (list): positions in `self.catalog.rows` of the found rows
         """
-        with db.atomic():
-            #Peewee join table query
-            query = (RPSoftware.select(RPSoftware,Software, RPS, AISoftwareInfo)
-                     .join(Software, on = (RPSoftware.software_id == Software.id))
-                     .join(RPS, on = (RPSoftware.rp_id == RPS.id))
-                     .left_outer_join(AISoftwareInfo, on = (AISoftwareInfo.software_id == Software.id)))
-        return query
+        return self.catalog.positions_of_ids(ids)
@@ -0,0 +1,244 @@
+"""ASGI server for the read-only versioned API.
+
+Serves the same `/<api_version>/<api_key>/<query>` URLs and `api_versions`
+mapping as the uwsgi deployment. Database I/O (API key checks, catalog
+version checks and full-text searches) runs on an asyncpg pool instead of
+blocking a process, so one worker can keep many slow clients connected.
+Queries are answered from the same catalog snapshot and response cache as
+the Flask app; the website and every other route stay on uwsgi.
+
+The Flask code answering a query (filtering, building documents,
+serialization and compression) is CPU-bound, so it runs on a pool of
+ASGI_THREADS threads, one step at a time, and the event loop keeps
+serving the other clients meanwhile. The threads share the GIL, so this
+doesn't add throughput over uwsgi's processes; it keeps a slow query from
+stalling every other client of the worker.
+
+Run it with (from the repository root):
+    uvicorn app.asgi:asgi_app --host 0.0.0.0 --port 8080 --workers 5
+"""
+
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import g
+from app import app, api_versions, versioned_response
+from app.api_0_1 import API_0_1
+from app.app_logging import logger
+from app.metrics import request_seconds, time_stage
+from core.models import query_origin
+from core.db_logic.async_db import (
+    create_pool,
+    get_catalog_async,
+    search_ids_async,
+    validate_api_key_async,
+)
+from core.db_logic.get_software_details import is_ranked_search, split_search_string
+
+# Threads of a worker answering queries with the Flask code
+ASGI_THREADS = int(os.getenv("ASGI_THREADS", 8))
+
+
+async def send_json(send, status: int, message: str) -> None:
+    """Sends an error response, with the same body as the Flask app's"""
+    body = json.dumps({"message": message}, separators=(",", ":")).encode() + b"\n"
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json")],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+def ranked_search(api_class, query: str) -> list[str] | None:
+    """Returns the search groups of a query that needs a full-text search in
+    the database, None for queries answered from the snapshot alone"""
+    if api_class is not API_0_1:
+        return None
+    try:
+        params = dict(item.split("=") for item in query.split(","))
+    except ValueError:
+        return None
+    search = split_search_string(params.get("search", ""))
+    return search if search and is_ranked_search(search) else None
+
+
+class AsyncAPI:
+    """ASGI application answering GET requests of the versioned API.
+
+    Attributes:
+        pool (asyncpg.Pool): Connection pool of the worker, opened at startup
+    """
+
+    def __init__(self):
+        self.pool = None
+        self.executor = ThreadPoolExecutor(ASGI_THREADS, thread_name_prefix="asgi-api")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.handle(scope, send)
+
+    async def lifespan(self, receive, send):
+        """Opens the pool and loads the catalog before serving requests"""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.pool = await create_pool()
+                await get_catalog_async(self.pool)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.pool.close()
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def handle(self, scope, send):
+        if scope["method"] != "GET":
+            return await send_json(send, 405, "Method not allowed")
+        parts = scope["path"].strip("/").split("/")
+        if len(parts) != 3:
+            return await send_json(send, 404, "Not found")
+        api_version, api_key, query = parts
+        started = time.perf_counter()
+        with query_origin(f"{api_version} {query}"):
+            await self.respond(scope, send, api_version, api_key, query, started)
+
+    async def respond(self, scope, send, api_version, api_key, query, started):
+        """Answers an API query, see handle"""
+        # Errors are answered like the Flask app does: a failing search with
+        #   the API's 404, anything else with flask_restful's 500
+        try:
+            with time_stage("validate_api_key"):
+                valid = await validate_api_key_async(self.pool, api_key)
+            if not valid:
+                logger.error(f"Invalid or missing API key: {api_key}")
+                return await send_json(send, 401, "Invalid or missing API key")
+            api_class = api_versions.get(api_version)
+            if api_class is None:
+                return await send_json(
+                    send, 404, f"API version '{api_version}' not found."
+                )
+
+            with time_stage("load_catalog"):
+                catalog = await get_catalog_async(self.pool)
+        except Exception:
+            logger.exception(f"Failed to answer {scope['path']}")
+            return await send_json(send, 500, "Internal Server Error")
+        api_args = {}
+        search = ranked_search(api_class, query)
+        if search is not None:
+            try:
+                with time_stage("filter", "search_software"):
+                    api_args["search_ids"] = await search_ids_async(self.pool, search)
+            except Exception:
+                logger.exception(f"Search failed: {scope['path']}")
+                return await send_json(send, 404, "Invalid request parameters")
+
+        # The query itself is answered by the Flask code, in a request
+        #   context built from the ASGI scope. Every step runs on the
+        #   executor in the same contextvars context, which holds the
+        #   Flask request context from start to finish.
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+
+        def in_thread(function, *args):
+            return loop.run_in_executor(
+                self.executor, functools.partial(context.run, function, *args)
+            )
+
+        try:
+            request_context, response, chunks, chunk = await in_thread(
+                start_response, scope, api_class, catalog, query, api_key, api_args
+            )
+        except Exception:
+            logger.exception(f"Failed to answer {scope['path']}")
+            return await send_json(send, 500, "Internal Server Error")
+        try:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": response.status_code,
+                    "headers": [
+                        (name.lower().encode("latin-1"), value.encode("latin-1"))
+                        for name, value in response.headers.items()
+                    ],
+                }
+            )
+            # Streamed bodies are serialized (and compressed) chunk by chunk,
+            #   the request is finished with the last one
+            while chunk is not None:
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": True}
+                )
+                chunk = await in_thread(next_chunk, chunks, request_context, response)
+        finally:
+            if chunk is not None:  # The client left or sending failed
+                await in_thread(finish_response, request_context, response)
+        await send({"type": "http.response.body", "body": b""})
+        # Same series as the Flask app's VersionedAPI requests
+        request_seconds.observe(
+            time.perf_counter() - started, "versionedapi", str(response.status_code)
+        )
+
+
+def start_response(scope, api_class, catalog, query, api_key, api_args):
+    """Pushes a Flask request context for an ASGI request and answers the
+    query in it. Runs on the executor, see AsyncAPI.respond.
+
+    Returns:
+        tuple[RequestContext, Response, Iterator[bytes], bytes | None]: The
+            pushed context, the response, the iterator of its body and the
+            first chunk of the body. Without a body the request is already
+            finished, see next_chunk.
+    """
+    path = scope.get("raw_path") or scope["path"].encode()
+    headers = [
+        (name.decode("latin-1"), value.decode("latin-1"))
+        for name, value in scope["headers"]
+    ]
+    request_context = app.test_request_context(path.decode("latin-1"), headers=headers)
+    request_context.push()
+    try:
+        app.preprocess_request()
+        g.validated_api_key = api_key
+        response = versioned_response(api_class, catalog, query, api_key, **api_args)
+        if response is None:
+            # Unknown `type=`, flask_restful sends this as a JSON null
+            response = app.make_response(
+                (b"null\n", 200, {"Content-Type": "application/json"})
+            )
+    except BaseException:
+        request_context.pop()
+        raise
+    chunks = response.iter_encoded()
+    first_chunk = next_chunk(chunks, request_context, response)
+    return request_context, response, chunks, first_chunk
+
+
+def next_chunk(chunks, request_context, response) -> bytes | None:
+    """Returns the next chunk of a body. After the last one the response is
+    closed and its request context popped, and None is returned."""
+    try:
+        return next(chunks)
+    except StopIteration:
+        finish_response(request_context, response)
+        return None
+
+
+def finish_response(request_context, response) -> None:
+    """Closes the response and pops its request context"""
+    try:
+        response.close()
+    finally:
+        request_context.pop()
+
+
+asgi_app = AsyncAPI()
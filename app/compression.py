@@ -0,0 +1,90 @@
+import gzip
+import itertools
+import os
+import zlib
+from collections.abc import Iterable, Iterator
+from flask import Response
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, gzip is always available
+    zstandard = None
+
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", 10))
+# Bodies smaller than this are always sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+
+# Supported content codings, preferred first
+ENCODINGS = ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encodings) -> str | None:
+    """Picks the content coding of a response from the client's preferences.
+
+    Args:
+        accept_encodings (werkzeug.datastructures.Accept): The request's
+            parsed `Accept-Encoding` header (`request.accept_encodings`)
+
+    Returns:
+        str | None: 'zstd' or 'gzip', None to send the body uncompressed
+    """
+    encoding = accept_encodings.best_match(ENCODINGS + ("identity",))
+    return None if encoding == "identity" else encoding
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compresses a whole body with the given content coding"""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """Compresses a body chunk by chunk while it is being sent"""
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    else:
+        # wbits=31 writes a gzip header and trailer
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def compress_response(response: Response, encoding: str | None) -> Response:
+    """Makes a streaming response send its body with the given content coding.
+
+    Bodies smaller than COMPRESS_MIN_BYTES are sent unchanged, like cached
+    ones (see ResponseCache.respond). Only the start of the body is read to
+    find out, the rest is still compressed while it is sent.
+
+    Args:
+        response (Response): Response whose body isn't compressed yet
+        encoding (str | None): Output of negotiate_encoding, None leaves the
+            response unchanged
+
+    Returns:
+        Response: The same response object
+    """
+    if encoding is None:
+        return response
+    chunks = response.iter_encoded()
+    head = []
+    size = 0
+    for chunk in chunks:
+        head.append(chunk)
+        size += len(chunk)
+        if size >= COMPRESS_MIN_BYTES:
+            break
+    else:
+        # The whole body was read
+        response.response = head
+        return response
+    response.response = compress_stream(itertools.chain(head, chunks), encoding)
+    response.headers["Content-Encoding"] = encoding
+    response.headers.pop("Content-Length", None)
+    return response
@@ -0,0 +1,328 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from app.response_cache import response_cache
+
+# Directory every worker writes its metrics to, merged by render_metrics.
+#   Must be shared by the workers of a server, not by several servers.
+METRICS_DIR = os.getenv(
+    "METRICS_DIR",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data/metrics"
+    ),
+)
+# Seconds between writes of a worker's metrics, the staleness of a scrape
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", 1))
+
+# Upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+# Upper bounds of the DB queries and rows fetched per request buckets
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 100, 1000, 10000, 100000)
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    """Escapes a label value for the text format"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names: Iterable[str], values: Iterable[str]) -> str:
+    """Formats label pairs, i.e. 'stage="filter",operation="search_index"'"""
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+class Histogram:
+    """Thread-safe Prometheus histogram with a fixed set of label names.
+
+    Every distinct combination of label values is one series with its own
+    bucket counts, sum and count.
+
+    Attributes:
+        name (str): Metric name
+        documentation (str): HELP text
+        label_names (tuple[str, ...]): Names of the labels of every series
+        buckets (tuple[float, ...]): Sorted upper bounds, +Inf is implied
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: tuple, buckets: tuple):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        """Records one value in the series of the given label values"""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                counts = [0] * (len(self.buckets) + 1)
+                series = self._series[label_values] = [counts, 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+        _start_flusher()
+
+    @contextmanager
+    def time(self, *label_values: str):
+        """Records the seconds spent in the block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def state(self) -> list:
+        """Copy of every series: [label values, bucket counts, sum, count]"""
+        with self._lock:
+            return [
+                [list(values), list(counts), total, count]
+                for values, (counts, total, count) in self._series.items()
+            ]
+
+    def expose(self, states: Iterable[list]) -> Iterator[str]:
+        """Lines of the histogram in the Prometheus text format.
+
+        Args:
+            states (Iterable[list]): Series of every worker (see state), the
+                series with the same label values are added up
+        """
+        merged = {}
+        for label_values, counts, total, count in states:
+            series = merged.setdefault(tuple(label_values), [[0] * len(counts), 0.0, 0])
+            series[0] = [a + b for a, b in zip(series[0], counts)]
+            series[1] += total
+            series[2] += count
+
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for label_values, (counts, total, count) in sorted(merged.items()):
+            labels = _label_text(self.label_names, label_values)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                yield f'{self.name}_bucket{{{labels},le="{le}"}} {cumulative}'
+            yield f"{self.name}_sum{{{labels}}} {total!r}"
+            yield f"{self.name}_count{{{labels}}} {count}"
+
+
+# Time of each stage of an API query. `operation` tells the filters and
+#   response types apart, it is empty for the other stages.
+stage_seconds = Histogram(
+    "sds_api_stage_seconds",
+    "Seconds spent in each stage of answering API queries.",
+    ("stage", "operation"),
+    LATENCY_BUCKETS,
+)
+request_seconds = Histogram(
+    "sds_request_seconds",
+    "Seconds from the start of a request until its response was sent.",
+    ("endpoint", "status"),
+    LATENCY_BUCKETS,
+)
+request_db_queries = Histogram(
+    "sds_request_db_queries",
+    "SQL statements run per request.",
+    ("endpoint",),
+    COUNT_BUCKETS,
+)
+request_db_rows = Histogram(
+    "sds_request_db_rows",
+    "Rows fetched from the database per request.",
+    ("endpoint",),
+    COUNT_BUCKETS,
+)
+HISTOGRAMS = (stage_seconds, request_seconds, request_db_queries, request_db_rows)
+
+
+def time_stage(stage: str, operation: str = ""):
+    """Times a stage of an API query into sds_api_stage_seconds.
+
+    >>> with time_stage("filter", "get_software_details"):
+    ...     df = get_software_details(software_names, merged_df)
+    """
+    return stage_seconds.time(stage, operation)
+
+
+def timed_chunks(chunks: Iterable, stage: str, operation: str = "") -> Iterator:
+    """Passes chunks through, recording the time spent producing them (not
+    the time the client takes to read them) as one observation of a stage.
+    Used for bodies serialized while they are streamed."""
+    elapsed = 0.0
+    iterator = iter(chunks)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - start
+            yield chunk
+    finally:
+        stage_seconds.observe(elapsed, stage, operation)
+
+
+# Response cache counters: name, type, HELP text. Counters are added up over
+#   every worker that ran since the server started, gauges over the running
+#   ones, except max_bytes which is the same in every worker.
+CACHE_METRICS = (
+    ("hits", "counter", "API responses served from the response cache."),
+    ("misses", "counter", "Cacheable API queries not found in the response cache."),
+    ("evictions", "counter", "Entries evicted from the response cache."),
+    ("entries", "gauge", "Entries in the response cache."),
+    ("bytes", "gauge", "Bytes held by the response cache."),
+    ("max_bytes", "gauge", "Size limit of the response cache (RESPONSE_CACHE_BYTES)."),
+)
+
+# Pid of the process the flusher thread runs in, threads don't survive fork
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+# Whether init_metrics already ran in this process
+_initialized = False
+
+
+def _metrics_file(pid: int) -> str:
+    return os.path.join(METRICS_DIR, f"{pid}.json")
+
+
+def _process_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def flush_metrics() -> None:
+    """Writes this process's metrics to its file in METRICS_DIR"""
+    stats = response_cache.stats()
+    state = {
+        "histograms": {histogram.name: histogram.state() for histogram in HISTOGRAMS},
+        "cache": {name: stats[name] for name, _, _ in CACHE_METRICS},
+    }
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = _metrics_file(os.getpid())
+    staging = f"{path}.tmp"
+    with open(staging, "w", encoding="utf-8") as state_file:
+        json.dump(state, state_file)
+    os.replace(staging, path)
+
+
+def _flush_periodically() -> None:
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        flush_metrics()
+
+
+def _start_flusher() -> None:
+    """Starts the thread writing this process's metrics every
+    METRICS_FLUSH_SECONDS, once per process (uwsgi workers are forked)"""
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+        threading.Thread(
+            target=_flush_periodically, name="metrics-flusher", daemon=True
+        ).start()
+        atexit.register(flush_metrics)
+
+
+def remove_stale_metrics() -> None:
+    """Removes the metrics files of processes that are no longer running.
+
+    Called by init_metrics, i.e. once in the uwsgi master before the
+    workers are forked, so the counters of a previous server don't add
+    up with the new ones. Files of workers that exit while the server runs
+    are kept, so the merged counters never go down.
+    """
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        pid = os.path.basename(path).split(".")[0]
+        if pid.isdigit() and not _process_running(int(pid)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def render_metrics() -> str:
+    """Returns the metrics of every worker in the Prometheus text format.
+
+    Every worker keeps its own metrics and writes them to METRICS_DIR every
+    METRICS_FLUSH_SECONDS. A scrape, whichever worker answers it, adds up
+    the files of all workers (after writing its own), so the series don't
+    depend on the worker that answered.
+    """
+    flush_metrics()
+    states = []
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        try:
+            with open(path, encoding="utf-8") as state_file:
+                state = json.load(state_file)
+        except (OSError, ValueError):  # Removed or being replaced
+            continue
+        pid = os.path.basename(path).split(".")[0]
+        states.append((int(pid), state))
+
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(
+            histogram.expose(
+                series
+                for _, state in states
+                for series in state["histograms"].get(histogram.name, [])
+            )
+        )
+
+    for name, kind, documentation in CACHE_METRICS:
+        values = [
+            state["cache"][name]
+            for pid, state in states
+            if kind == "counter" or _process_running(pid)
+        ]
+        value = max(values, default=0) if name == "max_bytes" else sum(values)
+        metric = f"sds_response_cache_{name}" + ("_total" if kind == "counter" else "")
+        lines.append(f"# HELP {metric} {documentation}")
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _reset_after_fork() -> None:
+    """Forked workers start empty, what the parent observed is in its file"""
+    for histogram in HISTOGRAMS:
+        histogram._series = {}
+
+
+def init_metrics() -> None:
+    """Prepares the metrics of a new server, once per process.
+
+    Removes the files of processes that are no longer running and makes
+    forked workers start with empty series. Called at app startup, i.e. in
+    the uwsgi master before the workers are forked.
+    """
+    global _initialized
+    if _initialized:
+        return
+    _initialized = True
+    remove_stale_metrics()
+    os.register_at_fork(after_in_child=_reset_after_fork)
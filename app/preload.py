@@ -0,0 +1,100 @@
+import gc
+import os
+from app.app_logging import logger
+from core.db_logic.catalog import get_catalog
+from core.models import admin_db, edit_db, view_db
+
+try:
+    import uwsgi
+except ImportError:  # Not running under uwsgi
+    uwsgi = None
+
+# Load the catalog in the uwsgi master before the workers are forked
+PRELOAD_CATALOG = os.getenv("PRELOAD_CATALOG", "1") == "1"
+
+# Fields of /proc/<pid>/smaps_rollup reported by memory_usage, in kB
+MEMORY_FIELDS = (
+    "Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"
+)
+
+
+def memory_usage(pid: int | str = "self") -> dict[str, int]:
+    """Reads the memory use of a process from /proc/<pid>/smaps_rollup.
+
+    Rss counts every resident page, Pss divides shared pages between the
+    processes sharing them. Pages inherited from the uwsgi master stay in
+    Shared_* until a worker writes to them.
+
+    Returns:
+        dict[str, int]: MEMORY_FIELDS to their value in kB, empty if the
+            file can't be read (i.e. not on Linux)
+    """
+    usage = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", encoding="utf-8") as smaps:
+            for line in smaps:
+                name, _, value = line.partition(":")
+                if name in MEMORY_FIELDS:
+                    usage[name] = int(value.split()[0])
+    except OSError:
+        pass
+    return usage
+
+
+def preload_catalog(api_classes) -> None:
+    """Builds everything requests read from the catalog snapshot in the uwsgi
+    master, so forked workers share it copy-on-write.
+
+    Loads the snapshot, its search index and the documents of every API
+    version, then closes the master's database connections (workers must
+    not share them) and freezes the loaded objects out of the garbage
+    collector, whose bookkeeping would otherwise write to (and so copy)
+    every page. A worker still builds its own snapshot when the catalog
+    version changes.
+
+    Args:
+        api_classes (Iterable[type]): API classes, their RP_INFO_SEPARATOR and
+            MISSING_VALUE select the documents to build
+    """
+    catalog = get_catalog()
+    catalog.build_search_index()
+    for api_class in set(api_classes):
+        catalog.documents(api_class.RP_INFO_SEPARATOR, api_class.MISSING_VALUE)
+
+    for database in (admin_db, edit_db, view_db):
+        database.close_all()
+
+    gc.collect()
+    gc.freeze()
+    logger.info(
+        f"Catalog snapshot {catalog.version} preloaded in the uwsgi master, "
+        f"{gc.get_freeze_count()} objects frozen, memory (kB): {memory_usage()}"
+    )
+
+
+def report_worker_memory() -> None:
+    """Logs the memory use of a worker right after it was forked"""
+    logger.info(
+        f"uwsgi worker {uwsgi.worker_id()} (pid {os.getpid()}) "
+        f"memory (kB): {memory_usage()}"
+    )
+
+
+def setup_preload(api_classes) -> None:
+    """Preloads the catalog when the app is imported by the uwsgi master.
+
+    Nothing is done outside uwsgi, with PRELOAD_CATALOG=0, or with
+    `lazy-apps`, where every worker imports the app itself.
+    """
+    if uwsgi is None or not PRELOAD_CATALOG or uwsgi.worker_id() != 0:
+        return
+    try:
+        preload_catalog(api_classes)
+    except Exception:
+        # Workers load the catalog on their first request instead
+        logger.exception("Unable to preload the catalog in the uwsgi master.")
+        return
+
+    from uwsgidecorators import postfork
+
+    postfork(report_worker_memory)
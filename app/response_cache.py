@@ -0,0 +1,250 @@
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
+from flask import Response
+from app.compression import compress, COMPRESS_MIN_BYTES
+
+# Total size (in bytes) of the response bodies a worker keeps, 0 disables it
+RESPONSE_CACHE_BYTES = int(os.getenv("RESPONSE_CACHE_BYTES", 64 * 1024 * 1024))
+# Larger responses are sent but not cached
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(
+    os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", RESPONSE_CACHE_BYTES // 4)
+)
+
+# Parameters holding '+' separated, case-insensitive names
+NAME_LIST_PARAMS = {"software", "rp"}
+# Parameters holding '+' separated column names
+COLUMN_LIST_PARAMS = {"include", "exclude"}
+# Headers that are recomputed for every response
+UNCACHED_HEADERS = {
+    "content-length",
+    "content-encoding",
+    "etag",
+    "last-modified",
+    "vary",
+}
+
+
+def normalize_query(query: str) -> str | None:
+    """Returns a canonical form of an API query for use as a cache key.
+
+    Queries that give the same response normalize to the same string:
+    parameters are sorted, `software=` and `rp=` names are lowercased,
+    deduplicated and sorted, `include=` / `exclude=` columns are deduplicated
+    and sorted, and `type=` is lowercased. Other values are kept as is.
+
+    Args:
+        query (str): User's api query, i.e. 'type=CSV,software=gromacs+7Z'
+
+    Returns:
+        str | None: i.e. 'software=7z+gromacs,type=csv', None if the query
+            can't be parsed (it isn't cached)
+    """
+    try:
+        params = dict(item.split("=") for item in query.split(","))
+    except ValueError:
+        return None
+
+    normalized = {}
+    for key, value in params.items():
+        if key in NAME_LIST_PARAMS:
+            value = "+".join(sorted({name.lower() for name in value.split("+")}))
+        elif key in COLUMN_LIST_PARAMS:
+            value = "+".join(sorted(set(filter(None, value.split("+")))))
+        elif key == "type":
+            value = value.lower()
+        normalized[key] = value
+    return ",".join(f"{key}={normalized[key]}" for key in sorted(normalized))
+
+
+class CachedResponse:
+    """Serialized body and headers of a successful API response.
+
+    Attributes:
+        body (bytes): Uncompressed body
+        headers (list[tuple[str, str]]): Response headers
+        encoded (dict[str, bytes]): Content coding ('gzip', 'zstd') to the
+            compressed body, added the first time a client asks for it
+    """
+
+    __slots__ = ("body", "headers", "encoded")
+
+    def __init__(self, body: bytes, headers: list[tuple[str, str]]):
+        self.body = body
+        self.headers = headers
+        self.encoded = {}
+
+    @property
+    def size(self) -> int:
+        """Bytes held by the entry, counted against the cache budget"""
+        return len(self.body) + sum(len(body) for body in self.encoded.values())
+
+    def to_response(self, encoding: str | None = None) -> Response:
+        """Creates the response, with the body compressed as `encoding` if the
+        compressed body was added to `encoded`"""
+        body = self.encoded.get(encoding)
+        if body is None:
+            return Response(self.body, headers=self.headers)
+        response = Response(body, headers=self.headers)
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of serialized API responses, bounded by the
+    total size of the cached bodies.
+
+    Entries belong to one catalog snapshot; the whole cache is dropped as
+    soon as a request sees a newer snapshot version. Compressed bodies are
+    kept next to the uncompressed one, so a response is compressed at most
+    once per encoding and snapshot.
+
+    Attributes:
+        max_bytes (int): Maximum total size of the cached bodies
+        max_entry_bytes (int): Maximum size of a single cached body
+        hits (int): Number of responses served from the cache
+        misses (int): Number of cacheable requests not found in the cache
+        evictions (int): Number of entries dropped to stay within max_bytes
+        size (int): Current total size of the cached bodies, compressed
+            bodies included
+    """
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+        self._entries = OrderedDict()
+        self._catalog_version = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _check_version(self, catalog_version: int) -> None:
+        """Drops every entry when the catalog version changed, needs _lock"""
+        if catalog_version != self._catalog_version:
+            self._entries.clear()
+            self.size = 0
+            self._catalog_version = catalog_version
+
+    def get(self, key: tuple, catalog_version: int) -> CachedResponse | None:
+        """Returns the cached response for key, counting a hit or a miss"""
+        with self._lock:
+            self._check_version(catalog_version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def _evict(self) -> None:
+        """Drops least recently used entries until within max_bytes, needs _lock"""
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+            self.evictions += 1
+
+    def set(self, key: tuple, catalog_version: int, entry: CachedResponse) -> None:
+        """Caches a response, evicting the least recently used ones to make room"""
+        if entry.size > self.max_entry_bytes:
+            return
+        with self._lock:
+            self._check_version(catalog_version)
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous.size
+            self._entries[key] = entry
+            self.size += entry.size
+            self._evict()
+
+    def respond(
+        self, key: tuple, entry: CachedResponse, encoding: str | None
+    ) -> Response:
+        """Creates the response of a cached entry in the negotiated encoding.
+
+        The body is compressed on the first request for an encoding and the
+        result is added to the entry (and its size to the cache).
+        """
+        if encoding is None or len(entry.body) < COMPRESS_MIN_BYTES:
+            return entry.to_response()
+
+        if encoding not in entry.encoded:
+            body = compress(entry.body, encoding)
+            with self._lock:
+                if encoding not in entry.encoded:
+                    entry.encoded[encoding] = body
+                    if self._entries.get(key) is entry:
+                        self.size += len(body)
+                        self._evict()
+        return entry.to_response(encoding)
+
+    def store(self, key: tuple, catalog_version: int, response: Response) -> Response:
+        """Caches a streaming response once it has been sent completely.
+
+        The body is collected while it streams to the client, so the response
+        isn't delayed. Bodies that grow past max_entry_bytes stop being
+        collected and aren't cached.
+
+        Returns:
+            Response: The response to send in place of the given one
+        """
+        headers = [
+            (name, value)
+            for name, value in response.headers.items()
+            if name.lower() not in UNCACHED_HEADERS
+        ]
+
+        def on_complete(body: bytes) -> None:
+            self.set(key, catalog_version, CachedResponse(body, headers))
+
+        response.response = _collect(
+            response.iter_encoded(), self.max_entry_bytes, on_complete
+        )
+        return response
+
+    def clear(self) -> None:
+        """Drops every cached entry"""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        """Returns the counters used to tune the cache size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def _collect(chunks: Iterable[bytes], max_bytes: int, on_complete) -> Iterator[bytes]:
+    """Passes chunks through while joining them, calls on_complete with the
+    whole body once all chunks were sent and it fit in max_bytes"""
+    collected = []
+    size = 0
+    for chunk in chunks:
+        if collected is not None:
+            size += len(chunk)
+            if size > max_bytes:
+                collected = None
+            else:
+                collected.append(chunk)
+        yield chunk
+    if collected is not None:
+        on_complete(b"".join(collected))
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_BYTES, RESPONSE_CACHE_MAX_ENTRY_BYTES)
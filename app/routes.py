@@ -1,3 +1,4 @@
+import os
 import secrets
 import json, csv, io
 from collections import OrderedDict
@@ -7,6 +8,9 @@ from app.forms import QueryForm, APIKeyForm
 from core.models.software import Software
 from core.models.rps import RPS
 from core.models import db_proxy as db, use_db
+from app.response_cache import response_cache
+from app.preload import memory_usage
+from app.metrics import render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 
 ############
@@ -255,6 +259,41 @@ def execute_query(software, include, exclude):
             return None, str(e)
 
 
+#########################
+### Diagnostic Routes ###
+#########################
+def diagnostic_route(rule: str):
+    """Registers a view like `app.route`, only if the DIAGNOSTIC_ROUTES
+    setting is enabled. These routes show how the server is used and must
+    not be public."""
+    if app.config["DIAGNOSTIC_ROUTES"]:
+        return app.route(rule)
+    return lambda view: view
+
+
+@diagnostic_route("/cache_stats")
+def cache_stats():
+    """Hit/miss counters of this worker's API response cache, for tuning
+    RESPONSE_CACHE_BYTES"""
+    return jsonify(response_cache.stats())
+
+
+@diagnostic_route("/memory_stats")
+def memory_stats():
+    """Memory use (kB) of this worker, to check that the catalog preloaded
+    in the uwsgi master stays shared"""
+    return jsonify({"pid": os.getpid(), **memory_usage()})
+
+
+@diagnostic_route("/metrics")
+def metrics():
+    """Request latency per stage, DB queries and rows per request, and
+    response cache counters of all workers, in the Prometheus text format"""
+    response = make_response(render_metrics())
+    response.headers["Content-Type"] = METRICS_CONTENT_TYPE
+    return response
+
+
 ##########################
 # Generate API Key Route #
 ##########################
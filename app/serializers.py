@@ -0,0 +1,134 @@
+import csv
+from collections.abc import Iterable, Iterator
+from flask import Response, current_app
+from pandas.io.formats.printing import pprint_thing
+from app.metrics import timed_chunks
+
+# Serialized output is sent to the client in chunks of about this many characters
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Characters escaped in HTML cells, & first to prevent double escaping
+HTML_ESCAPES = {"&": r"&amp;", "<": r"&lt;", ">": r"&gt;"}
+
+MIMETYPES = {"json": "application/json", "csv": "text/csv", "html": "text/html"}
+
+
+class _LineBuffer:
+    """File-like target for csv.writer that hands back what was written"""
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, line: str) -> None:
+        self.lines.append(line)
+
+    def pop(self) -> str:
+        text = "".join(self.lines)
+        self.lines.clear()
+        return text
+
+
+def chunked(pieces: Iterable[str], chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[str]:
+    """Joins small pieces of output into chunks of about chunk_size characters"""
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield "".join(buffer)
+            buffer.clear()
+            size = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def json_records(records: Iterable[dict], dumps) -> Iterator[str]:
+    """Serializes records as a JSON array, one record at a time.
+
+    Produces the same text as `jsonify(list(records))` in non-debug mode.
+
+    Args:
+        records (Iterable[dict]): Response records
+        dumps (callable): The app's JSON dumps function (`current_app.json.dumps`)
+    """
+    yield "["
+    separator = ""
+    for record in records:
+        yield separator
+        yield dumps(record, separators=(",", ":"))
+        separator = ","
+    yield "]\n"
+
+
+def csv_records(records: Iterable[dict], columns: list[str]) -> Iterator[str]:
+    """Serializes records as CSV, one row at a time.
+
+    Produces the same text as `pd.DataFrame(records).to_csv(index=False)`:
+    lists are written with str() and None is written as an empty field.
+    """
+    buffer = _LineBuffer()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    yield buffer.pop()
+    for record in records:
+        writer.writerow([record[column] for column in columns])
+        yield buffer.pop()
+
+
+def _html_cell(value) -> str:
+    """Formats a value the way DataFrame.to_html formats an object column"""
+    if value is None:
+        text = "None"
+    else:
+        text = pprint_thing(value, escape_chars=("\t", "\r", "\n"))
+    return pprint_thing(text, escape_chars=HTML_ESCAPES).strip()
+
+
+def html_records(records: Iterable[dict], columns: list[str]) -> Iterator[str]:
+    """Serializes records as an HTML table, one row at a time.
+
+    Produces the same text as `pd.DataFrame(records).to_html(index=False)`.
+    """
+    yield '<table border="1" class="dataframe">\n  <thead>\n'
+    yield '    <tr style="text-align: right;">\n'
+    for column in columns:
+        yield f"      <th>{_html_cell(column)}</th>\n"
+    yield "    </tr>\n  </thead>\n  <tbody>\n"
+    for record in records:
+        yield "    <tr>\n"
+        for column in columns:
+            yield f"      <td>{_html_cell(record[column])}</td>\n"
+        yield "    </tr>\n"
+    yield "  </tbody>\n</table>"
+
+
+def stream_response(
+    records: Iterable[dict],
+    columns: list[str],
+    response_type: str,
+    headers: dict | None = None,
+) -> Response | None:
+    """Creates a streaming response that serializes records while it is sent.
+
+    Args:
+        records (Iterable[dict]): Response records, consumed lazily
+        columns (list[str]): Columns of each record, in output order
+        response_type (str): 'json', 'csv' or 'html'
+        headers (dict | None): Extra response headers
+
+    Returns:
+        Response | None: The streaming response, None for unknown types
+    """
+    match response_type:
+        case "json":
+            pieces = json_records(records, current_app.json.dumps)
+        case "csv":
+            pieces = csv_records(records, columns)
+        case "html":
+            pieces = html_records(records, columns)
+        case _:
+            return None
+    # Serialization time is recorded in the "serialize" stage metrics
+    body = timed_chunks(chunked(pieces), "serialize", response_type)
+    return Response(body, mimetype=MIMETYPES[response_type], headers=headers)
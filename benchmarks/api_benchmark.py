@@ -0,0 +1,236 @@
+"""End-to-end benchmark of the versioned API.
+
+Drives Api_0 and API_0_1 through the Flask test client with representative
+query mixes (`software=`, `rp=`, `search=`, `software=*`) in every `type=`,
+and reports throughput, latency percentiles and peak memory per mix. The
+queries are drawn from the loaded catalog with a fixed seed, so runs on the
+same catalog send the same requests. Latency covers the whole request,
+reading the (streamed) body included.
+
+The response cache is disabled unless `--cache` is given, so every request
+is answered by the API code. `--load` first replaces the database with a
+synthetic catalog (see benchmarks/synthetic_catalog.py). Results can be saved
+with `--json` and compared with a later run with `--baseline`.
+
+With DB_BACKEND=sqlite the benchmark runs without Postgres; the
+`search=fulltext` mix is then skipped (full-text search is Postgres only).
+
+Usage (from the repository root):
+    python -m benchmarks.api_benchmark --load --rps 30 --software 5000
+    python -m benchmarks.api_benchmark --requests 200 --json before.json
+    python -m benchmarks.api_benchmark --requests 200 --baseline before.json
+"""
+
+import argparse
+import json
+import random
+import resource
+import time
+import tracemalloc
+import numpy as np
+from core.models import supports
+from benchmarks.synthetic_catalog import (
+    SYNTHETIC_API_KEY,
+    WORDS,
+    RESEARCH_AREAS,
+    load_synthetic_catalog,
+)
+
+# Response types every mix is run in
+RESPONSE_TYPES = ("json", "csv", "html")
+# Mixes returning (most of) the catalog, run with --full-requests requests
+FULL_CATALOG_MIXES = {"software=*"}
+
+
+def query_mixes(catalog, rnd: random.Random) -> dict[str, tuple[list[str], callable]]:
+    """Returns the query mixes, drawing names from the catalog snapshot.
+
+    Returns:
+        dict[str, tuple[list[str], callable]]: Mix name to the API versions it
+            is run on and a function returning its next query (without type=)
+    """
+    software_names = catalog.software_names
+    rp_names = sorted({rp_key.split(".")[0] for rp_key in catalog.software_codes_by_rp})
+    both = ["API_0", "API_0.1"]
+    sample_size = min(3, len(software_names))
+    mixes = {
+        "software=<name>": (both, lambda: f"software={rnd.choice(software_names)}"),
+        "software=<3 names>": (
+            both,
+            lambda: "software=" + "+".join(rnd.sample(software_names, sample_size)),
+        ),
+        "rp=<name>": (both, lambda: f"rp={rnd.choice(rp_names)}"),
+        "software=*,limit=100": (both, lambda: "software=*,limit=100"),
+        "software=*": (both, lambda: "software=*"),
+        "search=<substring>": (
+            ["API_0.1"],
+            lambda: f"search=software_name({rnd.choice(software_names)[:3]})"
+            f"+ai_research_area({rnd.choice(RESEARCH_AREAS).lower()})"
+            f"&rp_name({rnd.choice(rp_names)})",
+        ),
+        # A package name, or a topic word matching much of the catalog
+        "search=fulltext": (
+            ["API_0.1"],
+            lambda: "search=fulltext("
+            f"{rnd.choice((rnd.choice(software_names), rnd.choice(WORDS).lower()))})",
+        ),
+    }
+    if not supports("fulltext"):
+        del mixes["search=fulltext"]
+    return mixes
+
+
+def run_mix(
+    client,
+    api_key: str,
+    version: str,
+    next_query,
+    count: int,
+    warmup: int,
+    trace_memory: bool,
+) -> dict:
+    """Sends warmup + count requests of a mix, timing the last count.
+
+    Returns:
+        dict: Results of the mix (see print_results)
+    """
+    for _ in range(warmup):
+        client.get(f"/{version}/{api_key}/{next_query()}").get_data()
+
+    if trace_memory:
+        tracemalloc.start()
+    latencies = []
+    statuses = {}
+    body_bytes = 0
+    for _ in range(count):
+        path = f"/{version}/{api_key}/{next_query()}"
+        start = time.perf_counter()
+        response = client.get(path)
+        body = response.get_data()
+        response.close()
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        body_bytes += len(body)
+    traced_peak = None
+    if trace_memory:
+        traced_peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1000
+    return {
+        "requests": count,
+        "throughput": count / sum(latencies),
+        "p50_ms": p50,
+        "p90_ms": p90,
+        "p99_ms": p99,
+        "max_ms": max(latencies) * 1000,
+        "mean_kb": body_bytes / count / 1024,
+        "statuses": {str(status): n for status, n in sorted(statuses.items())},
+        # ru_maxrss is in kB on Linux, the peak of the whole run so far
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "traced_peak_mb": traced_peak,
+    }
+
+
+def print_results(results: dict, baseline: dict | None) -> None:
+    header = (
+        f"{'mix':<44} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+        f"{'max ms':>8} {'KB':>8} {'RSS MB':>7} {'traced':>7}"
+    )
+    if baseline is not None:
+        header += f" {'p50 vs base':>11}"
+    print(header)
+    for name, result in results.items():
+        traced = result["traced_peak_mb"]
+        line = (
+            f"{name:<44} {result['throughput']:>8.1f} {result['p50_ms']:>8.2f} "
+            f"{result['p90_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['max_ms']:>8.2f} "
+            f"{result['mean_kb']:>8.1f} {result['peak_rss_mb']:>7.0f} "
+            f"{'-' if traced is None else f'{traced:.1f}':>7}"
+        )
+        if baseline is not None and name in baseline:
+            line += f" {result['p50_ms'] / baseline[name]['p50_ms']:>10.2f}x"
+        if set(result["statuses"]) != {"200"}:
+            line += f"  statuses {result['statuses']}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--load", action="store_true", help="Load a synthetic catalog first"
+    )
+    parser.add_argument("--rps", type=int, default=30)
+    parser.add_argument("--software", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--api-key", default=SYNTHETIC_API_KEY)
+    parser.add_argument("--requests", type=int, default=100, help="Requests per mix")
+    parser.add_argument(
+        "--full-requests", type=int, default=5, help="Requests per full catalog mix"
+    )
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument(
+        "--types", nargs="+", default=list(RESPONSE_TYPES), choices=RESPONSE_TYPES
+    )
+    parser.add_argument(
+        "--cache", action="store_true", help="Keep the response cache enabled"
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Trace Python allocations per mix (slower)",
+    )
+    parser.add_argument("--json", help="Save the results to this file")
+    parser.add_argument(
+        "--baseline", help="Results of an earlier run (--json) to compare with"
+    )
+    args = parser.parse_args()
+
+    if args.load:
+        load_synthetic_catalog(args.rps, args.software, args.seed, args.api_key)
+
+    from app import app
+    from app.response_cache import response_cache
+    from core.db_logic.catalog import get_catalog
+
+    if not args.cache:
+        response_cache.max_bytes = 0
+    client = app.test_client()
+    start = time.perf_counter()
+    catalog = get_catalog()
+    print(
+        f"Catalog: {len(catalog.rows)} rows, {len(catalog.software_names)} software, "
+        f"loaded in {time.perf_counter() - start:.2f}s"
+    )
+
+    rnd = random.Random(args.seed)
+    results = {}
+    for mix, (versions, next_query) in query_mixes(catalog, rnd).items():
+        count = args.full_requests if mix in FULL_CATALOG_MIXES else args.requests
+        for version in versions:
+            for response_type in args.types:
+                def typed_query(next_query=next_query, response_type=response_type):
+                    return f"{next_query()},type={response_type}"
+
+                results[f"{version} {mix},type={response_type}"] = run_mix(
+                    client,
+                    args.api_key,
+                    version,
+                    typed_query,
+                    count,
+                    args.warmup,
+                    args.trace_memory,
+                )
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+    print_results(results, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as results_file:
+            json.dump(results, results_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark of loading a catalog snapshot from the memory-mapped image.
+
+Compares building the snapshot DataFrame from row dicts (as done after
+reading the catalog view) with opening a catalog image written by
+`write_catalog_image`, on synthetic catalogs, and checks that both give the
+same rows, the same `get_software_details` / `get_rp_details` matches and
+the same software documents. Building a whole snapshot (its lookups work on
+the image's codes) is timed too. Reading the rows from the database, which
+the image also saves, isn't included.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_catalog_image
+    python -m benchmarks.bench_catalog_image --rows 100000 500000 --repeat 3
+"""
+
+import argparse
+import tempfile
+import pandas as pd
+from core.db_logic.catalog import CatalogSnapshot
+from core.db_logic.catalog_image import CatalogImage, write_catalog_image
+from core.db_logic.get_software_details import get_software_details, get_rp_details
+from benchmarks.bench_document_aggregation import best_time
+from benchmarks.synthetic_catalog import make_catalog_rows
+
+
+def open_snapshot(directory: str) -> CatalogSnapshot:
+    """Builds a snapshot from the image like a worker does, see reload_catalog"""
+    image = CatalogImage.open(f"{directory}/image")
+    return CatalogSnapshot(1, image, merged_df=image.frame())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 500_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f"{'rows':>8} {'frame (s)':>10} {'image frame (s)':>16} {'image snapshot (s)':>19} "
+        f"{'frame (MB)':>11} {'image frame (MB)':>17}"
+    )
+    for row_count in args.rows:
+        rows = make_catalog_rows(row_count)
+
+        with tempfile.TemporaryDirectory() as directory:
+            write_catalog_image(rows, None, f"{directory}/image")
+            image = CatalogImage.open(f"{directory}/image")
+
+            frame = pd.DataFrame(rows).fillna("")
+            image_frame = image.frame()
+            if image.rows().to_dicts() != rows:
+                raise SystemExit(f"Image rows differ for {row_count} rows")
+            software_names = (
+                f"{rows[0]['software_name']}+{rows[-1]['software_name'].upper()}"
+            )
+            for names, lookup in (
+                (software_names, get_software_details),
+                ("rp1+rp2", get_rp_details),
+            ):
+                matches = lookup(names, frame).index
+                if not matches.equals(lookup(names, image_frame).index):
+                    raise SystemExit(f"{lookup.__name__} differs for {row_count} rows")
+            snapshot = CatalogSnapshot(1, image, merged_df=image_frame)
+            if snapshot.documents(": ", "") != CatalogSnapshot(1, rows).documents(
+                ": ", ""
+            ):
+                raise SystemExit(f"Image documents differ for {row_count} rows")
+
+            from_rows = best_time(lambda: pd.DataFrame(rows).fillna(""), args.repeat)
+            # A new CatalogImage each time, so dictionaries are decoded again
+            from_image = best_time(
+                lambda: CatalogImage.open(f"{directory}/image").frame(), args.repeat
+            )
+            image_snapshot = best_time(lambda: open_snapshot(directory), args.repeat)
+            # Categorical columns only hold their codes, which are mapped
+            frame_mb = frame.memory_usage(deep=True).sum() / 2**20
+            image_frame_mb = image_frame.memory_usage(deep=True).sum() / 2**20
+        print(
+            f"{row_count:>8} {from_rows:>10.3f} {from_image:>16.3f} {image_snapshot:>19.3f} "
+            f"{frame_mb:>11.1f} {image_frame_mb:>17.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
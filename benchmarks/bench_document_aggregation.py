@@ -0,0 +1,84 @@
+"""Benchmark of the per-software document aggregation.
+
+Compares the groupby/lambda aggregation Api_0.get used to run on every
+request with the vectorized `build_documents` on synthetic catalogs (see
+benchmarks/synthetic_catalog.py), and checks that both produce the same
+records.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_document_aggregation
+    python -m benchmarks.bench_document_aggregation --rows 10000 100000 --repeat 5
+"""
+
+import argparse
+import time
+import pandas as pd
+from core.db_logic.catalog import build_documents, DOCUMENT_COLUMNS
+from benchmarks.synthetic_catalog import make_catalog_rows
+
+
+def legacy_aggregation(df: pd.DataFrame) -> list[dict]:
+    """The aggregation Api_0.get ran before documents were built per snapshot"""
+
+    def format_software_info(x: pd.Series) -> list[str]:
+        return sorted(
+            list(
+                set(
+                    f"{rp_name}: {info}"
+                    for rp_name, info in zip(df.loc[x.index, "rp_name"], x)
+                )
+            )
+        )
+
+    aggregations = {column: "first" for column in DOCUMENT_COLUMNS}
+    aggregations["rp_name"] = lambda x: sorted(list(set(x)))
+    aggregations["rp_group_id"] = lambda x: sorted(list(set(x)))
+    aggregations["rp_software_documentation"] = format_software_info
+    aggregations["software_versions"] = format_software_info
+    result = df.groupby("software_name").agg(aggregations).reset_index(drop=True)
+    return result[DOCUMENT_COLUMNS].to_dict(orient="records")
+
+
+def vectorized_aggregation(rows: list[dict]) -> list[dict]:
+    return list(build_documents(rows, ": ", "").values())
+
+
+def best_time(func, repeat: int) -> float:
+    """Returns the fastest of `repeat` runs, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f"{'rows':>8} {'software':>9} {'groupby (s)':>12} "
+        f"{'vectorized (s)':>15} {'speedup':>8}"
+    )
+    for row_count in args.rows:
+        rows = make_catalog_rows(row_count)
+        # The legacy code worked on the DataFrame with empty values filled in
+        df = pd.DataFrame(rows).fillna("")
+
+        if legacy_aggregation(df) != vectorized_aggregation(rows):
+            raise SystemExit(f"Outputs differ for {row_count} rows")
+
+        legacy = best_time(lambda: legacy_aggregation(df), args.repeat)
+        vectorized = best_time(lambda: vectorized_aggregation(rows), args.repeat)
+        software_count = df["software_name"].nunique()
+        print(
+            f"{row_count:>8} {software_count:>9} {legacy:>12.3f} "
+            f"{vectorized:>15.3f} {legacy / vectorized:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
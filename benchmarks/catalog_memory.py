@@ -0,0 +1,90 @@
+"""Memory report of the catalog rows held by a snapshot.
+
+Compares what a CatalogSnapshot used to keep, the rows as a list of dicts
+plus `pd.DataFrame(rows).fillna("")`, with the column-wise CatalogRows and
+its compact (categorical) DataFrame. Memory is what is still allocated once
+the rows read from the database are dropped, measured with tracemalloc.
+
+The database driver returns a new string for every value of every row. The
+synthetic rows are copied through JSON so they do too; otherwise the rows of
+a software would already share their strings.
+
+Usage (from the repository root):
+    python -m benchmarks.catalog_memory
+    python -m benchmarks.catalog_memory --rows 100000 500000
+    python -m benchmarks.catalog_memory --from-db    # the configured database
+"""
+
+import argparse
+import gc
+import json
+import tracemalloc
+import pandas as pd
+from core.db_logic.catalog_rows import CatalogRows
+from benchmarks.synthetic_catalog import make_catalog_rows
+
+
+def old_representation(rows: list[dict]):
+    return rows, pd.DataFrame(rows).fillna("")
+
+
+def new_representation(rows: list[dict]):
+    catalog_rows = CatalogRows.from_dicts(rows)
+    return catalog_rows, catalog_rows.compact_frame()
+
+
+def measure(load_rows, represent) -> tuple[float, float, float]:
+    """Builds a representation of freshly loaded rows.
+
+    Returns:
+        tuple[float, float, float]: MB held by the representation, MB of its
+            DataFrame alone, and peak MB while building it
+    """
+    gc.collect()
+    tracemalloc.start()
+    rows = load_rows()
+    kept = represent(rows)
+    del rows
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    frame_mb = kept[1].memory_usage(deep=True).sum() / 2**20
+    del kept
+    return current / 2**20, frame_mb, peak / 2**20
+
+
+def report(label: str, load_rows) -> None:
+    old, old_frame, old_peak = measure(load_rows, old_representation)
+    new, new_frame, new_peak = measure(load_rows, new_representation)
+    print(
+        f"{label:>10} {old:>9.1f} {new:>9.1f} {old / new:>6.1f}x "
+        f"{old_frame:>10.1f} {new_frame:>10.1f} {old_peak:>9.1f} {new_peak:>9.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 300_000])
+    parser.add_argument(
+        "--from-db", action="store_true", help="Measure the catalog rows of the database"
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'rows':>10} {'old (MB)':>9} {'new (MB)':>9} {'ratio':>7} "
+        f"{'old df':>10} {'new df':>10} {'old peak':>9} {'new peak':>9}"
+    )
+    if args.from_db:
+        from core.db_logic.catalog import load_catalog_rows
+
+        row_count = len(load_catalog_rows())
+        report(f"db {row_count}", load_catalog_rows)
+        return
+
+    for row_count in args.rows:
+        encoded = json.dumps(make_catalog_rows(row_count))
+        report(str(row_count), lambda: json.loads(encoded))
+
+
+if __name__ == "__main__":
+    main()
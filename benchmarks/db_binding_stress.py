@@ -0,0 +1,227 @@
+"""Stress test of use_db under concurrency.
+
+Runs `--threads` threads (like uwsgi's enable-threads) and `--tasks` asyncio
+tasks sharing one event loop. Each keeps entering use_db with a random
+database type, some of them nested, and holds every block across a short
+sleep so the threads and tasks interleave. In every block it checks, with
+real queries, that:
+- the models' database (db_proxy) answers as the database use_db selected
+- its connection is still the one it opened, and open, after the sleep
+  and after a nested block, i.e. no other thread or task closed or
+  replaced it
+
+The databases must be told apart by their answers. On Postgres every type
+logs in with its own role, checked with `SELECT current_user` (so
+DB_ADMIN_USER, DB_EDIT_USER and DB_VIEW_USER must differ). The SQLite
+stand-in has one database for every type, so the test replaces the three
+with separate SQLite files, each holding its type's name.
+
+`--global-swap` runs the same test with the former use_db, which swapped one
+database for the whole process, to show the cross-talk the test catches.
+Each task holds a pooled connection, so `--tasks` should stay below
+DB_MAX_CONN.
+
+Usage (from the repository root):
+    python -m benchmarks.db_binding_stress
+    python -m benchmarks.db_binding_stress --threads 8 --iterations 500 --global-swap
+    DB_BACKEND=sqlite python -m benchmarks.db_binding_stress
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+import core.models
+from core.models import DB_BACKEND, db_proxy, get_db, sqlite_database, use_db
+
+DB_TYPES = ("admin", "edit", "view")
+
+
+@contextmanager
+def global_swap_use_db(db_type):
+    """use_db as it was, binding the database for every thread at once"""
+    db = get_db(db_type)
+    db_proxy.initialize(db)
+    try:
+        with db.connection_context():
+            yield
+    finally:
+        db_proxy.initialize(core.models.view_db)
+
+
+def use_separate_sqlite_databases(directory: str) -> None:
+    """Replaces the SQLite databases of the three types with separate files,
+    whose stress_identity table holds their type"""
+    for db_type in DB_TYPES:
+        database = sqlite_database(os.path.join(directory, f"{db_type}.sqlite3"))
+        with database.connection_context():
+            database.execute_sql("CREATE TABLE stress_identity (name TEXT)")
+            database.execute_sql("INSERT INTO stress_identity VALUES (?)", (db_type,))
+        setattr(core.models, f"{db_type}_db", database)
+
+
+def expected_identity(db_type: str) -> str:
+    if DB_BACKEND == "postgres":
+        return get_db(db_type).connect_params["user"]
+    return db_type
+
+
+def identity() -> str:
+    """Asks the database db_proxy uses which one it is"""
+    if DB_BACKEND == "postgres":
+        return db_proxy.execute_sql("SELECT current_user").fetchone()[0]
+    return db_proxy.execute_sql("SELECT name FROM stress_identity").fetchone()[0]
+
+
+class Checks:
+    """Thread-safe count of checks and of the mismatches found"""
+
+    def __init__(self):
+        self.checked = 0
+        self.mismatches = []
+        self._lock = threading.Lock()
+
+    def record(self, mismatch: str | None) -> None:
+        with self._lock:
+            self.checked += 1
+            if mismatch:
+                self.mismatches.append(mismatch)
+
+    def check(self, db_type: str, connection=None) -> None:
+        """Checks that db_proxy is db_type's database and, if given, still
+        uses (and has open) the connection the block started with"""
+        try:
+            if connection is not None and (
+                db_proxy.is_closed() or db_proxy.connection() is not connection
+            ):
+                mismatch = f"the connection of the {db_type} block was closed or replaced"
+            else:
+                answer = identity()
+                expected = expected_identity(db_type)
+                mismatch = None
+                if answer != expected:
+                    mismatch = f"expected {expected}, {answer} answered"
+        except Exception as e:
+            mismatch = f"{type(e).__name__}: {e}"
+        self.record(mismatch)
+
+
+def thread_worker(seed: int, iterations: int, bind, checks: Checks, hold: float) -> None:
+    rnd = random.Random(seed)
+    for _ in range(iterations):
+        try:
+            thread_iteration(rnd, bind, checks, hold)
+        except Exception as e:  # i.e. a pool emptied by leaked connections
+            checks.record(f"{type(e).__name__}: {e}")
+
+
+def thread_iteration(rnd: random.Random, bind, checks: Checks, hold: float) -> None:
+    db_type = rnd.choice(DB_TYPES)
+    with bind(db_type):
+        checks.check(db_type)
+        connection = db_proxy.connection()
+        time.sleep(rnd.uniform(0, hold))
+        checks.check(db_type, connection)
+        if rnd.random() < 0.2:
+            inner_type = rnd.choice(DB_TYPES)
+            with bind(inner_type):
+                time.sleep(rnd.uniform(0, hold))
+                checks.check(inner_type)
+            # The outer binding and its connection are back
+            checks.check(db_type, connection)
+            checks.check(db_type)
+
+
+async def task_worker(
+    seed: int, iterations: int, bind, checks: Checks, hold: float
+) -> None:
+    rnd = random.Random(seed)
+    for _ in range(iterations):
+        db_type = rnd.choice(DB_TYPES)
+        try:
+            with bind(db_type):
+                checks.check(db_type)
+                connection = db_proxy.connection()
+                await asyncio.sleep(rnd.uniform(0, hold))
+                checks.check(db_type, connection)
+                checks.check(db_type)
+        except Exception as e:
+            checks.record(f"{type(e).__name__}: {e}")
+
+
+def run_threads(thread_count: int, iterations: int, bind, hold: float) -> Checks:
+    checks = Checks()
+    threads = [
+        threading.Thread(
+            target=thread_worker, args=(seed, iterations, bind, checks, hold)
+        )
+        for seed in range(thread_count)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return checks
+
+
+def run_tasks(task_count: int, iterations: int, bind, hold: float) -> Checks:
+    checks = Checks()
+
+    async def main():
+        await asyncio.gather(
+            *(
+                task_worker(seed, iterations, bind, checks, hold)
+                for seed in range(task_count)
+            )
+        )
+
+    asyncio.run(main())
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--tasks", type=int, default=8)
+    parser.add_argument(
+        "--iterations", type=int, default=200, help="use_db blocks per thread or task"
+    )
+    parser.add_argument(
+        "--hold", type=float, default=0.002, help="Longest sleep inside a block (s)"
+    )
+    parser.add_argument(
+        "--global-swap", action="store_true", help="Test the former, process-wide use_db"
+    )
+    args = parser.parse_args()
+
+    if DB_BACKEND == "sqlite":
+        use_separate_sqlite_databases(tempfile.mkdtemp(prefix="db_binding_stress-"))
+    elif len({expected_identity(db_type) for db_type in DB_TYPES}) < len(DB_TYPES):
+        sys.exit("The admin, edit and view databases must log in with different roles")
+
+    bind = global_swap_use_db if args.global_swap else use_db
+    failed = False
+    for name, run, count in (
+        ("threads", run_threads, args.threads),
+        ("asyncio tasks", run_tasks, args.tasks),
+    ):
+        start = time.perf_counter()
+        checks = run(count, args.iterations, bind, args.hold)
+        print(
+            f"{count:>4} {name:<14} {checks.checked:>7} checks, "
+            f"{len(checks.mismatches):>6} mismatches "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+        for mismatch in checks.mismatches[:3]:
+            print(f"     {mismatch}")
+        failed = failed or bool(checks.mismatches)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+r"""Load test of the versioned API.
+
+Keeps `--concurrency` keep-alive connections busy for `--duration` seconds,
+each sending GET requests for the queries in turn, and reports throughput
+and latency percentiles. Several servers can be given to compare them, i.e.
+the uwsgi deployment (wsgi.ini) with the ASGI one (app/asgi.py).
+
+`--read-delay` makes every client wait before reading the response body,
+like slow clients on poor connections do.
+
+Usage (from the repository root, with both servers running):
+    python -m benchmarks.load_test http://localhost:8080 http://localhost:8000 --key KEY
+    python -m benchmarks.load_test http://localhost:8000 --key KEY --read-delay 0.5 \
+        --concurrency 1000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_QUERIES = [
+    "software=7z",
+    "software=gromacs+lammps,include=rp_name",
+    "rp=anvil,type=csv",
+    "software=*,limit=50",
+    "search=fulltext(molecular)",
+]
+
+
+async def read_response(
+    reader: asyncio.StreamReader, read_delay: float
+) -> tuple[int, bool]:
+    """Reads one HTTP/1.1 response.
+
+    Returns:
+        tuple[int, bool]: The status code, and whether the connection can be
+            reused for the next request
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed by the server")
+    status = int(status_line.split()[1])
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip().lower()
+
+    if read_delay:
+        await asyncio.sleep(read_delay)
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding") == "chunked":
+        while size := int((await reader.readline()).split(b";")[0], 16):
+            await reader.readexactly(size + 2)
+        await reader.readline()
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get("connection") != "close"
+
+
+async def client(
+    host: str,
+    port: int,
+    paths: list[str],
+    deadline: float,
+    read_delay: float,
+    results: dict,
+) -> None:
+    """Sends requests on one connection until the deadline, reconnecting when
+    the server closes it"""
+    connection = None
+    request_number = 0
+    while time.perf_counter() < deadline:
+        path = paths[request_number % len(paths)]
+        request_number += 1
+        start = time.perf_counter()
+        request = (
+            f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept-Encoding: identity\r\n\r\n"
+        )
+        try:
+            reused = connection is not None
+            if connection is None:
+                connection = await asyncio.open_connection(host, port)
+            reader, writer = connection
+            try:
+                writer.write(request.encode())
+                await writer.drain()
+                status, keep_alive = await read_response(reader, read_delay)
+            except ConnectionError:
+                if not reused:
+                    raise
+                # The server closed the idle connection, send again on a new one
+                connection = reader, writer = await asyncio.open_connection(host, port)
+                writer.write(request.encode())
+                await writer.drain()
+                status, keep_alive = await read_response(reader, read_delay)
+        except (OSError, ValueError, asyncio.IncompleteReadError):
+            results["errors"] += 1
+            connection = None
+            continue
+        results["latencies"].append(time.perf_counter() - start)
+        if status >= 400:
+            results["failed"] += 1
+        if not keep_alive:
+            writer.close()
+            connection = None
+    if connection is not None:
+        connection[1].close()
+
+
+async def run_load(
+    url: str, paths: list[str], concurrency: int, duration: float, read_delay: float
+) -> dict:
+    """Runs the load test against one server"""
+    parts = urlsplit(url)
+    results = {"latencies": [], "errors": 0, "failed": 0}
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            # Clients start at different queries so every query is always in flight
+            client(
+                parts.hostname,
+                parts.port or 80,
+                paths[i % len(paths) :] + paths[: i % len(paths)],
+                deadline,
+                read_delay,
+                results,
+            )
+            for i in range(concurrency)
+        )
+    )
+    results["elapsed"] = time.perf_counter() - start
+    return results
+
+
+def percentile(values: list[float], share: float) -> float:
+    return (
+        statistics.quantiles(values, n=100)[int(share * 100) - 1]
+        if len(values) > 1
+        else values[0]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("urls", nargs="+", help="Base URLs of the servers to compare")
+    parser.add_argument("--key", required=True, help="API key")
+    parser.add_argument("--api-version", default="API_0.1")
+    parser.add_argument("--queries", nargs="+", default=DEFAULT_QUERIES)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument(
+        "--read-delay",
+        type=float,
+        default=0,
+        help="Seconds each client waits before reading a body",
+    )
+    args = parser.parse_args()
+
+    paths = [f"/{args.api_version}/{args.key}/{query}" for query in args.queries]
+    print(
+        f"{'server':<26} {'requests':>9} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} "
+        f"{'p99 (ms)':>9} {'errors':>7} {'4xx/5xx':>8}"
+    )
+    for url in args.urls:
+        results = asyncio.run(
+            run_load(url, paths, args.concurrency, args.duration, args.read_delay)
+        )
+        latencies = results["latencies"]
+        if not latencies:
+            print(f"{url:<26} no successful requests, {results['errors']} errors")
+            continue
+        p50, p95, p99 = (
+            percentile(latencies, share) * 1000 for share in (0.5, 0.95, 0.99)
+        )
+        print(
+            f"{url:<26} {len(latencies):>9} {len(latencies) / results['elapsed']:>8.0f} "
+            f"{p50:>9.1f} {p95:>9.1f} {p99:>9.1f} "
+            f"{results['errors']:>7} {results['failed']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""Synthetic catalog generator.
+
+Creates RP, Software, RPSoftware, AISoftwareInfo and API records shaped like
+the real catalog and loads them through the `update_*_table` functions used
+by reset_database.py, into the database configured by the DB_* variables:
+- RPs are grouped like ACCESS resources (a group has 1 to 3 resources, its
+  rp_name is the first part of the group id)
+- popular software is on most RPs, most software on a few (Pareto)
+- every (resource, software) pair has a few versions (geometric)
+- about AI_INFO_SHARE of the software has AI information, whose text fields
+  have about the lengths of the generated ones, categories come from small
+  sets like the real ones
+
+The same seed always gives the same catalog. `make_catalog_rows` joins the
+same records in memory into catalog_view rows, for the benchmarks that
+don't need a database.
+
+Usage (from the repository root), replaces every catalog table:
+    python -m benchmarks.synthetic_catalog --rps 30 --software 5000
+    DB_BACKEND=sqlite DB_SQLITE_PATH=/tmp/catalog python -m benchmarks.synthetic_catalog
+"""
+
+import argparse
+import random
+from core.models import use_db
+from core.models.rps import RPS
+from core.models.software import Software
+from core.models.catalogView import CatalogView
+from core.db_logic.update_rp_table import update_rp_table
+from core.db_logic.update_software_table import update_software_table
+from core.db_logic.update_rp_software_table import update_rp_software_table
+from core.db_logic.update_ai_software_table import update_ai_software_table
+from core.db_logic.update_api_key_table import update_api_key_table
+
+# Share of the software that has AI generated information
+AI_INFO_SHARE = 0.7
+# API key created with the synthetic catalog
+SYNTHETIC_API_KEY = "synthetic-benchmark-key"
+
+SYLLABLES = (
+    "ab", "ac", "al", "am", "an", "ar", "ba", "bi", "ca", "co", "da", "de", "di",
+    "el", "en", "fa", "ga", "gro", "hy", "in", "ka", "la", "li", "ma", "mo", "mu",
+    "na", "ne", "no", "pa", "pi", "py", "qu", "ra", "ri", "sa", "si", "ta", "ti",
+    "to", "un", "va", "vi", "xe", "zo",
+)
+SUFFIXES = ("", "", "", "lib", "-tools", "pp", "x", "-mpi", "3d", "-cuda", "py")
+WORDS = (
+    "analysis", "parallel", "simulation", "molecular", "dynamics", "quantum",
+    "chemistry", "genome", "sequence", "alignment", "mesh", "solver", "linear",
+    "algebra", "visualization", "data", "format", "library", "toolkit",
+    "framework", "model", "climate", "ocean", "fluid", "finite", "element",
+    "learning", "neural", "network", "GPU", "accelerated", "scalable", "HPC",
+    "workflow", "compiler", "runtime", "statistics", "image", "processing",
+    "structure", "protein", "materials", "particle", "physics", "astronomy",
+    "graph", "optimization", "sparse", "matrix", "distributed", "memory",
+)
+SOFTWARE_TYPES = ("Library", "Application", "Compiler", "Toolkit", "Framework", "Utility")
+SOFTWARE_CLASSES = (
+    "Bioinformatics", "Chemistry", "Physics", "Mathematics", "Data Science",
+    "Visualization", "Programming Language", "Climate Science", "Engineering",
+)
+RESEARCH_FIELDS = (
+    "Biological Sciences", "Chemistry", "Physics", "Computer Science",
+    "Earth Sciences", "Engineering", "Mathematics", "Social Sciences",
+)
+RESEARCH_AREAS = (
+    "Genomics", "Molecular Dynamics", "Quantum Chemistry", "Machine Learning",
+    "Fluid Dynamics", "Numerical Analysis", "Climate Modeling", "Imaging",
+    "Materials Science", "Astrophysics", "Statistics", "Software Development",
+)
+RESEARCH_DISCIPLINES = (
+    "Computational Biology", "Computational Chemistry", "Applied Mathematics",
+    "High Performance Computing", "Data Analysis", "Computational Physics",
+)
+
+
+def sentences(rnd: random.Random, length: int) -> str:
+    """Returns sentences of generated words, about length characters long"""
+    text = []
+    size = 0
+    while size < length:
+        sentence = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(6, 16)))
+        sentence = sentence[0].upper() + sentence[1:] + "."
+        text.append(sentence)
+        size += len(sentence) + 1
+    return " ".join(text)
+
+
+def text_length(rnd: random.Random, median: int) -> int:
+    """Draws a text length around median, with a long tail of longer texts"""
+    return max(20, int(rnd.lognormvariate(0, 0.5) * median))
+
+
+def make_rp_records(rp_count: int, rnd: random.Random) -> list[dict]:
+    """Creates RPS records, 1 to 3 resources for each of rp_count RPs"""
+    records = []
+    for rp_number in range(rp_count):
+        rp_name = f"rp{rp_number}"
+        domain = f"site{rp_number % 11}.access-ci.org"
+        group_id = f"{rp_name}.{domain}"
+        resources = ["", "-gpu", "-cpu", "-bigmem"][: rnd.choice((1, 1, 2, 3))]
+        for resource in resources:
+            records.append(
+                {
+                    "rp_name": rp_name,
+                    "rp_group_id": group_id,
+                    "rp_resource_id": f"{rp_name}{resource}.{domain}",
+                }
+            )
+    return records
+
+
+def make_software_names(software_count: int, rnd: random.Random) -> list[str]:
+    """Creates unique, lowercase software names like 'gromacs-mpi'"""
+    names = set()
+    while len(names) < software_count:
+        name = "".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4)))
+        name += rnd.choice(SUFFIXES)
+        if name in names:
+            name += str(len(names))
+        names.add(name)
+    return sorted(names)
+
+
+def make_software_records(names: list[str], rnd: random.Random) -> list[dict]:
+    """Creates Software records"""
+    return [
+        {
+            "software_name": name,
+            "software_description": sentences(rnd, text_length(rnd, 250)),
+            "software_web_page": f"https://{name}.org",
+            "software_documentation": f"https://{name}.readthedocs.io",
+            "software_use_link": (
+                "" if rnd.random() < 0.8 else f"https://{name}.org/examples"
+            ),
+        }
+        for name in names
+    ]
+
+
+def make_ai_records(software_ids: dict[str, int], rnd: random.Random) -> list[dict]:
+    """Creates AISoftwareInfo records for about AI_INFO_SHARE of the software"""
+    records = []
+    for name, software_id in software_ids.items():
+        if rnd.random() >= AI_INFO_SHARE:
+            continue
+        example = "\n".join(
+            [f"module load {name}", sentences(rnd, text_length(rnd, 400))]
+            + [
+                f"{name} --input data{i}.in --threads {2 ** i}"
+                for i in range(rnd.randint(1, 6))
+            ]
+        )
+        records.append(
+            {
+                "software_id": software_id,
+                "ai_description": sentences(rnd, text_length(rnd, 700)),
+                "ai_software_type": rnd.choice(SOFTWARE_TYPES),
+                "ai_software_class": rnd.choice(SOFTWARE_CLASSES),
+                "ai_research_field": rnd.choice(RESEARCH_FIELDS),
+                "ai_research_area": rnd.choice(RESEARCH_AREAS),
+                "ai_research_discipline": rnd.choice(RESEARCH_DISCIPLINES),
+                "ai_core_features": ", ".join(rnd.sample(WORDS, rnd.randint(3, 8))),
+                "ai_general_tags": (
+                    ", ".join(rnd.sample(WORDS, rnd.randint(4, 10))).lower()
+                ),
+                "ai_example_use": example,
+            }
+        )
+    return records
+
+
+def make_versions(rnd: random.Random) -> str:
+    """Creates a sorted, comma separated version list, most have 1 to 3"""
+    versions = {f"{rnd.randint(1, 12)}.{rnd.randint(0, 20)}.{rnd.randint(0, 9)}"}
+    while rnd.random() < 0.55:
+        versions.add(f"{rnd.randint(1, 12)}.{rnd.randint(0, 20)}.{rnd.randint(0, 9)}")
+    return ",".join(sorted(versions))
+
+
+def make_rp_software_records(
+    resource_ids: dict[str, tuple[int, str]],
+    software_ids: dict[str, int],
+    rnd: random.Random,
+) -> list[dict]:
+    """Creates RPSoftware records, spreading software over the resources
+    unevenly (popular packages are on most resources)"""
+    resources = sorted(resource_ids.items())
+    records = []
+    for software_id in software_ids.values():
+        resource_count = min(len(resources), 1 + int(rnd.paretovariate(1.2)))
+        for _, (rp_id, rp_name) in rnd.sample(resources, k=resource_count):
+            documentation = f"https://docs.{rp_name}.access-ci.org/software"
+            records.append(
+                {
+                    "rp_id": rp_id,
+                    "software_id": software_id,
+                    "software_versions": make_versions(rnd),
+                    "rp_software_documentation": documentation,
+                    "rp_has_individual_software_documentation": rnd.random() < 0.3,
+                }
+            )
+    return records
+
+
+def make_catalog_rows(row_count: int, rp_count: int = 30, seed: int = 1) -> list[dict]:
+    """Creates catalog_view rows of a synthetic catalog, without a database.
+
+    The records are generated as by `load_synthetic_catalog`, given ids in
+    insertion order and joined like `CatalogView.view_query`, so the rows
+    have the keys `load_catalog_rows` returns. Enough software is generated
+    for row_count rows, the rows of the last ones are cut off.
+    """
+    software_count = row_count // 4 + 1
+    while True:
+        rnd = random.Random(seed)
+        rps = dict(enumerate(make_rp_records(rp_count, rnd), start=1))
+        names = make_software_names(software_count, rnd)
+        software = dict(enumerate(make_software_records(names, rnd), start=1))
+        resource_ids = {
+            rp["rp_resource_id"]: (rp_id, rp["rp_name"]) for rp_id, rp in rps.items()
+        }
+        software_ids = {
+            record["software_name"]: software_id
+            for software_id, record in software.items()
+        }
+        rp_software_records = make_rp_software_records(resource_ids, software_ids, rnd)
+        if len(rp_software_records) >= row_count:
+            break
+        software_count *= 2
+
+    ai_info = {
+        record.pop("software_id"): record for record in make_ai_records(software_ids, rnd)
+    }
+    columns = [field.name for field in CatalogView.data_fields()]
+    rows = []
+    for rp_software_id, record in enumerate(rp_software_records[:row_count], start=1):
+        values = {
+            "id": rp_software_id,
+            "rp_software_module_type": "software",
+            **record,
+            **software[record["software_id"]],
+            **rps[record["rp_id"]],
+            **ai_info.get(record["software_id"], {}),
+        }
+        rows.append({column: values.get(column) for column in columns})
+        rows[-1]["rp_software_id"] = rp_software_id
+    return rows
+
+
+def load_synthetic_catalog(
+    rp_count: int, software_count: int, seed: int = 1, api_key: str = SYNTHETIC_API_KEY
+) -> None:
+    """Replaces the catalog tables with a synthetic catalog.
+
+    Recreates the tables, loads the records through the `update_*_table`
+    functions, then refreshes the catalog view and stamps its version like
+    reset_database.py does.
+
+    Args:
+        rp_count (int): Number of RPs (with 1 to 3 resources each)
+        software_count (int): Number of software packages
+        seed (int): Seed of the generator
+        api_key (str): API key created for the catalog
+    """
+    import reset_database
+
+    rnd = random.Random(seed)
+    reset_database.recreate_tables()
+
+    update_rp_table([make_rp_records(rp_count, rnd)])
+    update_software_table(
+        make_software_records(make_software_names(software_count, rnd), rnd)
+    )
+    with use_db("view"):
+        resource_ids = {
+            rp.rp_resource_id: (rp.id, rp.rp_name)
+            for rp in RPS.select(RPS.id, RPS.rp_name, RPS.rp_resource_id)
+        }
+        software_ids = {
+            software.software_name: software.id
+            for software in Software.select(Software.id, Software.software_name).order_by(
+                Software.software_name
+            )
+        }
+    update_rp_software_table(make_rp_software_records(resource_ids, software_ids, rnd))
+    update_ai_software_table(make_ai_records(software_ids, rnd))
+    update_api_key_table([{"organization": "benchmark", "api_key": api_key}])
+
+    reset_database.refresh_catalog_view()
+    reset_database.stamp_catalog_version()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rps", type=int, default=30)
+    parser.add_argument("--software", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--api-key", default=SYNTHETIC_API_KEY)
+    args = parser.parse_args()
+
+    load_synthetic_catalog(args.rps, args.software, args.seed, args.api_key)
+    print(f"Synthetic catalog loaded, API key: {args.api_key}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Per-worker memory report of a uwsgi deployment.
+
+Reads /proc/<pid>/smaps_rollup of the uwsgi master and its children (the
+workers, and the http router with `http =`). With the catalog preloaded in
+the master (app/preload.py), most of a worker's RSS should show up as Shared
+and its PSS should stay well below its RSS; the total PSS is what the node
+really uses.
+
+`--url` sends requests first, so every worker has served queries (and
+touched the catalog) before it is measured.
+
+Usage (from the repository root, with uwsgi running):
+    python -m benchmarks.worker_memory
+    python -m benchmarks.worker_memory --url http://localhost:8080/API_0.1/KEY/software=*
+"""
+
+import argparse
+import os
+import urllib.request
+from app.preload import memory_usage
+
+
+def uwsgi_processes(master: int | None = None) -> list[tuple[int, int]]:
+    """Finds the uwsgi master and workers.
+
+    Returns:
+        list[tuple[int, int]]: (pid, parent pid) of every uwsgi process, or of
+            `master` and its children when given
+    """
+    processes = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", "rb") as cmdline:
+                command = cmdline.read().split(b"\0")
+            with open(f"/proc/{entry}/stat", encoding="utf-8") as stat:
+                parent = int(stat.read().rsplit(")", 1)[1].split()[1])
+        except OSError:
+            continue
+        pid = int(entry)
+        is_uwsgi = any(
+            os.path.basename(part) in (b"uwsgi", b"pyuwsgi") for part in command[:2]
+        )
+        if (master is None and is_uwsgi) or pid == master or parent == master:
+            processes.append((pid, parent))
+    return sorted(processes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--master", type=int, help="Pid of the uwsgi master")
+    parser.add_argument("--url", help="URL requested before measuring")
+    parser.add_argument("--requests", type=int, default=100)
+    args = parser.parse_args()
+
+    if args.url:
+        for _ in range(args.requests):
+            with urllib.request.urlopen(args.url) as response:
+                response.read()
+
+    processes = uwsgi_processes(args.master)
+    if not processes:
+        raise SystemExit("No uwsgi processes found")
+    pids = {pid for pid, _ in processes}
+
+    print(
+        f"{'pid':>8} {'role':>7} {'RSS (MB)':>9} {'PSS (MB)':>9} "
+        f"{'shared (MB)':>12} {'private (MB)':>13}"
+    )
+    total = {"Rss": 0, "Pss": 0}
+    for pid, parent in processes:
+        usage = memory_usage(pid)
+        if not usage:
+            continue
+        shared = usage["Shared_Clean"] + usage["Shared_Dirty"]
+        private = usage["Private_Clean"] + usage["Private_Dirty"]
+        role = "worker" if parent in pids else "master"
+        print(
+            f"{pid:>8} {role:>7} {usage['Rss'] / 1024:>9.1f} {usage['Pss'] / 1024:>9.1f} "
+            f"{shared / 1024:>12.1f} {private / 1024:>13.1f}"
+        )
+        total["Rss"] += usage["Rss"]
+        total["Pss"] += usage["Pss"]
+    print(f"{'total':>16} {total['Rss'] / 1024:>9.1f} {total['Pss'] / 1024:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
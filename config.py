@@ -5,4 +5,8 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 load_dotenv(os.path.join(basedir, '.env'))
 
 class Config:
-    SECRET_KEY = os.environ.get('SECRET_KEY') or 'make-this-something-secure-pls'
\ No newline at end of file
+    SECRET_KEY = os.environ.get('SECRET_KEY') or 'make-this-something-secure-pls'
+    # Serve /metrics, /cache_stats and /memory_stats, which show how the API
+    #   is used and the worker processes. Only enable them where the app
+    #   isn't publicly reachable (i.e. behind a firewall)
+    DIAGNOSTIC_ROUTES = os.environ.get('DIAGNOSTIC_ROUTES', '0') == '1'
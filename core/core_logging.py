@@ -19,3 +19,20 @@ if not logger.handlers:
     handler.setFormatter(formatter)
     logger.addHandler(handler)
 logger.setLevel(level=logging.DEBUG)
+
+# Statements slower than SLOW_QUERY_SECONDS (see core.models), kept out of
+#   core_logic.log so they can be collected on their own
+slow_query_logger = logging.getLogger(f"{__name__}.slow_queries")
+slow_query_logger.propagate = False
+if not slow_query_logger.handlers:
+    slow_query_handler = TimedRotatingFileHandler(
+        filename="logs/slow_queries.log",
+        when="D",
+        interval=7,
+        backupCount=8,
+        atTime="midnight",
+        delay=True,  # Created with the first slow query
+    )
+    slow_query_handler.setFormatter(logging.Formatter("%(asctime)s: %(message)s"))
+    slow_query_logger.addHandler(slow_query_handler)
+slow_query_logger.setLevel(level=logging.INFO)
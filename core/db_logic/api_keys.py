@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from ..models import db_operation, db_proxy as db
+from ..models.api import API
+from ..models.apiKeyVersion import ApiKeyVersion
+from ..core_logging import logger
+
+# Seconds a validation result (valid or invalid) is trusted before re-checking
+API_KEY_CACHE_TTL = float(os.getenv("API_KEY_CACHE_TTL", 60))
+# Maximum number of API keys remembered per worker
+API_KEY_CACHE_SIZE = int(os.getenv("API_KEY_CACHE_SIZE", 1024))
+# How long (in seconds) a worker trusts its cache before checking the API key
+#   version, the cache is only dropped when the version changed
+API_KEY_VERSION_CHECK_SECONDS = float(os.getenv("API_KEY_VERSION_CHECK_SECONDS", 5))
+
+
+class ApiKeyCache:
+    """Bounded, thread-safe LRU cache of API key validation results.
+
+    Both valid and invalid keys are cached. Each entry expires after `ttl`
+    seconds, and the whole cache is dropped when the API key version
+    (ApiKeyVersion) bumped by `update_api_key_table` changes.
+
+    Attributes:
+        ttl (float): Seconds an entry stays valid
+        max_size (int): Maximum number of entries kept
+        check_seconds (float): Seconds between checks of the API key version
+        version (int | None): API key version the entries were cached at
+    """
+
+    def __init__(self, ttl: float, max_size: int, check_seconds: float):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.check_seconds = check_seconds
+        self.version = None
+        self._checked_at = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def needs_version_check(self) -> bool:
+        """Whether the API key version should be read before using the cache"""
+        checked_at = self._checked_at
+        return checked_at is None or time.monotonic() - checked_at >= self.check_seconds
+
+    def check_version(self, version: int | None) -> None:
+        """Records the API key version read from the database, dropping every
+        cached entry if it changed"""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+
+    def get(self, api_key: str) -> tuple[bool, str | None]:
+        """Looks up a cached validation result.
+
+        Returns:
+            tuple[bool, str | None]: (found, organization). organization is
+                None for invalid keys.
+        """
+        with self._lock:
+            entry = self._entries.get(api_key)
+            if entry is None:
+                return False, None
+            expires_at, organization = entry
+            if expires_at < time.monotonic():
+                del self._entries[api_key]
+                return False, None
+            self._entries.move_to_end(api_key)
+            return True, organization
+
+    def set(self, api_key: str, organization: str | None) -> None:
+        """Caches the validation result of an API key"""
+        with self._lock:
+            self._entries[api_key] = (time.monotonic() + self.ttl, organization)
+            self._entries.move_to_end(api_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drops every cached entry"""
+        with self._lock:
+            self._entries.clear()
+
+
+api_key_cache = ApiKeyCache(
+    API_KEY_CACHE_TTL, API_KEY_CACHE_SIZE, API_KEY_VERSION_CHECK_SECONDS
+)
+
+
+@db_operation("view")
+def load_api_key_version() -> int | None:
+    """Gets the API key version bumped by update_api_key_table, a single row read"""
+    return ApiKeyVersion.current()
+
+
+@db_operation("view")
+def lookup_api_key(api_key: str) -> str | None:
+    """Queries the API table for the given API key.
+
+    Returns:
+        str | None: Organization the key belongs to, None if the key is invalid
+    """
+    with db.atomic():
+        api_match = API.get_or_none(API.api_key == api_key)
+    return api_match.organization if api_match else None
+
+
+def validate_api_key(api_key: str | None) -> bool:
+    """Checks if an API key exists, using the cache when possible.
+
+    Args:
+        api_key (str | None): API key provided by the user
+
+    Returns:
+        bool: True if the API key is valid
+    """
+    if not api_key:
+        return False
+
+    if api_key_cache.needs_version_check():
+        api_key_cache.check_version(load_api_key_version())
+    found, organization = api_key_cache.get(api_key)
+    if not found:
+        organization = lookup_api_key(api_key)
+        api_key_cache.set(api_key, organization)
+    logger.debug(f"User Organization: {organization}")
+    return organization is not None
+
+
+def invalidate_api_key_cache() -> None:
+    """Drops cached API key results in this process and in every API worker.
+
+    Bumps the API key version, which the other workers check every
+    API_KEY_VERSION_CHECK_SECONDS. Must run with a writable database.
+    """
+    ApiKeyVersion.bump()
+    api_key_cache.clear()
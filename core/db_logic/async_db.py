@@ -0,0 +1,152 @@
+import asyncio
+import os
+import re
+import time
+import asyncpg
+from peewee import ModelSelect
+from ..models import (
+    view_db,
+    log_slow_query,
+    supports,
+    DB_NAME,
+    DB_HOST,
+    DB_PORT,
+    DB_MAX_CONN,
+    VIEW_USER,
+    VIEW_PASS,
+)
+from ..models.api import API
+from ..models.catalogView import CatalogView
+from ..models.catalogVersion import CatalogVersion
+from ..models.apiKeyVersion import ApiKeyVersion
+from ..core_logging import logger
+from .api_keys import api_key_cache
+from .catalog import CatalogSnapshot, get_catalog, peek_catalog, reload_catalog
+from .get_software_details import search_software
+
+# Size of the async connection pool of each ASGI worker, requests wait for a
+#   free connection once all are in use
+ASYNC_POOL_MIN_SIZE = int(os.getenv("ASYNC_POOL_MIN_SIZE", 1))
+ASYNC_POOL_MAX_SIZE = int(os.getenv("ASYNC_POOL_MAX_SIZE", DB_MAX_CONN))
+
+# psycopg2 placeholders (and escaped %) in the SQL peewee generates
+_PLACEHOLDER = re.compile(r"%s|%%")
+
+# Only one coroutine checks the catalog version at a time
+_refresh_lock = asyncio.Lock()
+
+
+async def create_pool() -> asyncpg.Pool:
+    """Opens the async connection pool, connecting as the view user"""
+    if not supports("async_pool"):
+        raise RuntimeError("The async pool needs Postgres, DB_BACKEND is not 'postgres'")
+    return await asyncpg.create_pool(
+        database=DB_NAME,
+        user=VIEW_USER,
+        password=VIEW_PASS,
+        host=DB_HOST,
+        port=int(DB_PORT),
+        min_size=ASYNC_POOL_MIN_SIZE,
+        max_size=ASYNC_POOL_MAX_SIZE,
+    )
+
+
+def to_asyncpg(query: ModelSelect) -> tuple[str, list]:
+    """Renders a peewee query for asyncpg.
+
+    Peewee writes psycopg2 style `%s` placeholders, asyncpg expects `$1`,
+    `$2`, ...
+
+    Returns:
+        tuple[str, list]: The SQL and its parameters
+    """
+    sql, params = view_db.get_sql_context().sql(query).query()
+    count = 0
+
+    def placeholder(match: re.Match) -> str:
+        nonlocal count
+        if match.group() == "%%":
+            return "%"
+        count += 1
+        return f"${count}"
+
+    return _PLACEHOLDER.sub(placeholder, sql), list(params)
+
+
+async def fetch(pool: asyncpg.Pool, query: ModelSelect) -> list[asyncpg.Record]:
+    """Runs a peewee select query on the async pool. Slow queries are written
+    to the slow query log, without their plan."""
+    sql, params = to_asyncpg(query)
+    async with pool.acquire() as connection:
+        start = time.perf_counter()
+        rows = await connection.fetch(sql, *params)
+        log_slow_query(None, sql, params, time.perf_counter() - start)
+        return rows
+
+
+async def validate_api_key_async(pool: asyncpg.Pool, api_key: str | None) -> bool:
+    """Async version of `api_keys.validate_api_key`, sharing its cache"""
+    if not api_key:
+        return False
+
+    if api_key_cache.needs_version_check():
+        rows = await fetch(
+            pool,
+            ApiKeyVersion.select(ApiKeyVersion.version).where(
+                ApiKeyVersion.id == ApiKeyVersion.ROW_ID
+            ),
+        )
+        api_key_cache.check_version(rows[0]["version"] if rows else None)
+    found, organization = api_key_cache.get(api_key)
+    if not found:
+        rows = await fetch(
+            pool, API.select(API.organization).where(API.api_key == api_key)
+        )
+        organization = rows[0]["organization"] if rows else None
+        api_key_cache.set(api_key, organization)
+    return organization is not None
+
+
+async def search_ids_async(pool: asyncpg.Pool, search: list[str]) -> list[int]:
+    """Runs a search_software query on the async pool.
+
+    Returns:
+        list[int]: catalog view ids of the matching rows, in rank order
+    """
+    query = search_software(search, fields=[CatalogView.id]).query
+    return [row["id"] for row in await fetch(pool, query)]
+
+
+async def get_catalog_async(pool: asyncpg.Pool) -> CatalogSnapshot:
+    """Async version of `catalog.get_catalog`.
+
+    The catalog version is checked on the async pool. The snapshot itself is
+    built in a thread, so the event loop keeps serving the old snapshot
+    while it loads.
+    """
+    snapshot = peek_catalog()
+    if snapshot is None:
+        return await asyncio.to_thread(get_catalog)
+
+    if snapshot.is_stale() and not _refresh_lock.locked():
+        async with _refresh_lock:
+            try:
+                rows = await fetch(
+                    pool,
+                    CatalogVersion.select().where(
+                        CatalogVersion.id == CatalogVersion.ROW_ID
+                    ),
+                )
+                catalog_version = CatalogVersion(**dict(rows[0])) if rows else None
+                if (
+                    catalog_version is not None
+                    and catalog_version.content_hash == snapshot.content_hash
+                ):
+                    snapshot.checked_at = time.time()
+                else:
+                    await asyncio.to_thread(reload_catalog, catalog_version)
+            except Exception:
+                # Keep serving the old data if the database is unavailable
+                logger.exception("Unable to reload catalog, serving old snapshot.")
+
+    return peek_catalog()
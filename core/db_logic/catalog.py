@@ -0,0 +1,705 @@
+import base64
+import os
+import threading
+import time
+from bisect import bisect_right
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from ..models import db_operation, db_proxy as db, supports
+from ..models.catalogView import CatalogView
+from ..models.catalogVersion import CatalogVersion
+from ..core_logging import logger
+from .search_index import SearchIndex
+from .catalog_image import CatalogImage, load_catalog_image
+from .catalog_rows import CatalogRows, group_positions
+from .get_software_details import aggregate_software
+
+# How long (in seconds) a worker serves a snapshot before checking the catalog
+#   version, the snapshot is only reloaded when the version changed
+CATALOG_REFRESH_SECONDS = float(os.getenv("CATALOG_REFRESH_SECONDS", 300))
+# Where whole-catalog documents are aggregated: 'pandas' (from the snapshot
+#   rows) or 'sql' (grouped by Postgres, see aggregate_software). 'sql' falls
+#   back to 'pandas' on databases without the sql_aggregation capability.
+CATALOG_AGGREGATION = os.getenv("CATALOG_AGGREGATION", "pandas")
+
+# Column order of a software document (one response record per software)
+DOCUMENT_COLUMNS = [
+    "software_name",
+    "rp_name",
+    "rp_group_id",
+    "software_description",
+    "ai_description",
+    "ai_core_features",
+    "software_documentation",
+    "ai_software_type",
+    "ai_research_area",
+    "ai_research_discipline",
+    "ai_general_tags",
+    "software_web_page",
+    "ai_research_field",
+    "software_use_link",
+    "rp_software_documentation",
+    "software_versions",
+    "ai_software_class",
+    "ai_example_use",
+]
+
+# Columns that are collected over every RP that has the software
+RP_COLUMNS = {"rp_name", "rp_group_id", "rp_software_documentation", "software_versions"}
+
+
+def collect_sorted(codes, values) -> list[list]:
+    """Collects the sorted, unique values of every group.
+
+    Args:
+        codes (np.ndarray): Group number of each value. Every number from 0 to
+            the highest one must have at least one value.
+        values (np.ndarray): Values to collect
+
+    Returns:
+        list[list]: Sorted unique values of each group, in group order
+    """
+    pairs = pd.DataFrame({"code": codes, "value": values}).drop_duplicates()
+    pairs = pairs.sort_values(["code", "value"])
+    return split_groups(pairs["code"].to_numpy(), pairs["value"].to_numpy(dtype=object))
+
+
+def split_groups(groups: np.ndarray, values: np.ndarray) -> list[list]:
+    """Splits values sorted by group number into one list per group"""
+    # Each group starts where the (sorted) group number changes
+    starts = (np.flatnonzero(np.diff(groups)) + 1).tolist()
+    values = values.tolist()
+    return [values[start:end] for start, end in zip([0] + starts, starts + [len(values)])]
+
+
+def decoded(values: np.ndarray, missing) -> np.ndarray:
+    """Returns the distinct values of an encoded column as Python objects,
+    followed by `missing`, which the code -1 (None) picks"""
+    objects = np.empty(len(values) + 1, dtype=object)
+    objects[:-1] = values
+    objects[-1] = missing
+    return objects
+
+
+def collect_sorted_codes(groups, codes, values) -> list[list]:
+    """Collects the sorted, unique values of every group from a dictionary
+    encoded column, without decoding its rows.
+
+    Args:
+        groups (np.ndarray): Group number of each row. Every number from 0 to
+            the highest one must have at least one row.
+        codes (np.ndarray): Code of each row's value in values, -1 for None
+        values (np.ndarray): Sorted distinct values
+
+    Returns:
+        list[list]: Sorted unique values of each group, None last, in group
+            order
+    """
+    size = len(values) + 1
+    # None is coded after every value, so it sorts last like in collect_sorted
+    pairs = np.unique(groups.astype(np.int64) * size + codes.astype(np.int64) % size)
+    pair_groups, pair_codes = np.divmod(pairs, size)
+    return split_groups(pair_groups, decoded(values, None)[pair_codes])
+
+
+def build_documents(
+    rows: CatalogRows | CatalogImage | list[dict],
+    separator: str,
+    missing: str | None,
+    positions: np.ndarray | None = None,
+) -> dict[str, dict]:
+    """Aggregates catalog rows into one response record per software.
+
+    `rp_name` and `rp_group_id` become sorted lists of unique values.
+    `rp_software_documentation` and `software_versions` become sorted lists of
+    unique 'rp_name<separator>info' strings, combining each RP name with its
+    documentation or version info. Every other column is taken from the
+    first row of the software since it is the same for all of its rows.
+
+    The work is done on the dictionary codes of whole columns (the mapped
+    buffers of a catalog image): software codes are the group numbers, the
+    distinct (software, value) pairs are found with NumPy and only those are
+    decoded. 'rp_name<separator>info' strings are only built for distinct
+    (software, RP, info) combinations. Only building the output dicts loops
+    over the software.
+
+    Args:
+        rows (CatalogRows | CatalogImage | list[dict]): Catalog rows, the rows
+            of a software in the order their first row should be picked
+        separator (str): Text placed between the RP name and its info
+        missing (str | None): Value used in place of empty (None) fields
+        positions (np.ndarray | None): Positions of the rows to aggregate, in
+            that order. None aggregates every row.
+
+    Returns:
+        dict[str, dict]: Software name to response record, with the columns in
+            DOCUMENT_COLUMNS order. Ordered by software name.
+
+    Example:
+    >>> rows = [{'software_name': 'x', 'rp_name': 'A', 'software_versions': '1.0', ...},
+    ...         {'software_name': 'x', 'rp_name': 'B', 'software_versions': '2.0', ...}]
+    >>> build_documents(rows, ": ", "")["x"]["software_versions"]
+    ['A: 1.0', 'B: 2.0']
+    """
+    if isinstance(rows, list):
+        rows = CatalogRows.from_dicts(rows)
+    if positions is not None:
+        positions = np.asarray(positions, dtype=np.intp)
+    if not rows or (positions is not None and not len(positions)):
+        return {}
+
+    software_codes, software_names = rows.encoded("software_name", positions)
+    # Software in name order, the position of their first row and the
+    #   group number (index in `present`) of every row
+    present, first_rows, groups = np.unique(
+        software_codes, return_index=True, return_inverse=True
+    )
+    # Rows the columns taken from the first row are read from
+    first_positions = first_rows if positions is None else positions[first_rows]
+    rp_codes, rp_names = rows.encoded("rp_name", positions)
+    rp_size = len(rp_names) + 1
+    # Like `astype(str)`, None is joined as "None"
+    rp_strings = pd.Series(decoded(rp_names, None)).astype(str).to_numpy()
+
+    columns = {}
+    for column in DOCUMENT_COLUMNS:
+        if column in ("rp_name", "rp_group_id"):
+            codes, values = rows.encoded(column, positions)
+            columns[column] = collect_sorted_codes(groups, codes, values)
+        elif column in RP_COLUMNS:
+            codes, values = rows.encoded(column, positions)
+            size = len(values) + 1
+            combinations = np.unique(
+                (groups.astype(np.int64) * rp_size + rp_codes.astype(np.int64) % rp_size)
+                * size
+                + codes.astype(np.int64) % size
+            )
+            rest, info_codes = np.divmod(combinations, size)
+            combination_groups, combination_rps = np.divmod(rest, rp_size)
+            info_strings = pd.Series(decoded(values, None)).astype(str).to_numpy()
+            info = rp_strings[combination_rps] + separator + info_strings[info_codes]
+            columns[column] = collect_sorted(combination_groups, info)
+        else:
+            codes, values = rows.encoded(column, first_positions)
+            columns[column] = decoded(values, missing)[codes].tolist()
+
+    return {
+        name: {column: columns[column][group] for column in DOCUMENT_COLUMNS}
+        for group, name in enumerate(software_names[present].tolist())
+    }
+
+
+def project_documents(documents: list[dict], columns: list[str]) -> Iterator[dict]:
+    """Keeps only the given columns of each document, in the given order.
+
+    Records are produced lazily so a response serializer only ever holds the
+    record it is writing.
+    """
+    if columns == DOCUMENT_COLUMNS:
+        return iter(documents)
+    return ({column: document[column] for column in columns} for document in documents)
+
+
+def encode_cursor(software_name: str) -> str:
+    """Returns the opaque pagination cursor for the page after software_name.
+
+    The cursor is URL safe and has no padding, so it can be used as a value
+    in the comma and '=' separated API query.
+    """
+    return base64.urlsafe_b64encode(software_name.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    """Returns the software name a pagination cursor continues after.
+
+    Raises:
+        ValueError: If the cursor wasn't created by encode_cursor
+    """
+    padding = "=" * (-len(cursor) % 4)
+    try:
+        return base64.b64decode(cursor + padding, altchars=b"-_", validate=True).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+class CatalogSnapshot:
+    """Immutable, versioned view of all software data on all RPs.
+
+    A snapshot is built once from the database and then shared by every
+    request handled by the worker. Nothing in the API layer should modify
+    the data held by a snapshot; filters always produce new objects. Only
+    `checked_at` changes, when the catalog version is found unchanged.
+
+    Per-software response documents are aggregated once per snapshot (and
+    response style) so requests only have to select and project them.
+
+    Lookups by software, RP and id work on the dictionary codes of the
+    columns (see CatalogRows.encoded). A snapshot loaded from a catalog
+    image reads them from the mapped buffers, without a per-row Python
+    object in the worker.
+
+    Attributes:
+        version (int): Increases by one every time this worker loads a new
+            snapshot.
+        loaded_at (float): Unix timestamp of when the snapshot was loaded.
+        checked_at (float): Unix timestamp of when the catalog version was
+            last found to match the snapshot.
+        content_hash (str | None): Catalog version (stamped by
+            reset_database.py) the rows were loaded at, None if the catalog
+            was never stamped.
+        modified_at (datetime | None): When the catalog version was stamped,
+            in UTC.
+        rows (CatalogRows | CatalogImage): All joined RPSoftware, Software,
+            RPS, and AISoftwareInfo rows as returned by the database, stored
+            by column (or in the mapped catalog image).
+        merged_df (pd.DataFrame): `rows` as a DataFrame. Empty values are
+            filled with "". The DataFrame index is the position in `rows`.
+            Text columns with few distinct values are categorical (all of
+            them when the snapshot was loaded from a catalog image).
+        software_names (list[str]): Sorted names of all software.
+        software_codes (np.ndarray): Code (index in `software_names`) of the
+            software of every row.
+        positions_by_software (dict[str, np.ndarray]): Positions in `rows` of
+            every row of a software.
+        software_codes_by_rp (dict[str, np.ndarray]): Lowercased RP name and RP
+            group id to the sorted codes of the software on that RP.
+    """
+
+    __slots__ = (
+        "version",
+        "loaded_at",
+        "checked_at",
+        "content_hash",
+        "modified_at",
+        "rows",
+        "merged_df",
+        "software_names",
+        "software_codes",
+        "positions_by_software",
+        "software_codes_by_rp",
+        "_row_counts",
+        "_rp_columns",
+        "_sorted_ids",
+        "_id_positions",
+        "_documents",
+        "_search_index",
+    )
+
+    def __init__(
+        self,
+        version: int,
+        rows: CatalogRows | CatalogImage | list[dict],
+        content_hash: str | None = None,
+        modified_at: datetime | None = None,
+        merged_df: pd.DataFrame | None = None,
+    ):
+        self.version = version
+        self.loaded_at = self.checked_at = time.time()
+        self.content_hash = content_hash
+        self.modified_at = modified_at
+        if isinstance(rows, list):
+            rows = CatalogRows.from_dicts(rows)
+        self.rows = rows
+        self.merged_df = merged_df if merged_df is not None else rows.compact_frame()
+
+        if rows:
+            self.software_codes, software_names = rows.encoded("software_name")
+        else:
+            self.software_codes, software_names = np.empty(0, dtype=np.intp), []
+        self.software_names = list(software_names)
+        software_positions = group_positions(
+            self.software_codes, len(self.software_names)
+        )
+        self.positions_by_software = dict(zip(self.software_names, software_positions))
+        self._row_counts = np.bincount(
+            self.software_codes, minlength=len(self.software_names)
+        )
+
+        self._rp_columns, self.software_codes_by_rp = self._index_rps(rows)
+
+        # RPSoftware ids in sorted order, with the position of each id's row
+        if rows:
+            id_codes, ids = rows.encoded("rp_software_id")
+            ids = np.asarray(ids, dtype=np.int64)[id_codes]
+        else:
+            ids = np.empty(0, dtype=np.int64)
+        self._id_positions = np.argsort(ids, kind="stable")
+        self._sorted_ids = ids[self._id_positions]
+        self._documents = {}
+        self._search_index = None
+
+    def _index_rps(self, rows) -> tuple[list, dict[str, np.ndarray]]:
+        """Indexes the software of every RP, see software_codes_by_rp.
+
+        Returns:
+            list[tuple[np.ndarray, np.ndarray]]: Codes of the rp_name and
+                rp_group_id columns, with the lowercased value of each code
+                (which an `rp=` query matches)
+            dict[str, np.ndarray]: software_codes_by_rp
+        """
+        rp_columns = []
+        rp_software = {}
+        software_count = len(self.software_names)
+        for column in ("rp_name", "rp_group_id") if rows else ():
+            codes, values = rows.encoded(column)
+            rp_keys = np.array([value.lower() for value in values], dtype=object)
+            rp_columns.append((codes, rp_keys))
+            # Distinct (RP, software) pairs, split by RP
+            known = codes >= 0
+            pairs = np.unique(
+                codes[known].astype(np.int64) * software_count
+                + self.software_codes[known]
+            )
+            pair_rps, pair_software = np.divmod(pairs, software_count)
+            starts = np.flatnonzero(np.diff(pair_rps)) + 1
+            for rp_code, software_codes in zip(
+                pair_rps[np.append(0, starts)] if len(pairs) else (),
+                np.split(pair_software, starts),
+            ):
+                rp_software.setdefault(rp_keys[rp_code], []).append(software_codes)
+        software_codes_by_rp = {
+            rp_key: np.unique(np.concatenate(codes))
+            for rp_key, codes in rp_software.items()
+        }
+        return rp_columns, software_codes_by_rp
+
+    def is_stale(self) -> bool:
+        """Returns True once the catalog version wasn't checked for
+        CATALOG_REFRESH_SECONDS"""
+        return time.time() - self.checked_at >= CATALOG_REFRESH_SECONDS
+
+    @property
+    def search_index(self) -> SearchIndex:
+        """In-memory index of the searchable columns, built on first use"""
+        return self.build_search_index()
+
+    def build_search_index(self) -> SearchIndex:
+        """Builds the in-memory search index, if it wasn't built yet.
+
+        Returns:
+            SearchIndex: The index of the searchable columns
+        """
+        if self._search_index is None:
+            self._search_index = SearchIndex(self.rows, CatalogView.SEARCHABLE_COLUMNS)
+        return self._search_index
+
+    def documents(self, separator: str, missing: str | None) -> dict[str, dict]:
+        """Returns the response document of every software in this snapshot.
+
+        Documents are built the first time a response style is requested and
+        reused for the lifetime of the snapshot. They must not be modified.
+        With CATALOG_AGGREGATION=sql they are grouped by the database instead
+        of from the snapshot rows.
+
+        Args:
+            separator (str): Text placed between the RP name and its info
+            missing (str | None): Value used in place of empty (None) fields
+
+        Returns:
+            dict[str, dict]: Software name to response document
+        """
+        key = (separator, missing)
+        documents = self._documents.get(key)
+        if documents is None:
+            if CATALOG_AGGREGATION == "sql" and supports("sql_aggregation"):
+                documents = self._aggregate_in_database(separator, missing)
+            else:
+                documents = build_documents(self.rows, separator, missing)
+            self._documents[key] = documents
+        return documents
+
+    def _aggregate_in_database(
+        self, separator: str, missing: str | None
+    ) -> dict[str, dict]:
+        """Gets the document of every software grouped by the database.
+
+        The view may have been refreshed since the rows were loaded, and
+        documents newer than the snapshot would be sent with its (older)
+        ETag. The database's documents are only used when the view still
+        holds this snapshot's catalog version, they are built from the
+        snapshot rows otherwise (and for snapshots without a version).
+        """
+        documents = None
+        if self.content_hash is not None:
+            documents = aggregate_catalog(self.content_hash, separator, missing)
+        if documents is None:
+            logger.info(
+                "Catalog view isn't at the snapshot's version, building its documents."
+            )
+            documents = build_documents(self.rows, separator, missing)
+        return documents
+
+    def select_documents(
+        self, positions, separator: str, missing: str | None, ranked: bool = False
+    ) -> list[dict]:
+        """Returns the documents of the software in the given rows.
+
+        Software whose rows were all selected reuse the prebuilt document.
+        The others (e.g. when filtering by RP) are aggregated from only the
+        selected rows.
+
+        Args:
+            positions (Iterable[int] | None): Positions in `rows` to include.
+                None selects the whole catalog.
+            separator (str): Text placed between the RP name and its info
+            missing (str | None): Value used in place of empty (None) fields
+            ranked (bool): Keep software in the order their first row appears
+                in positions (e.g. search rank) instead of sorting by name
+
+        Returns:
+            list[dict]: Documents sorted by software name, or by rank
+        """
+        documents = self.documents(separator, missing)
+        if positions is None:
+            return [documents[name] for name in self.software_names]
+
+        positions = np.fromiter(positions, dtype=np.intp)
+        codes = self.software_codes[positions]
+        selected, first_rows, counts = np.unique(
+            codes, return_index=True, return_counts=True
+        )
+        # Software with only some of their rows selected are aggregated together
+        partial = selected[counts != self._row_counts[selected]]
+        partial_documents = build_documents(
+            self.rows, separator, missing, positions[np.isin(codes, partial)]
+        )
+
+        if ranked:
+            selected = selected[np.argsort(first_rows, kind="stable")]
+        names = [self.software_names[code] for code in selected.tolist()]
+        return [partial_documents.get(name) or documents[name] for name in names]
+
+    def positions_of_ids(self, ids: Iterable[int]) -> list[int]:
+        """Returns the positions in `rows` of the rows with the given
+        RPSoftware ids, in the order of the ids. Ids without a row are
+        skipped.
+        """
+        ids = np.fromiter(ids, dtype=np.int64)
+        if not len(self._sorted_ids):
+            return []
+        found = np.searchsorted(self._sorted_ids, ids)
+        found[found == len(self._sorted_ids)] = 0
+        known = self._sorted_ids[found] == ids
+        return self._id_positions[found[known]].tolist()
+
+    def page(
+        self,
+        after: str | None,
+        limit: int,
+        positions: Iterable[int] | None = None,
+        rp_keys: list[str] | None = None,
+    ) -> tuple[list[int], str | None]:
+        """Selects one page of software, in software_name order.
+
+        Pages of the whole catalog and of `rp=` queries are read from the
+        sorted software codes of the catalog and of each RP, so a page costs
+        about the same no matter how far into the catalog it is.
+
+        Args:
+            after (str | None): Name of the last software of the previous
+                page, None for the first page
+            limit (int): Maximum number of software on the page
+            positions (Iterable[int] | None): Rows already selected by a
+                filter (e.g. a search). None selects from the indexes.
+            rp_keys (list[str] | None): Lowercased RP names or group ids to
+                select the software of. None selects the whole catalog.
+
+        Returns:
+            list[int]: Positions in `rows` of the page's rows, in name order
+            str | None: Name the next page starts after, None on the last page
+        """
+        # Software codes are in name order, the page starts at the first
+        #   code whose name comes after `after`
+        start = 0 if after is None else bisect_right(self.software_names, after)
+        if positions is not None:
+            positions = np.fromiter(positions, dtype=np.intp)
+            codes = self.software_codes[positions]
+            candidates = np.unique(codes)
+        elif rp_keys is not None:
+            code_lists = [
+                self.software_codes_by_rp[rp_key]
+                for rp_key in rp_keys
+                if rp_key in self.software_codes_by_rp
+            ]
+            candidates = (
+                np.unique(np.concatenate(code_lists)) if code_lists else np.empty(0)
+            )
+        else:
+            candidates = np.arange(len(self.software_names))
+        # One software past the page tells if there is a next page
+        page = candidates[np.searchsorted(candidates, start) :][: limit + 1]
+        has_more = len(page) > limit
+        page = page[:limit].astype(np.intp)
+
+        if positions is not None:
+            in_page = np.isin(codes, page)
+            page_positions = positions[in_page][np.argsort(codes[in_page], kind="stable")]
+        else:
+            page_positions = np.concatenate(
+                [self.positions_by_software[self.software_names[code]] for code in page]
+                or [np.empty(0, dtype=np.intp)]
+            )
+            if rp_keys is not None:
+                page_positions = page_positions[self._rp_mask(page_positions, rp_keys)]
+        next_after = self.software_names[page[-1]] if has_more else None
+        return page_positions.tolist(), next_after
+
+    def _rp_mask(self, positions: np.ndarray, rp_keys: list[str]) -> np.ndarray:
+        """Returns which of the rows at positions are on one of the RPs"""
+        mask = np.zeros(len(positions), dtype=bool)
+        for codes, keys in self._rp_columns:
+            matching = np.flatnonzero(np.isin(keys, rp_keys))
+            mask |= np.isin(codes[positions], matching)
+        return mask
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+@db_operation("view")
+def load_catalog_rows() -> list[dict]:
+    """Gets all available data for all software
+
+    Reads the `catalog_view` materialized view, which holds the join of the
+    RPSoftware, Software, RPS, and AISoftwareInfo tables. AISoftwareInfo is
+    left outer joined, so its columns are None for software without AI info.
+
+    Returns:
+        list[dict]: One dict per RPSoftware row with the merged data from the
+        tables. `rp_software_id` holds the RPSoftware id.
+    """
+    logger.info("Loading catalog from DB.")
+    with db.atomic():
+        query = CatalogView.select(
+            *CatalogView.data_fields(), CatalogView.id.alias("rp_software_id")
+        )
+        rows = list(query.dicts())
+
+    return rows
+
+
+@db_operation("view")
+def aggregate_catalog(
+    content_hash: str, separator: str, missing: str | None
+) -> dict | None:
+    """Groups the documents of every software in the database, if the view
+    still holds the given catalog version.
+
+    The version check (a content hash of the view, like the stamp of
+    reset_database.py) and the aggregation read the same view snapshot, in
+    one REPEATABLE READ transaction.
+
+    Returns:
+        dict | None: Software name to response document, None if the view's
+            content hash isn't content_hash
+    """
+    with db.transaction(isolation_level="REPEATABLE READ"):
+        if CatalogView.content_hash() != content_hash:
+            return None
+        return aggregate_software(
+            CatalogView.select(), DOCUMENT_COLUMNS, separator, missing
+        )
+
+
+@db_operation("view")
+def load_catalog_version() -> CatalogVersion | None:
+    """Gets the catalog version stamped by reset_database.py, a single row read"""
+    return CatalogVersion.current()
+
+
+def peek_catalog() -> CatalogSnapshot | None:
+    """Returns the current snapshot without loading or refreshing it"""
+    return _snapshot
+
+
+def get_catalog() -> CatalogSnapshot:
+    """Returns the worker's current catalog snapshot.
+
+    The first call loads the snapshot. Once the snapshot is stale, one thread
+    checks the catalog version and, if it changed, rebuilds the snapshot
+    while every other thread keeps using the old one. The new
+    snapshot replaces the old one in a single assignment, so a request never
+    sees a partially built catalog.
+
+    Returns:
+        CatalogSnapshot: The snapshot every request should read from.
+    """
+    snapshot = _snapshot
+    if snapshot is None:
+        with _snapshot_lock:
+            # Another thread may have loaded it while we waited for the lock
+            if _snapshot is None:
+                return reload_catalog()
+            return _snapshot
+
+    if snapshot.is_stale() and _snapshot_lock.acquire(blocking=False):
+        try:
+            if _snapshot is snapshot:
+                return refresh_catalog(snapshot)
+        except Exception:
+            # Keep serving the old data if the database is unavailable
+            logger.exception("Unable to reload catalog, serving old snapshot.")
+        finally:
+            _snapshot_lock.release()
+
+    return _snapshot
+
+
+def refresh_catalog(snapshot: CatalogSnapshot) -> CatalogSnapshot:
+    """Reloads the snapshot if the catalog version changed since it was loaded.
+
+    Args:
+        snapshot (CatalogSnapshot): The current snapshot
+
+    Returns:
+        CatalogSnapshot: The current snapshot, or the newly loaded one
+    """
+    catalog_version = load_catalog_version()
+    if (
+        catalog_version is not None
+        and catalog_version.content_hash == snapshot.content_hash
+    ):
+        snapshot.checked_at = time.time()
+        return snapshot
+    return reload_catalog(catalog_version)
+
+
+def reload_catalog(catalog_version: CatalogVersion | None = None) -> CatalogSnapshot:
+    """Builds a new snapshot and makes it the current one.
+
+    The rows are read from the catalog image written by reset_database.py
+    when it holds the current catalog version, and from the database
+    otherwise.
+
+    Args:
+        catalog_version (CatalogVersion | None): The catalog version, read
+            before the rows. Loaded when not given.
+
+    Returns:
+        CatalogSnapshot: The newly loaded snapshot.
+    """
+    global _snapshot
+    if catalog_version is None:
+        catalog_version = load_catalog_version()
+    version = _snapshot.version + 1 if _snapshot is not None else 1
+    image = load_catalog_image(catalog_version)
+    if image is not None:
+        rows, merged_df, source = image, image.frame(), image.directory
+    else:
+        rows, merged_df, source = load_catalog_rows(), None, "database"
+    snapshot = CatalogSnapshot(
+        version,
+        rows,
+        content_hash=catalog_version.content_hash if catalog_version else None,
+        modified_at=catalog_version.updated_at if catalog_version else None,
+        merged_df=merged_df,
+    )
+    _snapshot = snapshot
+    logger.info(
+        f"Catalog snapshot {version} loaded from {source} "
+        f"({len(snapshot.merged_df)} rows)."
+    )
+    return snapshot
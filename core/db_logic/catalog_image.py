@@ -0,0 +1,302 @@
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from ..models.catalogVersion import CatalogVersion
+from ..core_logging import logger
+from .catalog_rows import CatalogRows
+
+# Directory of the catalog image written by reset_database.py
+CATALOG_IMAGE_DIR = os.getenv("CATALOG_IMAGE_DIR", "data/catalog_image")
+
+# Version of the file layout, images of another version are ignored
+IMAGE_FORMAT = 1
+
+
+def code_dtype(size: int) -> np.dtype:
+    """Returns the smallest code type for a dictionary of the given size, the
+    one pandas uses for categorical codes so they are never converted"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if size < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def column_kind(values: list) -> str:
+    """Returns how a column is stored: 'bool', 'int' or 'str'"""
+    sample = next((value for value in values if value is not None), None)
+    if isinstance(sample, bool):
+        return "bool"
+    if isinstance(sample, int):
+        return "int"
+    return "str"
+
+
+def write_catalog_image(
+    rows: list[dict],
+    catalog_version: CatalogVersion | None,
+    directory: str = CATALOG_IMAGE_DIR,
+) -> None:
+    """Writes catalog rows as a columnar image API workers can memory-map.
+
+    Every column is stored as NumPy `.npy` buffers in the image directory:
+    - str columns are dictionary encoded: `<column>.codes.npy` holds the index
+      of each row's value in the sorted, unique values, which are stored as
+      UTF-8 in `<column>.data.npy`, separated by NUL characters (which
+      Postgres text can't contain)
+    - int and bool columns are stored as is in `<column>.values.npy`
+    - `<column>.nulls.npy` marks the rows that are None, if any. Their code
+      points to "" (or their value is 0) so the columns can be used without
+      filling them.
+
+    `meta.json` records the catalog version the rows were read at, so the
+    image is only used while that version is current. The directory is
+    replaced in one rename; workers that already mapped the old image keep
+    reading it.
+
+    Args:
+        rows (list[dict]): Catalog rows, i.e. load_catalog_rows()
+        catalog_version (CatalogVersion | None): Version the rows were read at
+        directory (str): Where to write the image
+    """
+    columns = list(rows[0]) if rows else []
+    staging = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    kinds = {}
+    for column in columns:
+        values = [row[column] for row in rows]
+        kinds[column] = kind = column_kind(values)
+        nulls = np.fromiter(
+            (value is None for value in values), dtype=bool, count=len(values)
+        )
+        if kind == "str":
+            codes, dictionary = pd.factorize(
+                pd.Series(values, dtype=object).fillna(""), sort=True
+            )
+            data = np.frombuffer("\0".join(dictionary).encode(), dtype=np.uint8)
+            codes = codes.astype(code_dtype(len(dictionary)))
+            np.save(f"{staging}/{column}.codes.npy", codes)
+            np.save(f"{staging}/{column}.data.npy", data)
+        else:
+            dtype = bool if kind == "bool" else np.int64
+            filled = [0 if value is None else value for value in values]
+            np.save(f"{staging}/{column}.values.npy", np.array(filled, dtype=dtype))
+        if nulls.any():
+            np.save(f"{staging}/{column}.nulls.npy", nulls)
+
+    meta = {
+        "format": IMAGE_FORMAT,
+        "content_hash": catalog_version.content_hash if catalog_version else None,
+        "row_count": len(rows),
+        "columns": kinds,
+    }
+    with open(f"{staging}/meta.json", "w", encoding="utf-8") as meta_file:
+        json.dump(meta, meta_file, indent=2)
+
+    previous = f"{directory}.old-{os.getpid()}"
+    if os.path.exists(directory):
+        os.rename(directory, previous)
+    os.rename(staging, directory)
+    shutil.rmtree(previous, ignore_errors=True)
+    logger.info(f"Catalog image written to {directory} ({len(rows)} rows).")
+
+
+class CatalogImage:
+    """Read-only, memory-mapped catalog image written by write_catalog_image.
+
+    Codes and values are read straight from the mapped files, so every
+    worker on a node shares them through the page cache. Only the
+    dictionaries of distinct values are decoded into Python strings.
+
+    A CatalogSnapshot uses the image as its rows: lookups and aggregations
+    work on the codes (see `encoded`), rows are only decoded one at a time.
+    `rows` decodes all of them, for tools comparing the image to its rows.
+
+    Attributes:
+        directory (str): Image directory
+        content_hash (str | None): Catalog version of the rows
+        row_count (int): Number of catalog rows
+        kinds (dict[str, str]): Column name to 'str', 'int' or 'bool', in row
+            key order
+    """
+
+    __slots__ = (
+        "directory",
+        "content_hash",
+        "row_count",
+        "kinds",
+        "_buffers",
+        "_dictionaries",
+    )
+
+    def __init__(self, directory: str, meta: dict):
+        self.directory = directory
+        self.content_hash = meta["content_hash"]
+        self.row_count = meta["row_count"]
+        self.kinds = meta["columns"]
+        self._buffers = {}
+        self._dictionaries = {}
+
+    @classmethod
+    def open(cls, directory: str = CATALOG_IMAGE_DIR):
+        """Opens an image, None if there is no (readable) image in directory"""
+        try:
+            with open(f"{directory}/meta.json", encoding="utf-8") as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+        if meta.get("format") != IMAGE_FORMAT:
+            return None
+        return cls(directory, meta)
+
+    def _load(self, column: str, part: str) -> np.ndarray | None:
+        key = (column, part)
+        if key in self._buffers:
+            return self._buffers[key]
+        path = f"{self.directory}/{column}.{part}.npy"
+        if not os.path.exists(path):
+            buffer = None
+        else:
+            try:
+                buffer = np.load(path, mmap_mode="r")
+            except ValueError:  # Empty buffers can't be mapped
+                buffer = np.load(path)
+        self._buffers[key] = buffer
+        return buffer
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    def __getitem__(self, position: int) -> dict:
+        """Returns one row as a dict, decoded from the buffers"""
+        if not -self.row_count <= position < self.row_count:
+            raise IndexError(f"Catalog image row {position} out of range")
+        row = {}
+        for column, kind in self.kinds.items():
+            nulls = self.nulls(column)
+            if nulls is not None and nulls[position]:
+                row[column] = None
+            elif kind == "str":
+                row[column] = self.dictionary(column)[self.codes(column)[position]]
+            else:
+                row[column] = self.values(column)[position].item()
+        return row
+
+    def codes(self, column: str) -> np.ndarray:
+        """Dictionary codes of a str column, memory-mapped"""
+        return self._load(column, "codes")
+
+    def values(self, column: str) -> np.ndarray:
+        """Values of an int or bool column, memory-mapped. None is stored as 0."""
+        return self._load(column, "values")
+
+    def nulls(self, column: str) -> np.ndarray | None:
+        """Rows of a column that are None, None if there are none"""
+        return self._load(column, "nulls")
+
+    def dictionary(self, column: str) -> pd.Index:
+        """Sorted distinct values of a str column, the categories of its codes"""
+        dictionary = self._dictionaries.get(column)
+        if dictionary is None:
+            values = self._load(column, "data").tobytes().decode().split("\0")
+            strings = np.empty(len(values), dtype=object)
+            strings[:] = values
+            dictionary = self._dictionaries[column] = pd.Index(strings, dtype=object)
+        return dictionary
+
+    def encoded(
+        self, column: str, positions: np.ndarray | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Returns a column dictionary encoded, like CatalogRows.encoded.
+
+        The codes of a str column are the mapped ones, copied only to select
+        positions or to mark None. int and bool columns are encoded here.
+
+        Args:
+            column (str): Column name
+            positions (np.ndarray | None): Rows to encode, None for all
+
+        Returns:
+            np.ndarray: Code of each row's value in the distinct values, -1
+                for None
+            np.ndarray: The sorted distinct values
+        """
+        nulls = self.nulls(column)
+        if positions is not None and nulls is not None:
+            nulls = nulls[positions]
+        if self.kinds[column] == "str":
+            codes = self.codes(column)
+            if positions is not None:
+                codes = codes[positions]
+            values = self.dictionary(column).to_numpy()
+        else:
+            values = self.values(column)
+            if positions is not None:
+                values = values[positions]
+            codes, values = pd.factorize(values, sort=True)
+        if nulls is not None:
+            codes = np.where(nulls, -1, codes)
+        return codes, values
+
+    def column(self, column: str) -> list:
+        """Python values of a column, with None where the value is None"""
+        if self.kinds[column] == "str":
+            values = self.dictionary(column).to_numpy()[self.codes(column)]
+        else:
+            values = self.values(column).astype(object)
+        nulls = self.nulls(column)
+        if nulls is not None:
+            values[nulls] = None
+        return values.tolist()
+
+    def rows(self) -> CatalogRows:
+        """Returns the catalog rows, equal to the rows the image was written
+        from. Equal values of a column are one string object.
+
+        Decodes every row into lists, a snapshot reads the image itself."""
+        return CatalogRows({column: self.column(column) for column in self.kinds})
+
+    def frame(self) -> pd.DataFrame:
+        """Returns the rows as a DataFrame without copying the mapped buffers.
+
+        str columns are categoricals over the mapped codes, None is "" like
+        in `CatalogSnapshot.merged_df`. int and bool columns with None are
+        filled with "" too, the others are the mapped values.
+        """
+        columns = {}
+        for column, kind in self.kinds.items():
+            if kind == "str":
+                columns[column] = pd.Categorical.from_codes(
+                    self.codes(column),
+                    dtype=pd.CategoricalDtype(self.dictionary(column)),
+                    validate=False,
+                )
+            else:
+                values = self.values(column)
+                nulls = self.nulls(column)
+                if nulls is not None:
+                    values = values.astype(object)
+                    values[nulls] = ""
+                columns[column] = values
+        return pd.DataFrame(columns, copy=False)
+
+
+def load_catalog_image(
+    catalog_version: CatalogVersion | None, directory: str = CATALOG_IMAGE_DIR
+) -> CatalogImage | None:
+    """Opens the catalog image if it holds the given catalog version.
+
+    Returns:
+        CatalogImage | None: The image, None if there is none or it was
+            written for another version (the rows must then be read from the
+            database)
+    """
+    if catalog_version is None:
+        return None
+    image = CatalogImage.open(directory)
+    if image is None or image.content_hash != catalog_version.content_hash:
+        return None
+    return image
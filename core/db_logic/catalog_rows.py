@@ -0,0 +1,149 @@
+from collections.abc import Iterable, Iterator
+import numpy as np
+import pandas as pd
+
+# Columns of merged_df with at most this share of distinct values are stored
+#   as categoricals (rp_name, rp_group_id, ai_software_type, ...)
+CATEGORICAL_MAX_SHARE = 0.5
+
+
+def group_positions(codes: np.ndarray, size: int) -> list[np.ndarray]:
+    """Returns the positions of the rows of every code, in row order.
+
+    Args:
+        codes (np.ndarray): Code of each row, from 0 to size - 1. Rows coded
+            -1 (None) are left out.
+        size (int): Number of codes
+
+    Returns:
+        list[np.ndarray]: Positions of the rows of each code, in code order
+    """
+    if size == 0:
+        return []
+    rows = np.flatnonzero(codes >= 0)
+    codes = codes[rows]
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes, minlength=size)
+    return np.split(rows[order], np.cumsum(counts)[:-1])
+
+
+class CatalogRow:
+    """Read-only view of one row of a CatalogRows, used like a dict"""
+
+    __slots__ = ("_columns", "_position")
+
+    def __init__(self, columns: dict[str, list], position: int):
+        self._columns = columns
+        self._position = position
+
+    def __getitem__(self, column: str):
+        return self._columns[column][self._position]
+
+    def get(self, column: str, default=None):
+        values = self._columns.get(column)
+        return default if values is None else values[self._position]
+
+    def keys(self):
+        return self._columns.keys()
+
+    def to_dict(self) -> dict:
+        return {
+            column: values[self._position] for column, values in self._columns.items()
+        }
+
+
+class CatalogRows:
+    """Catalog rows stored column by column.
+
+    Each column is one list, so a row costs a reference per column instead
+    of a dict. Equal strings are stored once per CatalogRows (the
+    description of a software is repeated on every RP that has it). They are
+    deduplicated with a table of their own rather than `sys.intern`, whose
+    strings would outlive the snapshot.
+
+    Attributes:
+        columns (dict[str, list]): Column name to its values, in row order
+    """
+
+    __slots__ = ("columns", "_length")
+
+    def __init__(self, columns: dict[str, list]):
+        self.columns = columns
+        self._length = len(next(iter(columns.values()))) if columns else 0
+
+    @classmethod
+    def from_dicts(cls, rows: list[dict]) -> "CatalogRows":
+        """Converts rows read from the database, deduplicating their strings"""
+        strings = {}
+        columns = {}
+        for column in rows[0] if rows else ():
+            columns[column] = [
+                strings.setdefault(value, value) if isinstance(value, str) else value
+                for value in (row[column] for row in rows)
+            ]
+        return cls(columns)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, position: int) -> CatalogRow:
+        return CatalogRow(self.columns, position)
+
+    def __iter__(self) -> Iterator[CatalogRow]:
+        return (CatalogRow(self.columns, position) for position in range(self._length))
+
+    def column(self, column: str) -> list:
+        """All values of a column, in row order. Must not be modified."""
+        return self.columns[column]
+
+    def encoded(
+        self, column: str, positions: np.ndarray | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Returns a column dictionary encoded, like the columns of a catalog
+        image (see CatalogImage.encoded).
+
+        Args:
+            column (str): Column name
+            positions (np.ndarray | None): Rows to encode, None for all
+
+        Returns:
+            np.ndarray: Code of each row's value in the distinct values, -1
+                for None
+            np.ndarray: The sorted distinct values
+        """
+        values = self.columns[column]
+        if positions is not None:
+            values = [values[position] for position in positions]
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object), sort=True)
+        return codes, uniques
+
+    def take(self, positions: Iterable[int]) -> "CatalogRows":
+        """Returns the rows at the given positions, in that order"""
+        positions = list(positions)
+        return CatalogRows(
+            {
+                column: [values[i] for i in positions]
+                for column, values in self.columns.items()
+            }
+        )
+
+    def to_dicts(self) -> list[dict]:
+        """Returns the rows as dicts, like the database returned them"""
+        columns = list(self.columns)
+        return [dict(zip(columns, values)) for values in zip(*self.columns.values())]
+
+    def frame(self) -> pd.DataFrame:
+        """Returns the rows as a DataFrame, equal to `pd.DataFrame(rows)` of the
+        row dicts"""
+        return pd.DataFrame(self.columns)
+
+    def compact_frame(self) -> pd.DataFrame:
+        """Returns the rows as a DataFrame with empty values filled with "".
+        Text columns with few distinct values are categorical."""
+        frame = self.frame().fillna("")
+        for column in frame.columns:
+            values = frame[column]
+            max_unique = CATEGORICAL_MAX_SHARE * len(values)
+            if values.dtype == object and values.nunique() <= max_unique:
+                frame[column] = values.astype("category")
+        return frame
@@ -0,0 +1,98 @@
+import argparse
+from ..models import db_operation, db_proxy as db, supports
+from ..models.catalogView import CatalogView
+from .get_software_details import (
+    build_filtered_query,
+    find_search_groups,
+    split_search_string,
+)
+
+# Plan nodes that read from an index
+INDEX_SCAN_NODES = {"Index Scan", "Index Only Scan", "Bitmap Index Scan"}
+# pg_trgm can't narrow down substring matches shorter than a trigram
+MIN_TRIGRAM_LENGTH = 3
+
+
+def find_plan_indexes(plan: dict) -> list[str]:
+    """Returns the names of the indexes read anywhere in an EXPLAIN plan node"""
+    indexes = []
+    if plan.get("Node Type") in INDEX_SCAN_NODES:
+        indexes.append(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        indexes.extend(find_plan_indexes(child))
+    return indexes
+
+
+@db_operation("view")
+def check_search_indexes(search_string: str, force_index: bool = False) -> list[dict]:
+    """Reports which terms of a search can be answered from an index.
+
+    Every `column(value)` term is planned on its own with EXPLAIN, exactly as
+    search_software would filter it.
+
+    Args:
+        search_string (str): Value of the `search=` API parameter, i.e.
+            'rp_name(ookami)&software_name(7z)+fulltext(genome assembly)'
+        force_index (bool): Disable sequential scans while planning. On small
+            catalogs Postgres prefers a sequential scan even when an index
+            exists, this shows whether an index could serve the term at all.
+
+    Returns:
+        list[dict]: One report per term with the keys `term`, `indexes`
+            (names of the indexes used), `uses_index`, and `note`.
+    """
+    if not supports("explain_analyze"):
+        raise RuntimeError(
+            "Search index checks need Postgres plans, DB_BACKEND is not 'postgres'"
+        )
+
+    report = []
+    with db.atomic():
+        if force_index:
+            db.execute_sql("SET LOCAL enable_seqscan = off")
+
+        for group in find_search_groups(split_search_string(search_string)):
+            for key, value in group.items():
+                query = CatalogView.select(CatalogView.id).where(
+                    build_filtered_query({key: value})
+                )
+                sql, params = query.sql()
+                cursor = db.execute_sql(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                plan = cursor.fetchone()[0]
+                indexes = find_plan_indexes(plan[0]["Plan"])
+
+                note = ""
+                if (
+                    key in CatalogView.SEARCHABLE_COLUMNS
+                    and len(value) < MIN_TRIGRAM_LENGTH
+                ):
+                    note = (
+                        f"values shorter than {MIN_TRIGRAM_LENGTH} characters "
+                        "can't use a trigram index"
+                    )
+                report.append(
+                    {
+                        "term": f"{key}({value})",
+                        "indexes": indexes,
+                        "uses_index": bool(indexes),
+                        "note": note,
+                    }
+                )
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Report which search terms use an index on catalog_view."
+    )
+    parser.add_argument("search", help="i.e. 'rp_name(anvil)&software_name(7z)'")
+    parser.add_argument(
+        "--force-index",
+        action="store_true",
+        help="plan with sequential scans disabled",
+    )
+    args = parser.parse_args()
+
+    for term_report in check_search_indexes(args.search, args.force_index):
+        status = ", ".join(term_report["indexes"]) or "sequential scan"
+        print(f"{term_report['term']}: {status} {term_report['note']}".rstrip())
@@ -1,17 +1,39 @@
-from ..models import db_operation, db_proxy as db
-from ..models.rpSoftware import RPSoftware
-from ..models.software import Software
-from ..models.rps import RPS
-from ..models.aiSoftwareInfo import AISoftwareInfo
+from ..models import db_operation, db_proxy as db, QueryResult, supports
+from ..models.catalogView import CatalogView
+import numpy as np
 import pandas as pd
 import operator
 from functools import *
 import re
-from peewee import ModelSelect, Expression
+from peewee import ModelSelect, Expression, NodeList, SQL, fn
 
+# Search key that runs a ranked full-text search instead of a substring match
+FULLTEXT_KEY = "fulltext"
 
-@db_operation("view")
-def get_software_details(software_names: str, query: ModelSelect) -> ModelSelect:
+# Columns aggregate_software returns as arrays, over every RP of a software
+RP_LIST_COLUMNS = ("rp_name", "rp_group_id")
+RP_INFO_COLUMNS = ("rp_software_documentation", "software_versions")
+
+
+def lower_isin(column: pd.Series, names: list[str]) -> np.ndarray:
+    """
+    Case-insensitive `Series.isin` for lowercased names.
+
+    Categorical columns (from a memory-mapped catalog image) are matched on
+    their distinct values, then selected by code without decoding the rows.
+
+    Returns:
+        np.ndarray: Boolean mask of the matching rows
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        matches = column.cat.categories.str.lower().isin(names)
+        return matches[column.cat.codes.to_numpy()]
+    return column.str.lower().isin(names).to_numpy()
+
+
+def get_software_details(
+    software_names: str, query: ModelSelect
+) -> QueryResult | pd.DataFrame:
     """
     Retrieves the details of a software or multiple software entries from the database using Peewee query filtering.
 
@@ -20,7 +42,9 @@ def get_software_details(software_names: str, query: ModelSelect) -> ModelSelect
         query (ModelSelect): A Peewee query object containing software data across all Resource Providers (RPs).
 
     Returns:
-        software_data (ModelSelect): Filtered Peewee Query object with the details of the
+        software_data (QueryResult | pd.DataFrame): For a query, the lazily run
+        result of the filtered query, falsy when nothing matched. For a
+        DataFrame, the filtered rows, or None if no match is found.
     """
     software_list = software_names.split("+")
 
@@ -29,21 +53,19 @@ def get_software_details(software_names: str, query: ModelSelect) -> ModelSelect
             software_data = query
         else:
             software_data = query.where(
-                Software.software_name.in_([name.lower() for name in software_list])
+                CatalogView.software_name.in_([name.lower() for name in software_list])
             )
 
-        if not software_data.exists():
-            return None  # Returning None to indicate that no match was found
-
-        return software_data
+        # Runs once when the caller uses it, an empty result means no match
+        return QueryResult(software_data)
     else:
         if software_names == "*":  # Get all info for the website
             software_data = query
         else:
             software_data = query[
-                query["software_name"]
-                .str.lower()
-                .isin([name.lower() for name in software_list])
+                lower_isin(
+                    query["software_name"], [name.lower() for name in software_list]
+                )
             ]
 
         if software_data.empty:
@@ -52,8 +74,7 @@ def get_software_details(software_names: str, query: ModelSelect) -> ModelSelect
         return software_data
 
 
-@db_operation("view")
-def get_rp_details(rp_names: str, query: ModelSelect) -> ModelSelect:
+def get_rp_details(rp_names: str, query: ModelSelect) -> QueryResult | pd.DataFrame:
     """
     Retrieves the details of an RP or multiple RPs from the database using Peewee query filtering.
 
@@ -62,23 +83,24 @@ def get_rp_details(rp_names: str, query: ModelSelect) -> ModelSelect:
         query (ModelSelect): A Peewee query object containing RP data across all software entries.
 
     Returns:
-        rp_data (ModelSelect): Filtered Peewee Query object with the details of the requested RP(s), or None if no match is found.
+        rp_data (QueryResult | pd.DataFrame): For a query, the lazily run
+        result of the filtered query, falsy when nothing matched. For a
+        DataFrame, the filtered rows, or None if no match is found.
 
     """
     rp_list = [name.lower() for name in rp_names.split("+")]
     # Check due to API_0 and API_0v1 working with different query objects
     if not isinstance(query, pd.DataFrame):
         rp_data = query.where(
-            (RPS.rp_name.in_(rp_list)) | (RPS.rp_group_id.in_(rp_list))
+            (CatalogView.rp_name.in_(rp_list)) | (CatalogView.rp_group_id.in_(rp_list))
         )
 
-        if not rp_data.exists():
-            return None  # Returning None to indicate that no match was found
-        return rp_data
+        # Runs once when the caller uses it, an empty result means no match
+        return QueryResult(rp_data)
     else:
         rp_data = query[
-            query["rp_name"].str.lower().isin([name.lower() for name in rp_list])
-            | query["rp_group_id"].str.lower().isin([name.lower() for name in rp_list])
+            lower_isin(query["rp_name"], rp_list)
+            | lower_isin(query["rp_group_id"], rp_list)
         ]
 
         if rp_data.empty:
@@ -86,23 +108,32 @@ def get_rp_details(rp_names: str, query: ModelSelect) -> ModelSelect:
         return rp_data
 
 
-@db_operation("view")
-def search_software(search: str) -> ModelSelect:
+def search_software(search: str, fields: list = None) -> QueryResult:
     """
     Column-specific search. Extracts software from the database based on column-specific searches in the form of:
     col_name(value).
 
+    `fulltext(value)` searches the weighted full-text index over the software
+    and AI description columns instead of a single column. value uses web
+    search syntax (words, "quoted phrases", or, -excluded). When a search uses
+    it, results are ordered by rank, best match first.
+
     Args:
         search (str): The string containing key(value) pairs to search for.
             Filters inner-join by '&' and union by the '+'.
+        fields (list): CatalogView fields to select, defaults to every data column
 
     Returns:
-        (query object): Filtered query with the details of the requested search parameters, or an empty query if no match is found.
+        (QueryResult): Lazily run result of the filtered query, falsy if no
+            match is found.
 
     Examples:
         rp_name(ookami)&software_name(7z)+rp_name(anvil)
         The above query returns software named 7z on ookami and all software on anvil.
 
+        fulltext(molecular dynamics)&rp_name(delta)
+        The above query returns software about molecular dynamics on delta.
+
     """
     search_groups = find_search_groups(search)
 
@@ -114,17 +145,24 @@ def search_software(search: str) -> ModelSelect:
 
     ored_filters = reduce(operator.or_, filters)
 
-    query = (
-        RPSoftware.select(RPSoftware, Software, RPS, AISoftwareInfo)
-        .join(Software, on=(RPSoftware.software_id == Software.id))
-        .join(RPS, on=(RPSoftware.rp_id == RPS.id))
-        .left_outer_join(AISoftwareInfo, on=(AISoftwareInfo.software_id == Software.id))
-    ).where(ored_filters)
-
-    if not query.exists():
-        return None
+    # catalog_view already holds the RPSoftware/Software/RPS/AISoftwareInfo join
+    query = CatalogView.select(*(fields or CatalogView.data_fields())).where(ored_filters)
+
+    fulltext_values = [
+        group[FULLTEXT_KEY] for group in search_groups if FULLTEXT_KEY in group
+    ]
+    if fulltext_values:
+        rank = reduce(
+            operator.add,
+            [
+                fn.ts_rank(CatalogView.search_vector, CatalogView.fulltext_query(value))
+                for value in fulltext_values
+            ],
+        )
+        query = query.order_by(rank.desc(), CatalogView.software_name)
 
-    return query
+    # Runs once when the caller uses it, an empty result means no match
+    return QueryResult(query)
 
 
 def build_filtered_query(search_group: dict) -> Expression:
@@ -140,38 +178,25 @@ def build_filtered_query(search_group: dict) -> Expression:
     Examples:
         If your current search group is {'rp_name': 'ookami', 'software_name': '7z'}.
         Then this function returns a filter that finds rows in the DB that have ookami in rp_name AND 7z in software_name.
+        A `fulltext` key matches the value against the full-text search index.
     """
 
-    # Define a mapping of keys to their corresponding model and field
+    # Define a mapping of keys to their corresponding catalog_view field
     field_map = {
-        "software_name": (Software, Software.software_name),
-        "software_description": (Software, Software.software_description),
-        "software_web_page": (Software, Software.software_web_page),
-        "software_documentation": (Software, Software.software_documentation),
-        "software_use_link": (Software, Software.software_use_link),
-        "rp_name": (RPS, RPS.rp_name),
-        "rp_group_id": (RPS, RPS.rp_group_id),
-        "ai_description": (AISoftwareInfo, AISoftwareInfo.ai_description),
-        "ai_software_type": (AISoftwareInfo, AISoftwareInfo.ai_software_type),
-        "ai_software_class": (AISoftwareInfo, AISoftwareInfo.ai_software_class),
-        "ai_research_field": (AISoftwareInfo, AISoftwareInfo.ai_research_field),
-        "ai_research_area": (AISoftwareInfo, AISoftwareInfo.ai_research_area),
-        "ai_research_discipline": (
-            AISoftwareInfo,
-            AISoftwareInfo.ai_research_discipline,
-        ),
-        "ai_core_features": (AISoftwareInfo, AISoftwareInfo.ai_core_features),
-        "ai_general_tags": (AISoftwareInfo, AISoftwareInfo.ai_general_tags),
-        "ai_example_use": (AISoftwareInfo, AISoftwareInfo.ai_example_use),
-        "software_versions": (RPSoftware, RPSoftware.software_versions),
-        "rp_software_documentation": (RPSoftware, RPSoftware.rp_software_documentation),
+        column: getattr(CatalogView, column) for column in CatalogView.SEARCHABLE_COLUMNS
     }
 
     # Apply filters dynamically based on the dictionary passed in
     filters = []
     for key, value in search_group.items():
-        if key in field_map:
-            model, field = field_map[key]
+        if key == FULLTEXT_KEY:
+            if not supports("fulltext"):
+                raise ValueError(
+                    f"{FULLTEXT_KEY}(...) searches need Postgres full-text search"
+                )
+            filters.append(CatalogView.fulltext_match(value))
+        elif key in field_map:
+            field = field_map[key]
             # Only keep items that contain value in specific column
             filters.append(field.contains(value))
 
@@ -181,6 +206,19 @@ def build_filtered_query(search_group: dict) -> Expression:
     return anded_filters
 
 
+def split_search_string(search_string: str) -> list:
+    """
+    Splits the value of the `search=` API parameter into its OR-ed groups.
+
+    Args:
+        search_string (str): i.e. 'rp_name(ookami)&software_name(7z)+rp_name(anvil)'
+
+    Returns:
+        search (list): i.e. ['rp_name(ookami)&software_name(7z)', 'rp_name(anvil)']
+    """
+    return re.findall(r"(\w+\s*\(.*?\)(?:&\w+\s*\(.*?\))*)(?=\s*\+|$)", search_string)
+
+
 def find_search_groups(search: str) -> list:
     """
     Parses the search string into a list of dictionaries containing key-value pairs of the DB columns and values to search for.
@@ -216,3 +254,103 @@ def find_search_groups(search: str) -> list:
         search_groups.append(search_columns)
 
     return search_groups
+
+
+def is_ranked_search(search: list[str]) -> bool:
+    """
+    Checks if a search uses full-text terms, in which case search_software
+    orders its results by rank.
+
+    Args:
+        search (list): The search groups grabbed from the API url
+
+    Returns:
+        bool: True if any search group has a `fulltext(...)` term
+    """
+    return any(FULLTEXT_KEY in group for group in find_search_groups(search))
+
+
+def sorted_unique_array(expression) -> Expression:
+    """
+    Aggregates the distinct values of expression into an array.
+    Values are compared with the "C" collation (code point order), so the
+    array is in the same order Python's sorted() would put it in.
+    """
+    collated = NodeList((expression, SQL('COLLATE "C"')))
+    return fn.array_agg(NodeList((SQL("DISTINCT"), collated, SQL("ORDER BY"), collated)))
+
+
+def software_document_expression(columns: list[str], separator: str) -> Expression:
+    """
+    Builds the json_build_object expression of a software's response record
+    for a query grouped by software.
+
+    Args:
+        columns (list[str]): Columns of the record, in output order
+        separator (str): Text placed between an RP name and its info
+
+    Returns:
+        (Expression): json object with `rp_name` and `rp_group_id` as sorted
+        arrays of unique values, `rp_software_documentation` and
+        `software_versions` as sorted arrays of unique 'rp_name<separator>info'
+        strings, and every other column as its (single) value for the software.
+    """
+    arguments = []
+    for column in columns:
+        field = getattr(CatalogView, column)
+        if column in RP_LIST_COLUMNS:
+            value = sorted_unique_array(field)
+        elif column in RP_INFO_COLUMNS:
+            value = sorted_unique_array(fn.CONCAT(CatalogView.rp_name, separator, field))
+        else:
+            # Software and AI columns are the same on every row of a software
+            value = fn.min(field)
+        arguments.extend([column, value])
+    return fn.json_build_object(*arguments)
+
+
+@db_operation("view")
+def aggregate_software(
+    query: ModelSelect, columns: list[str], separator: str, missing: str | None
+) -> dict[str, dict]:
+    """
+    SQL-side aggregation mode. Groups the catalog rows matched by a query into
+    one response record per software in the database, so each software's
+    description and AI columns are sent once instead of once per RP, and no
+    grouping is left to do in Python.
+
+    Args:
+        query (ModelSelect | QueryResult): A CatalogView query, i.e.
+            CatalogView.select(), or the output of get_software_details /
+            get_rp_details / search_software (which is then never run).
+            Only its filters are used.
+        columns (list[str]): Columns of the records, in output order
+        separator (str): Text placed between an RP name and its documentation
+            or versions
+        missing (str | None): Value used in place of empty (NULL) fields
+
+    Returns:
+        documents (dict): software name to response record, ordered by software name
+
+    Examples:
+        query = search_software(['rp_name(anvil)'])
+        aggregate_software(query, DOCUMENT_COLUMNS, ': ', '')
+        The above returns one record per software on anvil. RP lists only hold
+        the rows the query matched (anvil).
+    """
+    if isinstance(query, QueryResult):
+        query = query.query
+    document = software_document_expression(columns, separator).alias("document")
+    grouped = (
+        query.select(CatalogView.software_name, document)
+        .group_by(CatalogView.software_id, CatalogView.software_name)
+        .order_by(CatalogView.software_name)
+    )
+
+    documents = {}
+    for software_name, record in grouped.tuples().iterator():
+        for column, value in record.items():
+            if value is None:
+                record[column] = missing
+        documents[software_name] = record
+    return documents
@@ -0,0 +1,125 @@
+import numpy as np
+from .catalog_image import CatalogImage
+from .catalog_rows import CatalogRows, group_positions
+
+# Length of the n-grams values are indexed by
+NGRAM_SIZE = 3
+
+
+def ngrams(text: str, size: int = NGRAM_SIZE) -> set[str]:
+    """Returns every distinct substring of text with the given length"""
+    return {text[i : i + size] for i in range(len(text) - size + 1)}
+
+
+class ColumnIndex:
+    """Inverted index of one catalog column for case-insensitive substring
+    matching.
+
+    Rows are grouped by their distinct (lowercased) value, since most columns
+    repeat the same values over many rows (rp_name, ai_software_type, ...).
+    The groups are built from the dictionary encoded column, only its
+    distinct values are lowercased. Each distinct value is split into
+    n-grams, and every n-gram maps to a posting list of the values that
+    contain it.
+
+    Attributes:
+        values (list[str]): Distinct lowercased values of the column
+        positions (list[np.ndarray]): Catalog row positions holding each value
+        grams (dict[str, list[int]]): N-gram to ids (index in `values`) of the
+            values containing it
+    """
+
+    __slots__ = ("values", "positions", "grams")
+
+    def __init__(self, codes: np.ndarray, values: np.ndarray):
+        # Id of each code's lowercased value, the last one is NULL's (-1),
+        #   which never matches a LIKE filter
+        value_ids = {}
+        code_value_ids = np.full(len(values) + 1, -1, dtype=np.int64)
+        for code, value in enumerate(values):
+            value = str(value).lower()
+            code_value_ids[code] = value_ids.setdefault(value, len(value_ids))
+        self.values = list(value_ids)
+        self.positions = group_positions(code_value_ids[codes], len(self.values))
+
+        self.grams = {}
+        for value_id, value in enumerate(self.values):
+            for gram in ngrams(value):
+                self.grams.setdefault(gram, []).append(value_id)
+
+    def contains(self, term: str) -> set[int]:
+        """Returns the row positions whose value contains term, ignoring case.
+
+        Matches the same rows as `field.contains(term)` (ILIKE '%term%').
+        """
+        term = term.lower()
+        if len(term) >= NGRAM_SIZE:
+            postings = []
+            for gram in ngrams(term):
+                posting = self.grams.get(gram)
+                if posting is None:
+                    return set()
+                postings.append(posting)
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates.intersection_update(posting)
+        else:
+            # Too short for an n-gram, check every distinct value instead
+            candidates = range(len(self.values))
+
+        rows = set()
+        for value_id in candidates:
+            # N-grams can all be present without the term being contiguous
+            if term in self.values[value_id]:
+                rows.update(self.positions[value_id].tolist())
+        return rows
+
+
+class SearchIndex:
+    """In-memory inverted indexes over the searchable columns of a catalog.
+
+    Evaluates the same `a(x)&b(y)+c(z)` searches as `search_software` (after
+    `find_search_groups`) with posting list intersections and unions instead
+    of a database query.
+
+    Attributes:
+        columns (dict[str, ColumnIndex]): Column name to its index
+    """
+
+    __slots__ = ("columns",)
+
+    def __init__(self, rows: CatalogRows | CatalogImage, columns):
+        self.columns = {column: ColumnIndex(*rows.encoded(column)) for column in columns}
+
+    def search(self, search_groups: list[dict]) -> list[int]:
+        """Returns the positions of the rows matching any of the search groups.
+
+        Args:
+            search_groups (list[dict]): Output of `find_search_groups`. The
+                column(value) terms of a group are ANDed, groups are ORed.
+
+        Returns:
+            list[int]: Sorted catalog row positions
+
+        Raises:
+            ValueError: If a group has no searchable column
+        """
+        matches = set()
+        for search_group in search_groups:
+            terms = [
+                (self.columns[key], value)
+                for key, value in search_group.items()
+                if key in self.columns
+            ]
+            if not terms:
+                raise ValueError(f"No searchable column in {search_group}")
+
+            group_matches = None
+            for column_index, value in terms:
+                rows = column_index.contains(value)
+                group_matches = rows if group_matches is None else group_matches & rows
+                if not group_matches:
+                    break
+            matches |= group_matches
+        return sorted(matches)
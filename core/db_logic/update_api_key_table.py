@@ -2,6 +2,7 @@ import os
 from . import Records
 from ..models import db_operation, db_proxy as db
 from ..models.api import API
+from .api_keys import invalidate_api_key_cache
 from .. import custom_halo
 from ..core_logging import logger
 
@@ -68,7 +69,7 @@ def update_api_key_table(api_key_records: Records) -> None:
     """Adds data to the API table in the database.
 
     In cases where the api_key is already in teh table, it updates the data for
-    that row
+    that row. Cached API key validation results are invalidated afterwards.
 
     Args:
         api_key_records (Records): Records of rows to be added to the table
@@ -80,6 +81,8 @@ def update_api_key_table(api_key_records: Records) -> None:
             preserve=[API.organization, API.can_edit, API.can_view, API.date_generated],
         ).execute()
 
+    invalidate_api_key_cache()
+
 
 if __name__ == "__main__":
     data = create_api_key_table_records()
@@ -1,15 +1,62 @@
 from peewee import *
+from peewee import _ConnectionState
 from playhouse.pool import PooledPostgresqlExtDatabase
+from playhouse.postgres_ext import ServerSide
+from playhouse.sqlite_ext import SqliteExtDatabase
 from dotenv import load_dotenv
 from functools import wraps
+import asyncio
 import os
-from contextlib import contextmanager
+import sqlite3
+import time
+import weakref
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from ..core_logging import slow_query_logger
 # We want to use the PooledPostgresqlExtDatabase database class here
 # PooledPostgresqlExtDatabase provides connection pooling https://docs.peewee-orm.com/en/latest/peewee/playhouse.html#pool
 # as well as extended Postgresql support for things like json, hstore, etc. https://docs.peewee-orm.com/en/latest/peewee/playhouse.html#postgres-ext
 
 load_dotenv()
 
+# Database the models are bound to: 'postgres', or 'sqlite' for a local
+#   stand-in (benchmarks and profiling without a Postgres server)
+DB_BACKEND = os.getenv("DB_BACKEND", "postgres")
+# SQLite database file with DB_BACKEND=sqlite, ':memory:' keeps it in memory
+DB_SQLITE_PATH = os.getenv("DB_SQLITE_PATH", "data/catalog.sqlite3")
+
+# Database features the code relies on that only Postgres provides:
+#   - fulltext: tsvector search_vector, `fulltext(...)` searches and ranking
+#   - trigram: pg_trgm indexes for substring searches
+#   - server_side_cursors: QueryResult streams rows from a named cursor
+#   - sql_aggregation: array_agg / json_build_object documents
+#     (CATALOG_AGGREGATION=sql)
+#   - materialized_views: catalog_view is a materialized view (SQLite keeps it
+#     as a table filled on refresh)
+#   - explain_analyze: EXPLAIN (ANALYZE, BUFFERS) / (FORMAT JSON) plans
+#   - async_pool: asyncpg pool of the ASGI server
+POSTGRES_CAPABILITIES = frozenset(
+    {
+        "fulltext",
+        "trigram",
+        "server_side_cursors",
+        "sql_aggregation",
+        "materialized_views",
+        "explain_analyze",
+        "async_pool",
+    }
+)
+DB_CAPABILITIES = POSTGRES_CAPABILITIES if DB_BACKEND == "postgres" else frozenset()
+
+
+def supports(capability: str) -> bool:
+    """Checks if the configured database backend provides a feature of
+    POSTGRES_CAPABILITIES"""
+    if capability not in POSTGRES_CAPABILITIES:
+        raise ValueError(f"Unknown database capability: {capability}")
+    return capability in DB_CAPABILITIES
+
+
 # Database config
 DB_NAME = os.getenv("DB_NAME", "ara_db")
 DB_HOST = os.getenv("DB_HOST", "localhost")
@@ -25,20 +72,285 @@ EDIT_PASS = os.getenv('DB_EDIT_PASS')
 VIEW_USER = os.getenv('DB_VIEW_USER')
 VIEW_PASS = os.getenv('DB_VIEW_PASS')
 
-admin_db = PooledPostgresqlExtDatabase(
-    DB_NAME, user=ADMIN_USER, password=ADMIN_PASS, host=DB_HOST,
-    port=DB_PORT, max_connections=DB_MAX_CONN, stale_timeout=DB_CONN_TIMEOUT)
+# Statements running longer than this (in seconds) are written to the slow
+#   query log (logs/slow_queries.log), a negative value disables it
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", 0.5))
+# Write the parameters of slow statements to the log, only their number is
+#   logged otherwise. They can hold user input.
+SLOW_QUERY_LOG_PARAMS = os.getenv("SLOW_QUERY_LOG_PARAMS", "0") == "1"
+# Add the EXPLAIN (ANALYZE, BUFFERS) plan of slow SELECTs to the log. The
+#   statement is run a second time to get it. Plans show the parameter
+#   values, so they are only added with SLOW_QUERY_LOG_PARAMS.
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "0") == "1"
+# Tables whose statements are logged without parameters (or plan) even with
+#   SLOW_QUERY_LOG_PARAMS: the API table holds the API keys
+SLOW_QUERY_SECRET_TABLES = ("api",)
+
+class QueryCounter:
+    """Number of SQL statements run, and of rows they returned, while the
+    counter is active"""
+
+    __slots__ = ("count", "rows")
+
+    def __init__(self):
+        self.count = 0
+        self.rows = 0
+
+
+# Counter of the current context (i.e. request), set by count_queries
+_active_query_counter = ContextVar("active_query_counter", default=None)
+
+
+@contextmanager
+def count_queries():
+    """Counts the SQL statements run inside the block, in this context only.
+
+    >>> with count_queries() as counter:
+    ...     search_software(["rp_name(anvil)"])
+    >>> counter.count
+    1
+    """
+    counter = QueryCounter()
+    token = _active_query_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _active_query_counter.reset(token)
+
+
+# What the statements of the current context run for (i.e. the API query),
+#   set by query_origin
+_query_origin = ContextVar("query_origin", default=None)
+
+
+@contextmanager
+def query_origin(origin: str):
+    """Names what the statements run inside the block are for, in the slow
+    query log.
+
+    >>> with query_origin("API_0_1 search=rp_name(anvil)|fts"):
+    ...     search_software(["rp_name(anvil)|fts"])
+    """
+    token = _query_origin.set(origin)
+    try:
+        yield
+    finally:
+        _query_origin.reset(token)
+
+
+def explain_statement(database, sql: str, params) -> str:
+    """Runs EXPLAIN (ANALYZE, BUFFERS) on a SELECT, which executes it again.
+
+    Inside a transaction it runs in a savepoint, so a failing EXPLAIN
+    doesn't abort the transaction.
+
+    Returns:
+        str: The plan, or why there is none
+    """
+    if not sql.lstrip().lower().startswith("select"):
+        return "(only SELECT statements are explained)"
+    # SQLite only shows the plan, without running the statement
+    explain = (
+        "EXPLAIN (ANALYZE, BUFFERS)"
+        if supports("explain_analyze")
+        else "EXPLAIN QUERY PLAN"
+    )
+    cursor = database.cursor()
+    savepoint = database.in_transaction()
+    try:
+        if savepoint:
+            cursor.execute("SAVEPOINT explain_slow_query")
+        cursor.execute(f"{explain} {sql}", params or ())
+        plan = "\n".join(str(row[-1]) for row in cursor.fetchall())
+        if savepoint:
+            cursor.execute("RELEASE SAVEPOINT explain_slow_query")
+        return plan
+    except Exception as e:
+        if savepoint:
+            cursor.execute("ROLLBACK TO SAVEPOINT explain_slow_query")
+        return f"(EXPLAIN failed: {e})"
+    finally:
+        cursor.close()
+
+
+def log_slow_query(database, sql: str, params, seconds: float) -> None:
+    """Writes a statement to the slow query log if it took longer than
+    SLOW_QUERY_SECONDS.
+
+    Args:
+        database (Database | None): Database the statement ran on, used to
+            explain it when SLOW_QUERY_EXPLAIN is set. None never explains.
+        sql (str): The statement
+        params (Sequence | None): Its parameters, only logged with
+            SLOW_QUERY_LOG_PARAMS and never for SLOW_QUERY_SECRET_TABLES
+        seconds (float): How long it ran
+    """
+    if SLOW_QUERY_SECONDS < 0 or seconds < SLOW_QUERY_SECONDS:
+        return
+    # peewee quotes table names, asyncpg statements are built by peewee too
+    secret = any(f'"{table}"' in sql for table in SLOW_QUERY_SECRET_TABLES)
+    show_params = SLOW_QUERY_LOG_PARAMS and not secret
+    if show_params:
+        logged_params = repr(list(params or ()))
+    else:
+        logged_params = f"({len(params or ())} hidden)"
+    message = (
+        f"{seconds:.3f}s origin={_query_origin.get()!r}\n"
+        f"  sql: {sql}\n"
+        f"  params: {logged_params}"
+    )
+    if SLOW_QUERY_EXPLAIN and show_params and database is not None:
+        plan = explain_statement(database, sql, params)
+        message += "\n  plan:\n    " + plan.replace("\n", "\n    ")
+    slow_query_logger.info(message)
+
+
+class QueryInstrumentation:
+    """Database mixin that reports every statement to count_queries and
+    writes slow ones to the slow query log"""
+
+    def execute_sql(self, sql, params=None, *args, **kwargs):
+        counter = _active_query_counter.get()
+        if counter is not None:
+            counter.count += 1
+        start = time.perf_counter()
+        cursor = super().execute_sql(sql, params, *args, **kwargs)
+        # Server-side cursors only run their query when rows are fetched,
+        #   QueryResult times them (and counts their rows) instead
+        if not kwargs.get("named_cursor"):
+            log_slow_query(self, sql, params, time.perf_counter() - start)
+            if (
+                counter is not None
+                and cursor.description is not None
+                and cursor.rowcount > 0
+            ):
+                counter.rows += cursor.rowcount
+        return cursor
+
+
+class TaskLocalConnections:
+    """Database mixin keeping the connection state per asyncio task.
+
+    peewee keeps one connection state per thread. Tasks sharing the event
+    loop's thread would share one connection, and a task leaving use_db
+    would close it under the others. Code running in a task gets the
+    state of that task instead (and with it its own pooled connection),
+    code outside tasks keeps peewee's per thread state.
+    """
+
+    @property
+    def _state(self):
+        thread_state = self._thread_state
+        try:
+            task = asyncio.current_task(asyncio.get_running_loop())
+        except RuntimeError:  # No event loop runs in this thread
+            task = None
+        if task is None:
+            return thread_state
+        # The tasks of a thread's loop, dropped with their task
+        task_states = getattr(thread_state, "task_states", None)
+        if task_states is None:
+            task_states = thread_state.task_states = weakref.WeakKeyDictionary()
+        state = task_states.get(task)
+        if state is None:
+            state = task_states[task] = _ConnectionState()
+        return state
+
+    @_state.setter
+    def _state(self, state):
+        # Set by Database.__init__, the state of code outside tasks
+        self._thread_state = state
+
+
+class InstrumentedDatabase(
+    QueryInstrumentation, TaskLocalConnections, PooledPostgresqlExtDatabase
+):
+    """Pooled Postgres database with QueryInstrumentation and a connection
+    per thread or asyncio task"""
 
-edit_db = PooledPostgresqlExtDatabase(
-    DB_NAME, user=EDIT_USER, password=EDIT_PASS, host=DB_HOST,
-    port=DB_PORT, max_connections=DB_MAX_CONN, stale_timeout=DB_CONN_TIMEOUT)
 
-view_db = PooledPostgresqlExtDatabase(
-    DB_NAME, user=VIEW_USER, password=VIEW_PASS, host=DB_HOST,
-    port=DB_PORT, max_connections=DB_MAX_CONN, stale_timeout=DB_CONN_TIMEOUT)
+class InstrumentedSqliteDatabase(
+    QueryInstrumentation, TaskLocalConnections, SqliteExtDatabase
+):
+    """SQLite database with QueryInstrumentation, the DB_BACKEND=sqlite
+    stand-in. SQLite doesn't report the row count of SELECTs, so only rows
+    read through QueryResult are counted."""
 
-# Database proxy
-db_proxy = DatabaseProxy()
+
+def sqlite_database(path: str) -> InstrumentedSqliteDatabase:
+    """Opens the SQLite stand-in database.
+
+    An in-memory database (':memory:') is shared by every connection of the
+    process and lives as long as the process, not just one connection.
+    """
+    pragmas = {"foreign_keys": 1, "journal_mode": "wal", "cache_size": -64 * 1024}
+    if path == ":memory:":
+        uri = "file:sds_catalog?mode=memory&cache=shared"
+        database = InstrumentedSqliteDatabase(
+            uri, uri=True, check_same_thread=False, pragmas={"foreign_keys": 1}
+        )
+        database.memory_keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        return database
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return InstrumentedSqliteDatabase(path, check_same_thread=False, pragmas=pragmas)
+
+
+if DB_BACKEND == "sqlite":
+    # One database for every role, SQLite has no users
+    admin_db = edit_db = view_db = sqlite_database(DB_SQLITE_PATH)
+elif DB_BACKEND == "postgres":
+    admin_db = InstrumentedDatabase(
+        DB_NAME, user=ADMIN_USER, password=ADMIN_PASS, host=DB_HOST,
+        port=DB_PORT, max_connections=DB_MAX_CONN, stale_timeout=DB_CONN_TIMEOUT)
+
+    edit_db = InstrumentedDatabase(
+        DB_NAME, user=EDIT_USER, password=EDIT_PASS, host=DB_HOST,
+        port=DB_PORT, max_connections=DB_MAX_CONN, stale_timeout=DB_CONN_TIMEOUT)
+
+    view_db = InstrumentedDatabase(
+        DB_NAME, user=VIEW_USER, password=VIEW_PASS, host=DB_HOST,
+        port=DB_PORT, max_connections=DB_MAX_CONN, stale_timeout=DB_CONN_TIMEOUT)
+else:
+    raise ValueError(f"Invalid DB_BACKEND: {DB_BACKEND}. Choose 'postgres' or 'sqlite'.")
+
+# Database bound by use_db in the current thread or asyncio task, None
+#   outside use_db
+_bound_database = ContextVar("bound_database", default=None)
+
+
+class ContextDatabaseProxy(DatabaseProxy):
+    """DatabaseProxy whose database is bound per context instead of globally.
+
+    `use_db` binds a database for the current thread or asyncio task (and the
+    tasks and `asyncio.to_thread` calls it starts, which copy its context),
+    so concurrent requests never see each other's database. Contexts
+    without a binding use the database given to `initialize`. The databases
+    keep their connections per thread or task too (TaskLocalConnections).
+    """
+
+    __slots__ = ("_default",)
+
+    def __setattr__(self, attr, value):
+        # Proxy only allows the attributes of its own __slots__
+        object.__setattr__(self, attr, value)
+
+    def initialize(self, obj):
+        """Sets the database of contexts that haven't bound one"""
+        self._default = obj
+        for callback in self._callbacks:
+            callback(obj)
+
+    @property
+    def obj(self):
+        bound = _bound_database.get()
+        return self._default if bound is None else bound
+
+
+# Database proxy, the models' database
+db_proxy = ContextDatabaseProxy()
+db_proxy.initialize(view_db)
 
 class CaseInsensitiveField(CharField):
     def db_value(self, value):
@@ -51,24 +363,31 @@ class BaseExtModel(Model):
     class Meta:
         database=db_proxy   # default database is set to db_proxy
 
-# Context manager for database operations
-@contextmanager
-def use_db(db_type):
+def get_db(db_type):
+    """Returns the database of a type: 'admin', 'edit' or 'view'"""
     if db_type == 'admin':
-        db = admin_db
+        return admin_db
     elif db_type == 'edit':
-        db = edit_db
+        return edit_db
     elif db_type == 'view':
-        db = view_db
-    else:
-        raise ValueError("Invalid database type. Choose 'admin', 'edit', or 'view'.")
-    
-    db_proxy.initialize(db)
+        return view_db
+    raise ValueError("Invalid database type. Choose 'admin', 'edit', or 'view'.")
+
+# Context manager for database operations. The database is bound for the
+#   current thread or task only, and the outer binding (if any) is restored
+#   on exit, so use_db blocks can nest. A block nested in one of the same
+#   database uses (and leaves open) the outer block's connection.
+@contextmanager
+def use_db(db_type):
+    db = get_db(db_type)
+    token = _bound_database.set(db)
     try:
-        with db.connection_context():
+        with ExitStack() as stack:
+            if db.is_closed():
+                stack.enter_context(db.connection_context())
             yield
     finally:
-        db_proxy.initialize(view_db)
+        _bound_database.reset(token)
 
 # Decorator for database operations
 def db_operation(db_type):
@@ -78,4 +397,119 @@ def db_operation(db_type):
             with use_db(db_type):
                 return func(*args, **kwargs)
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
+
+
+# Marks a QueryResult without rows
+_NO_ROW = object()
+
+# QueryResults run in the current context (i.e. request), set by
+#   close_query_results
+_open_query_results = ContextVar("open_query_results", default=None)
+
+
+@contextmanager
+def close_query_results():
+    """Closes the QueryResults run inside the block when it exits, so a
+    result that was checked but never iterated doesn't hold its connection.
+
+    >>> with close_query_results():
+    ...     found = bool(search_software(["rp_name(anvil)"]))
+    """
+    results = []
+    token = _open_query_results.set(results)
+    try:
+        yield
+    finally:
+        _open_query_results.reset(token)
+        for result in results:
+            result.close()
+
+
+class QueryResult:
+    """Result of a select query that is run once, the first time it is used.
+
+    Rows are streamed from a server-side cursor instead of being loaded all
+    at once. Checking the result (`if result:`) fetches the first row, so
+    emptiness is known without a separate EXISTS query. A result can only be
+    iterated once, and it should be consumed before other queries run on the
+    same database in this thread since it holds the connection.
+
+    A result that was checked but not iterated keeps its connection (and the
+    transaction of its cursor) open until it is garbage collected. `close`
+    releases it, and close_query_results closes every result of a block,
+    e.g. of a Flask request.
+
+    Attributes:
+        query (ModelSelect): The query, for building other queries from it
+        db_type (str): Database the query is run on ('admin', 'edit', 'view')
+    """
+
+    __slots__ = ("query", "db_type", "_rows", "_head", "_consumed")
+
+    def __init__(self, query, db_type="view"):
+        self.query = query
+        self.db_type = db_type
+        self._rows = None
+        self._head = _NO_ROW
+        self._consumed = False
+
+    def _fetch(self):
+        # The query is bound to its database rather than using use_db, whose
+        #   binding would otherwise leak to the caller while the rows are read
+        database = get_db(self.db_type)
+        query = self.query.clone().bind(database)
+        with ExitStack() as stack:
+            # Inside use_db of the same database, its connection is used
+            if database.is_closed():
+                stack.enter_context(database.connection_context())
+            counter = _active_query_counter.get()
+            server_side = supports("server_side_cursors")
+            # Without server-side cursors, execute_sql times the query
+            rows = iter(ServerSide(query)) if server_side else query.iterator()
+            # Time spent fetching, not the time the caller spends on the rows
+            elapsed = 0.0
+            while True:
+                start = time.perf_counter()
+                row = next(rows, _NO_ROW)
+                elapsed += time.perf_counter() - start
+                if row is _NO_ROW:
+                    break
+                if counter is not None:
+                    counter.rows += 1
+                yield row
+            if server_side:
+                sql, params = query.sql()
+                log_slow_query(database, sql, params, elapsed)
+
+    def _start(self):
+        if self._rows is None:
+            self._rows = self._fetch()
+            open_results = _open_query_results.get()
+            if open_results is not None:
+                open_results.append(self)
+            self._head = next(self._rows, _NO_ROW)
+
+    def close(self):
+        """Stops reading the rows, releasing the cursor and the connection.
+        Rows not read yet are dropped, the result can't be iterated after."""
+        if self._rows is not None:
+            self._rows.close()
+        self._head = _NO_ROW
+        self._consumed = True
+
+    def __bool__(self):
+        self._start()
+        return self._head is not _NO_ROW
+
+    def __iter__(self):
+        if self._consumed:
+            raise RuntimeError("A QueryResult can only be iterated once")
+        self._start()
+        self._consumed = True
+        return self._iterate()
+
+    def _iterate(self):
+        if self._head is not _NO_ROW:
+            yield self._head
+            yield from self._rows
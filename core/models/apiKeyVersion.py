@@ -0,0 +1,41 @@
+from . import *
+from datetime import datetime, timezone
+
+
+class ApiKeyVersion(BaseExtModel):
+    """Version counter of the API table.
+
+    The table holds a single row. `update_api_key_table` bumps it whenever it
+    writes API keys, and every API worker drops its cached key validation
+    results once it reads a version other than the one they were cached at.
+    """
+
+    # Id of the single version row
+    ROW_ID = 1
+
+    id = IntegerField(primary_key=True)
+    version = IntegerField()  # Incremented on every change of the API table
+    updated_at = DateTimeField()  # UTC, when version was last incremented
+
+    class Meta:
+        table_name = "api_key_version"
+
+    @classmethod
+    def current(cls) -> int | None:
+        """Returns the version, or None if the API table was never written"""
+        row = cls.select(cls.version).where(cls.id == cls.ROW_ID).tuples().first()
+        return row[0] if row else None
+
+    @classmethod
+    def bump(cls) -> None:
+        """Increments the version, creating the row on the first change"""
+        updated_at = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+        (
+            cls.insert(id=cls.ROW_ID, version=1, updated_at=updated_at)
+            .on_conflict(
+                conflict_target=[cls.id],
+                update={cls.version: cls.version + 1},
+                preserve=[cls.updated_at],
+            )
+            .execute()
+        )
@@ -0,0 +1,56 @@
+from . import *
+from datetime import datetime, timezone
+from .catalogView import CatalogView
+
+
+class CatalogVersion(BaseExtModel):
+    """Version stamp of the data in `catalog_view`.
+
+    The table holds a single row. `reset_database.py` stamps it after the view
+    is refreshed, and the stamp only changes when the view's content does.
+    The API reads it to check whether its catalog snapshot is current and to
+    answer conditional requests (ETag / Last-Modified) without reading the
+    catalog itself.
+    """
+
+    # Id of the single stamp row
+    ROW_ID = 1
+
+    id = IntegerField(primary_key=True)
+    content_hash = CharField()  # md5 of the catalog_view rows
+    updated_at = DateTimeField()  # UTC, when content_hash last changed
+
+    class Meta:
+        table_name = "catalog_version"
+
+    @classmethod
+    def current(cls):
+        """Returns the stamp row, or None if the catalog was never stamped"""
+        return cls.get_or_none(cls.id == cls.ROW_ID)
+
+    @classmethod
+    def stamp(cls):
+        """Records the current content hash of catalog_view.
+
+        `updated_at` is only moved forward when the hash differs from the
+        stamped one, so re-running the ETL on unchanged data keeps the
+        version (and every client's ETag) valid.
+
+        Returns:
+            CatalogVersion: The stamp row
+        """
+        content_hash = CatalogView.content_hash()
+        version = cls.current()
+        if version is not None and version.content_hash == content_hash:
+            return version
+
+        updated_at = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+        (
+            cls.insert(id=cls.ROW_ID, content_hash=content_hash, updated_at=updated_at)
+            .on_conflict(
+                conflict_target=[cls.id],
+                preserve=[cls.content_hash, cls.updated_at],
+            )
+            .execute()
+        )
+        return cls.current()
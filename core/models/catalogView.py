@@ -0,0 +1,262 @@
+import hashlib
+from . import *
+from peewee import Expression
+from playhouse.postgres_ext import TSVectorField, TS_MATCH
+from .rpSoftware import RPSoftware
+from .software import Software
+from .rps import RPS
+from .aiSoftwareInfo import AISoftwareInfo
+
+
+class CatalogView(BaseExtModel):
+    """Read-only model over the `catalog_view` materialized view.
+
+    The view holds one pre-joined row per RPSoftware row
+    (RPSoftware ⋈ Software ⋈ RPS ⟕ AISoftwareInfo) so API reads don't have to
+    plan the four-way join on every query. It is created by
+    `reset_database.recreate_tables` and refreshed after the ETL has updated
+    the tables. The view is never written to through this model.
+
+    `search_vector` is a weighted full-text document of each row (see
+    SEARCH_WEIGHTS) with a GIN index, used by `fulltext(...)` searches. The
+    SEARCHABLE_COLUMNS can get pg_trgm GIN indexes so `column(value)`
+    substring searches don't need a sequential scan.
+
+    With the SQLite stand-in (DB_BACKEND=sqlite) the view is a table with the
+    same columns and b-tree indexes, filled from the join on refresh.
+    `search_vector` stays NULL there.
+    """
+
+    # Columns the `column(value)` search syntax can target
+    SEARCHABLE_COLUMNS = (
+        "software_name",
+        "software_description",
+        "software_web_page",
+        "software_documentation",
+        "software_use_link",
+        "rp_name",
+        "rp_group_id",
+        "ai_description",
+        "ai_software_type",
+        "ai_software_class",
+        "ai_research_field",
+        "ai_research_area",
+        "ai_research_discipline",
+        "ai_core_features",
+        "ai_general_tags",
+        "ai_example_use",
+        "software_versions",
+        "rp_software_documentation",
+    )
+
+    # Text search configuration used to build and query `search_vector`
+    SEARCH_LANGUAGE = "english"
+    # Weight of the columns in `search_vector`, A ranks highest
+    SEARCH_WEIGHTS = {
+        "A": ("software_name",),
+        "B": (
+            "ai_general_tags",
+            "ai_software_type",
+            "ai_software_class",
+            "ai_research_field",
+            "ai_research_area",
+            "ai_research_discipline",
+        ),
+        "C": ("software_description", "ai_description", "ai_core_features"),
+        "D": ("ai_example_use",),
+    }
+
+    id = IntegerField(primary_key=True)  # RPSoftware id
+    rp_id = IntegerField(index=True)
+    software_id = IntegerField(index=True)
+    software_versions = TextField()
+    rp_software_documentation = TextField()
+    rp_has_individual_software_documentation = BooleanField()
+    rp_software_module_type = CharField()
+    software_name = CaseInsensitiveField(index=True)
+    software_description = TextField()
+    software_web_page = CharField()
+    software_documentation = CharField()
+    software_use_link = TextField()
+    rp_name = CaseInsensitiveField(index=True)
+    rp_group_id = CaseInsensitiveField(index=True)
+    rp_resource_id = CaseInsensitiveField()
+    ai_description = TextField(null=True)
+    ai_software_type = TextField(null=True)
+    ai_software_class = TextField(null=True)
+    ai_research_field = TextField(null=True)
+    ai_research_area = TextField(null=True)
+    ai_research_discipline = TextField(null=True)
+    ai_core_features = TextField(null=True)
+    ai_general_tags = TextField(null=True)
+    ai_example_use = TextField(null=True)
+    search_vector = TSVectorField(null=True)  # GIN indexed, NULL with SQLite
+
+    class Meta:
+        table_name = "catalog_view"
+        # REFRESH MATERIALIZED VIEW CONCURRENTLY needs a unique index
+        indexes = ((("id",), True),)
+
+    @classmethod
+    def data_fields(cls):
+        """Returns every column except `search_vector`"""
+        return [
+            field for field in cls._meta.sorted_fields if field is not cls.search_vector
+        ]
+
+    @classmethod
+    def fulltext_match(cls, value):
+        """Returns a filter matching rows whose `search_vector` matches value.
+
+        value uses web search syntax: words, "quoted phrases", `or`, and
+        `-excluded` words.
+        """
+        return Expression(cls.search_vector, TS_MATCH, cls.fulltext_query(value))
+
+    @classmethod
+    def fulltext_query(cls, value):
+        """Returns the tsquery for a web search style value"""
+        return fn.websearch_to_tsquery(cls.SEARCH_LANGUAGE, value)
+
+    @classmethod
+    def search_vector_expression(cls):
+        """Returns the weighted tsvector built for each row of the view"""
+        columns = {
+            field.name: field
+            for model in (Software, AISoftwareInfo)
+            for field in model._meta.sorted_fields
+        }
+        vectors = [
+            fn.setweight(
+                fn.to_tsvector(
+                    cls.SEARCH_LANGUAGE,
+                    fn.concat_ws(" ", *[columns[name] for name in names]),
+                ),
+                weight,
+            )
+            for weight, names in cls.SEARCH_WEIGHTS.items()
+        ]
+        search_vector = vectors[0]
+        for vector in vectors[1:]:
+            search_vector = search_vector.concat(vector)
+        return search_vector
+
+    @classmethod
+    def view_query(cls):
+        """Returns the join the view is built from"""
+        return (
+            RPSoftware.select(
+                RPSoftware.id,
+                RPSoftware.rp_id.alias("rp_id"),
+                RPSoftware.software_id.alias("software_id"),
+                RPSoftware.software_versions,
+                RPSoftware.rp_software_documentation,
+                RPSoftware.rp_has_individual_software_documentation,
+                RPSoftware.rp_software_module_type,
+                Software.software_name,
+                Software.software_description,
+                Software.software_web_page,
+                Software.software_documentation,
+                Software.software_use_link,
+                RPS.rp_name,
+                RPS.rp_group_id,
+                RPS.rp_resource_id,
+                AISoftwareInfo.ai_description,
+                AISoftwareInfo.ai_software_type,
+                AISoftwareInfo.ai_software_class,
+                AISoftwareInfo.ai_research_field,
+                AISoftwareInfo.ai_research_area,
+                AISoftwareInfo.ai_research_discipline,
+                AISoftwareInfo.ai_core_features,
+                AISoftwareInfo.ai_general_tags,
+                AISoftwareInfo.ai_example_use,
+                *(
+                    [cls.search_vector_expression().alias("search_vector")]
+                    if supports("fulltext")
+                    else []
+                ),
+            )
+            .join(Software, on=(RPSoftware.software_id == Software.id))
+            .join(RPS, on=(RPSoftware.rp_id == RPS.id))
+            .left_outer_join(
+                AISoftwareInfo, on=(AISoftwareInfo.software_id == Software.id)
+            )
+        )
+
+    @classmethod
+    def create_view(cls):
+        """Creates the materialized view and its indexes"""
+        if not supports("materialized_views"):
+            cls._schema.create_table(safe=True)
+            # Every index but the GIN one on search_vector
+            for index in cls._meta.fields_to_index():
+                if index._using is None:
+                    create_index = cls._schema._create_index(index, safe=True)
+                    cls._meta.database.execute(create_index)
+            return
+        sql, params = cls.view_query().sql()
+        cls._meta.database.execute_sql(
+            f'CREATE MATERIALIZED VIEW IF NOT EXISTS "{cls._meta.table_name}" AS {sql}',
+            params,
+        )
+        cls._schema.create_indexes(safe=True)
+
+    @classmethod
+    def create_trigram_indexes(cls):
+        """Creates a pg_trgm GIN index on each of the SEARCHABLE_COLUMNS.
+
+        The indexes serve the (I)LIKE '%value%' filters used by substring
+        search for values of at least 3 characters. Requires the pg_trgm
+        extension.
+        """
+        table_name = cls._meta.table_name
+        for column in cls.SEARCHABLE_COLUMNS:
+            cls._meta.database.execute_sql(
+                f'CREATE INDEX IF NOT EXISTS "{table_name}_{column}_trgm" '
+                f'ON "{table_name}" USING GIN ("{column}" gin_trgm_ops)'
+            )
+
+    @classmethod
+    def content_hash(cls) -> str:
+        """Returns an md5 hash of every row of the view, in id order"""
+        if not supports("materialized_views"):
+            # Not the hash Postgres computes, but as stable for the same rows
+            digest = hashlib.md5()
+            rows = cls.select(*cls.data_fields()).order_by(cls.id).tuples()
+            for row in rows.iterator():
+                digest.update(hashlib.md5(repr(row).encode()).digest())
+            return digest.hexdigest()
+        cursor = cls._meta.database.execute_sql(
+            "SELECT md5(coalesce(string_agg(md5(v::text), '' ORDER BY v.id), '')) "
+            f'FROM "{cls._meta.table_name}" v'
+        )
+        return cursor.fetchone()[0]
+
+    @classmethod
+    def drop_view(cls):
+        """Drops the materialized view (and with it its indexes)"""
+        if not supports("materialized_views"):
+            cls.drop_table(safe=True)
+            return
+        cls._meta.database.execute_sql(
+            f'DROP MATERIALIZED VIEW IF EXISTS "{cls._meta.table_name}"'
+        )
+
+    @classmethod
+    def refresh(cls, concurrently=True):
+        """Re-runs the view's join so it matches the underlying tables.
+
+        Args:
+            concurrently (bool): Refresh without locking out readers. Requires
+                the unique index on `id`.
+        """
+        if not supports("materialized_views"):
+            # Readers see the old rows until the transaction commits
+            with cls._meta.database.atomic():
+                cls.delete().execute()
+                cls.insert_from(cls.view_query(), cls.data_fields()).execute()
+            return
+        mode = "CONCURRENTLY " if concurrently else ""
+        cls._meta.database.execute_sql(
+            f'REFRESH MATERIALIZED VIEW {mode}"{cls._meta.table_name}"'
+        )
@@ -1,9 +1,12 @@
-from core.models import db_proxy as db, db_operation, use_db
+from core.models import db_proxy as db, db_operation, use_db, supports
 from core.models.rpSoftware import RPSoftware
 from core.models.software import Software
 from core.models.rps import RPS
 from core.models.aiSoftwareInfo import AISoftwareInfo
 from core.models.api import API
+from core.models.catalogView import CatalogView
+from core.models.catalogVersion import CatalogVersion
+from core.models.apiKeyVersion import ApiKeyVersion
 from core.db_logic.update_rp_table import update_rp_table, create_rp_table_records
 from core.db_logic.update_software_table import (
     update_software_table,
@@ -22,6 +25,8 @@ from core.db_logic.update_api_key_table import (
     create_api_key_table_records,
     update_api_key_table,
 )
+from core.db_logic.catalog import load_catalog_rows, load_catalog_version
+from core.db_logic.catalog_image import write_catalog_image, CATALOG_IMAGE_DIR
 
 from core.get_operations_data import import_operations_data
 from core.core_logging import logger
@@ -35,9 +40,67 @@ def recreate_tables():
     with db.atomic():
         main_tables = [RPS, Software, API]  # RPS with no foreign key fields
         dependant_tables = [RPSoftware, AISoftwareInfo]  # RPS with foreign key fields
+        CatalogView.drop_view()  # The view depends on all catalog tables
         db.drop_tables(dependant_tables)
         db.drop_tables(main_tables)
         db.create_tables(main_tables + dependant_tables)
+        # The version stamps are kept, so unchanged data keeps its version
+        #   and API workers notice the API table was rewritten
+        db.create_tables([CatalogVersion, ApiKeyVersion])
+        CatalogView.create_view()
+        if supports("trigram") and enable_trigram_extension():
+            CatalogView.create_trigram_indexes()
+        else:
+            logger.warning("pg_trgm is not available, substring search is unindexed")
+
+
+def enable_trigram_extension() -> bool:
+    """Installs the pg_trgm extension used by the substring search indexes.
+
+    Returns:
+        bool: False if the server doesn't provide pg_trgm
+    """
+    available = db.execute_sql(
+        "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+    ).fetchone()
+    if not available:
+        return False
+    db.execute_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    return True
+
+
+@custom_halo(text="Refreshing catalog view")
+@db_operation("admin")
+def refresh_catalog_view():
+    """Updates the pre-joined catalog view the API reads from.
+
+    The refresh runs concurrently so API reads keep being served from the old
+    data until the new data is ready.
+    """
+    CatalogView.refresh(concurrently=True)
+
+
+@custom_halo(text="Stamping catalog version")
+@db_operation("admin")
+def stamp_catalog_version():
+    """Records the version of the refreshed catalog.
+
+    API workers compare it with the version of their snapshot to decide
+    whether to reload, and send it to clients as the ETag of responses.
+    """
+    version = CatalogVersion.stamp()
+    logger.info(f"Catalog version {version.content_hash} ({version.updated_at} UTC)")
+
+
+@custom_halo(text="Writing catalog image")
+def emit_catalog_image():
+    """Writes the catalog as a memory-mapped columnar image in CATALOG_IMAGE_DIR.
+
+    API workers on this node load their snapshot from it instead of reading
+    the whole view, as long as it holds the current catalog version.
+    """
+    catalog_version = load_catalog_version()
+    write_catalog_image(load_catalog_rows(), catalog_version, CATALOG_IMAGE_DIR)
 
 
 if __name__ == "__main__":
@@ -114,6 +177,11 @@ if __name__ == "__main__":
     update_ai_software_table(ai_software_records)
     logger.info("AISoftwareInfo table updated")
 
+    refresh_catalog_view()
+    logger.info("Catalog view refreshed")
+    stamp_catalog_version()
+    emit_catalog_image()
+
     # Write table info to file for testing purposes
     # with use_db("view"):
     #     ai_software = AISoftwareInfo.select()
@@ -0,0 +1,56 @@
+"""use_db must bind each thread and asyncio task to its own database and
+connection, without cross-talk between them.
+
+Runs benchmarks/db_binding_stress.py with small iteration counts on the
+SQLite stand-in, so no Postgres server is needed:
+    python -m unittest tests.test_db_binding
+"""
+
+import os
+import tempfile
+import unittest
+
+# The database backend is chosen when core.models is imported
+os.environ["DB_BACKEND"] = "sqlite"
+os.environ["DB_SQLITE_PATH"] = ":memory:"
+
+# pylint: disable=wrong-import-position
+import core.models
+from benchmarks.db_binding_stress import (
+    DB_TYPES,
+    run_tasks,
+    run_threads,
+    use_separate_sqlite_databases,
+)
+from core.models import use_db
+
+ITERATIONS = 20
+HOLD = 0.001
+
+
+class DbBindingTest(unittest.TestCase):
+    def setUp(self):
+        # Every type gets its own SQLite file that knows its type
+        self.databases = {db_type: core.models.get_db(db_type) for db_type in DB_TYPES}
+        self.directory = tempfile.TemporaryDirectory()
+        use_separate_sqlite_databases(self.directory.name)
+
+    def tearDown(self):
+        for db_type, database in self.databases.items():
+            core.models.get_db(db_type).close()
+            setattr(core.models, f"{db_type}_db", database)
+        self.directory.cleanup()
+
+    def assert_no_mismatches(self, checks):
+        self.assertGreater(checks.checked, 0)
+        self.assertEqual(checks.mismatches, [])
+
+    def test_threads(self):
+        self.assert_no_mismatches(run_threads(4, ITERATIONS, use_db, HOLD))
+
+    def test_asyncio_tasks(self):
+        self.assert_no_mismatches(run_tasks(4, ITERATIONS, use_db, HOLD))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""Answering a query must run a single SQL statement, and the results of
+those statements must give their connection back.
+
+Runs on the SQLite stand-in with a small synthetic catalog, so no Postgres
+server is needed:
+    python -m unittest tests.test_query_count
+"""
+
+import os
+import unittest
+
+# The database backend is chosen when core.models is imported
+os.environ["DB_BACKEND"] = "sqlite"
+os.environ["DB_SQLITE_PATH"] = ":memory:"
+
+# pylint: disable=wrong-import-position
+from benchmarks.synthetic_catalog import load_synthetic_catalog
+from core.db_logic.get_software_details import get_software_details, search_software
+from core.models import close_query_results, count_queries, get_db
+from core.models.catalogView import CatalogView
+
+
+class QueryCountTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        load_synthetic_catalog(rp_count=3, software_count=20)
+        with get_db("view").connection_context():
+            row = CatalogView.select(
+                CatalogView.software_name, CatalogView.rp_name
+            ).get()
+        cls.software_name, cls.rp_name = row.software_name, row.rp_name
+
+    def assert_one_query(self, make_result):
+        with count_queries() as counter:
+            result = make_result()
+            self.assertTrue(result)
+            rows = list(result)
+        self.assertTrue(rows)
+        self.assertEqual(counter.count, 1)
+        self.assertEqual(counter.rows, len(rows))
+        self.assertTrue(get_db("view").is_closed())
+
+    def test_search_software(self):
+        self.assert_one_query(lambda: search_software([f"rp_name({self.rp_name})"]))
+
+    def test_get_software_details(self):
+        self.assert_one_query(
+            lambda: get_software_details(self.software_name, CatalogView.select())
+        )
+
+    def test_close_releases_the_connection(self):
+        result = search_software([f"rp_name({self.rp_name})"])
+        self.assertTrue(result)
+        self.assertFalse(get_db("view").is_closed())
+        result.close()
+        self.assertTrue(get_db("view").is_closed())
+        with self.assertRaises(RuntimeError):
+            list(result)
+
+    def test_close_query_results(self):
+        with close_query_results():
+            result = search_software([f"rp_name({self.rp_name})"])
+            self.assertTrue(result)
+            self.assertFalse(get_db("view").is_closed())
+        # Closed while the result is still referenced
+        self.assertTrue(get_db("view").is_closed())
+        with self.assertRaises(RuntimeError):
+            list(result)
+
+
+if __name__ == "__main__":
+    unittest.main()
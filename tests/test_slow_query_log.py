@@ -0,0 +1,99 @@
+"""The slow query log must not write API keys to disk.
+
+Runs on the SQLite stand-in, so no Postgres server is needed:
+    python -m unittest tests.test_slow_query_log
+"""
+
+import logging
+import os
+import unittest
+
+# The database backend is chosen when core.models is imported
+os.environ["DB_BACKEND"] = "sqlite"
+os.environ["DB_SQLITE_PATH"] = ":memory:"
+
+# pylint: disable=wrong-import-position
+import core.models
+from core.core_logging import slow_query_logger
+from core.db_logic.api_keys import lookup_api_key
+from core.models import log_slow_query, use_db
+from core.models.api import API
+from core.models.apiKeyVersion import ApiKeyVersion
+
+SECRET_KEY = "secret-api-key-0123456789"
+
+
+class CapturingHandler(logging.Handler):
+    """Keeps the log records in memory"""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+    @property
+    def messages(self) -> list[str]:
+        return [record.getMessage() for record in self.records]
+
+
+class SlowQueryLogTest(unittest.TestCase):
+    def setUp(self):
+        with use_db("admin"):
+            API.create_table(safe=True)
+            ApiKeyVersion.create_table(safe=True)
+            API.delete().execute()
+            API.create(organization="test", api_key=SECRET_KEY)
+
+        # Every statement is slow
+        self.settings = (
+            core.models.SLOW_QUERY_SECONDS,
+            core.models.SLOW_QUERY_LOG_PARAMS,
+        )
+        core.models.SLOW_QUERY_SECONDS = 0
+        # Only log to memory, not to logs/slow_queries.log
+        self.handler = CapturingHandler()
+        self.saved_handlers = slow_query_logger.handlers
+        slow_query_logger.handlers = [self.handler]
+
+    def tearDown(self):
+        slow_query_logger.handlers = self.saved_handlers
+        core.models.SLOW_QUERY_SECONDS, core.models.SLOW_QUERY_LOG_PARAMS = self.settings
+
+    def assert_key_not_logged(self):
+        self.assertTrue(self.handler.messages, "nothing was logged")
+        for message in self.handler.messages:
+            self.assertNotIn(SECRET_KEY, message)
+
+    def test_key_lookup_is_logged_without_params(self):
+        self.assertEqual(lookup_api_key(SECRET_KEY), "test")
+        self.assertTrue(any('"api"' in message for message in self.handler.messages))
+        self.assert_key_not_logged()
+
+    def test_key_lookup_hides_params_even_when_logging_them(self):
+        core.models.SLOW_QUERY_LOG_PARAMS = True
+        lookup_api_key(SECRET_KEY)
+        self.assert_key_not_logged()
+
+    def test_async_key_lookup_hides_params(self):
+        # async_db.fetch logs asyncpg statements without a database
+        core.models.SLOW_QUERY_LOG_PARAMS = True
+        log_slow_query(
+            None,
+            'SELECT "t1"."organization" FROM "api" AS "t1" WHERE "t1"."api_key" = $1',
+            [SECRET_KEY],
+            1.0,
+        )
+        self.assert_key_not_logged()
+
+    def test_other_params_are_logged_when_enabled(self):
+        core.models.SLOW_QUERY_LOG_PARAMS = True
+        log_slow_query(
+            None, 'SELECT * FROM "software" WHERE "software_name" = ?', ["7z"], 1.0
+        )
+        self.assertIn("['7z']", self.handler.messages[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()